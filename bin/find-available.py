@@ -3,26 +3,22 @@
 # e.g. find 10 nodes for 20 consecutive days
 # ./find-availably.py -c 10 -d 20
 
-import itertools
-import string
 import argparse
 import os
 import sys
-import array
 import yaml
-from subprocess import call
-from subprocess import check_call
+from datetime import datetime
 
 parser = argparse.ArgumentParser(description='Find first available time for lab reservation')
 requiredArgs=parser.add_argument_group('Required Arguments')
 requiredArgs.add_argument('-c', '--count', dest='count', type=int, required=True, default=None, help='number of nodes needed')
 requiredArgs.add_argument('-d', '--days', dest='days', type=int, required=True, default=None, help='number of days needed')
 parser.add_argument('-l', '--limit', dest='limited', type=str, required=False, default=None, help='limit hostnames to match')
+parser.add_argument('-f', '--filter', dest='hostfilter', type=str, required=False, default=None, help='limit hosts to these attributes, e.g. "model=r630,rack=c0[1-4]"')
 parser.add_argument('--debug', dest='debug', action='store_true', required=False, help='debug output')
 parser.add_argument('-C', '--cli', dest='cli', action='store_true', required=False, help='print QUADS example schedule commands')
-
-def printf(format, *args):
-    sys.stdout.write(format % args)
+parser.add_argument('--horizon', dest='horizon', type=int, required=False, default=365, help='number of days to search ahead')
+parser.add_argument('--config', dest='config', type=str, required=False, default=None, help='YAML file with cluster data')
 
 args = parser.parse_args()
 count = args.count
@@ -31,9 +27,6 @@ limited = args.limited
 debug = args.debug
 cli = args.cli
 
-hostset = ()
-hostnames = ()
-
 quads_config = os.path.dirname(__file__) + "/../conf/quads.yml"
 quads = {}
 
@@ -51,106 +44,49 @@ def load_quads_config():
 
 load_quads_config()
 
+sys.path.append(quads["install_dir"] + "/lib")
+sys.path.append(os.path.dirname(__file__) + "/../lib")
 
-def avail_for(start_day, n, duration):
-    global hostset
-    global hostnames
-    global limited
-    global debug
-    global quads
+from Quads import Quads
+from Availability import Availability
+from ScheduleIndex import quads_epoch_to_date
 
-    if debug:
-        print "DEBUG: avail_for called with : start_days = " + str(start_day) + ", n = " + str(n) + ", duration = " + str(duration)
-    datecommand = "date -d \"today + " + str(start_day) + " days \" '+%Y-%m-%d 08:00'"
-    datestring = os.popen(datecommand).read().rstrip('\n')
-    schedulepycommand = quads["install_dir"] + "/bin/quads.py --cloud-only cloud01 --date \"" + datestring + "\""
-    if limited != None:
-        schedulepycommand += "| egrep '" + limited + "'"
-    if debug:
-        print "DEBUG: schedulepycommand = " + schedulepycommand
-    myoutput = os.popen(schedulepycommand).read().rstrip('\n')
-    if debug:
-        print "DEBUG: myoutput = " + myoutput
-    host_list = [y for y in (x.strip() for x in myoutput.splitlines()) if y]
-    myresult = host_list
-    hostnames = myresult
-
-    i = []
-    for j in range(0, len(myresult)):
-        i.append(j)
-
-    if n <= len(myresult):
-		# item is a single combination of hosts (expressed as integer index into myresult)
-		# we are iterating over them.
-        for item in itertools.combinations(i, n):
-            fail = False
-			# k is a single host in the combination (actually the index)
-            for k in item:
-				# here we check that the host stays in cloud01 (in other words available)
-				# for the duration of days we are requesting
-                if fail:
-                    break
-                for t in range(start_day, (start_day + duration)):
-                    datecommand = "date -d \"today + " + str(t) + " days \" '+%Y-%m-%d 08:00'"
-                    datestring = os.popen(datecommand).read().rstrip('\n')
-                    schedulepycommand = quads["install_dir"] + "/bin/quads.py --host " + myresult[k] + " --date \"" + datestring + "\""
-                    if debug:
-                        print "DEBUG: schedulepycommand = " + schedulepycommand
-                    schedulepyresult = os.popen(schedulepycommand).read().rstrip('\n')
-                    if schedulepyresult != "cloud01":
-                        fail = True
-                        break
-            if not fail:
-                hostset = item
-                return 0
-    if debug:
-        print "DEBUG: avail_for return(1)"
-    return 1
-
-def find_date(node_count, for_days):
-    global debug
-    global quads
+config = args.config
+if config is None:
+    config = quads["data_dir"] + "/schedule.yaml"
+
+journal = None
+if quads.get("data_journal"):
+    from Journal import Journal
+    journal = Journal(config, quads.get("data_journal_max_size", 1048576), quads.get("data_journal_max_age", 86400))
+
+quadsdata = Quads(config, quads["data_dir"] + "/state", "/bin/echo", None, None, False, False,
+                  quads["hardware_service"], quads["hardware_service_url"], journal, True)
 
-    count = 0
-    increment = 0
-    while count < node_count and avail_for(increment, node_count, for_days) != 0:
-        datecommand = "date -d \"today + " + str(increment) + " days \" '+%Y-%m-%d 08:00'"
-        datestring = os.popen(datecommand).read().rstrip('\n')
-        schedulepycommand = quads["install_dir"] + "/bin/quads.py --cloud-only cloud01 --date \"" + datestring + "\""
-        if limited != None:
-            schedulepycommand += "| egrep '" + limited + "'"
-        schedulepycommand += "| wc -l"
-        schedulepystring = os.popen(schedulepycommand).read().rstrip('\n')
-        count = int(schedulepystring)
-        if count < node_count:
-            if debug:
-                print "DEBUG: only " + str(count) + " nodes available. Continuing"
-            increment += 1
-    if debug:
-        print "DEBUG: count = " + str(count) + ", node_count = " + str(node_count)
-        print "DEBUG: find_date return(" + str(increment) + ")"
-    return increment
-
-first_avail = find_date(count, days)
-datecommand = "date -d \"today + " + str(first_avail) + " days \" '+%Y-%m-%d 08:00'"
-startdatestring = os.popen(datecommand).read().rstrip('\n')
+# reservations start at 08:00, from today on
+first = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+if debug:
+    print "DEBUG: searching from " + first.strftime('%Y-%m-%d %H:%M') + " for " + str(args.horizon) + " days"
+
+result = Availability(quadsdata, "cloud01", limited, args.hostfilter).find(count, days, first, args.horizon)
+if result is None:
+    print "No " + str(count) + " nodes are available for " + str(days) + " days within " + str(args.horizon) + " days."
+    exit(1)
+
+start, end, hostset = result
+startdatestring = quads_epoch_to_date(start)
+enddatestring = quads_epoch_to_date(end)
 print "=================="
 print "First available date = " + startdatestring
-datecommand = "date -d \"today + " + str(first_avail + days) + " days \" '+%Y-%m-%d 08:00'"
-if debug:
-    print "DEBUG: datecommand for end date = " + datecommand
-enddatestring = os.popen(datecommand).read().rstrip('\n')
-if debug:
-    print "DEBUG: datestring for end date = " + enddatestring
 print "Requested end date = " + enddatestring
 print "hostnames = "
-for k in hostset:
-    print hostnames[k]
+for h in hostset:
+    print h
 if cli:
     print "=================="
     print "Schedule Commands:"
     print "------------------"
-    for k in hostset:
-        print quads["install_dir"] + "/bin/quads.py --host " + hostnames[k] + " --add-schedule --schedule-start \"" + startdatestring + "\" --schedule-end \"" + enddatestring + "\" --schedule-cloud cloudXX"
+    for h in hostset:
+        print quads["install_dir"] + "/bin/quads.py --host " + h + " --add-schedule --schedule-start \"" + startdatestring + "\" --schedule-end \"" + enddatestring + "\" --schedule-cloud cloudXX"
 
 exit(0)
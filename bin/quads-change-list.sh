@@ -14,20 +14,19 @@ quads=${quads["install_dir"]}/bin/quads.py
 maxdays="183"
 
 function quads_next_change() {
-    n=0 ;
-    while [ $($quads --move-hosts --dry-run --date \
-                     "$(date -d "today + $n days" \
-                     +"%Y-%m-%d 05:00")" | wc -l) -eq 0 ] ; do
-
-        n=$(expr $n + 1)
-        if [ $n -gt $maxdays ]; then
-            echo "Exceeded the configured max days to search."
-            exit 0
-        fi
-    done
+    changes="$($quads --next-change --count 1)"
+    if [ -z "$changes" ]; then
+        echo "No pending changes found."
+        exit 0
+    fi
+    next="$(echo "$changes" | head -1)"
+    n=$(( ( $(date -d "$next" +%s) - $(date -d "$(date +%Y-%m-%d)" +%s) ) / 86400 ))
+    if [ $n -gt $maxdays ]; then
+        echo "Exceeded the configured max days to search."
+        exit 0
+    fi
     echo "Next change in $n days"
-    date -d "today + $n days" +"%Y-%m-%d 05:00"
-    $quads --move-hosts --dry-run --date "$(date -d "today + $n days" +"%Y-%m-%d 05:00")"
+    echo "$changes"
 }
 
 quads_next_change
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# tool to move the QUADS data between the YAML file and the SQLite database
+# used by the Sqlite hardware service
+# e.g. ./quads-sqlite.py --import
+#      ./quads-sqlite.py --export
+
+import argparse
+import os
+import sys
+import yaml
+
+quads_config_file = os.path.join(os.path.dirname(__file__), "..", "conf", "quads.yml")
+try:
+    stream = open(quads_config_file, 'r')
+    quads_config = yaml.load(stream)
+    stream.close()
+except Exception, ex:
+    print ex
+    exit(1)
+
+sys.path.append(os.path.join(quads_config["install_dir"], "lib"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+from Journal import Journal
+from QuadsData import QuadsData
+from ScheduleIndex import quads_refresh_epochs
+from SqliteData import SqliteData
+
+defaultconfig = os.path.join(quads_config["data_dir"], "schedule.yaml")
+
+parser = argparse.ArgumentParser(description='Import or export the QUADS SQLite database')
+parser.add_argument('-c', '--config', dest='config', type=str, default=defaultconfig, help='YAML file with cluster data')
+parser.add_argument('--database', dest='database', type=str, default=None, help='SQLite database (default: the YAML file with a .db extension)')
+parser.add_argument('--import', dest='importdata', action='store_true', help='Load the YAML file into the database, replacing its contents')
+parser.add_argument('--export', dest='exportdata', action='store_true', help='Write the database contents to the YAML file')
+
+args = parser.parse_args()
+
+if args.importdata == args.exportdata:
+    print "Exactly one of --import and --export is required"
+    exit(1)
+
+database = args.database
+if database is None:
+    database = os.path.splitext(args.config)[0] + ".db"
+
+if args.importdata:
+    try:
+        stream = open(args.config, 'r')
+        data = yaml.load(stream)
+        stream.close()
+    except Exception, ex:
+        print ex
+        exit(1)
+    # changes not yet compacted into the YAML file are in the journal
+    Journal(args.config).replay(data)
+    quads_refresh_epochs(data.get("hosts"))
+    quads = QuadsData(data)
+    quads.upgrade()
+    SqliteData(database).save(quads.as_dict())
+    print "Imported " + args.config + " into " + database
+    exit(0)
+
+if not os.path.isfile(database):
+    print database + " does not exist"
+    exit(1)
+data = SqliteData(database).load()
+try:
+    stream = open(args.config + ".tmp", 'w')
+    stream.write(yaml.dump(data, default_flow_style=False))
+    stream.close()
+    os.rename(args.config + ".tmp", args.config)
+    # a journal left from journal mode would be replayed over the export
+    Journal(args.config).clear()
+except Exception, ex:
+    print ex
+    exit(1)
+print "Exported " + database + " to " + args.config
@@ -1,16 +1,15 @@
 #!/usr/bin/env python
 
-from datetime import datetime
+from datetime import datetime, timedelta
 import calendar
 import time
 import yaml
 import argparse
 import os
+import shlex
+import signal
 import sys
 import logging
-import requests
-from subprocess import call
-from subprocess import check_call
 
 logger = logging.getLogger('quads')
 ch = logging.StreamHandler(sys.stdout)
@@ -34,6 +33,15 @@ def quads_load_config(quads_config):
         exit(1)
     return(quads_config_yaml)
 
+# queries neither write the data nor touch the state dir, and can be
+# answered by quadsd
+def quads_readonly(args):
+    return not (args.initialize or args.syncstate or args.maintain or args.exportstate or args.movehosts or
+                args.hostresource or args.cloudresource or args.rmhost or args.rmcloud or args.addschedule or
+                args.rmschedule is not None or args.modschedule is not None or args.extendcloud or
+                args.applyplan or args.archive or args.daemon or args.queuerequest or
+                args.rmqueuerequest is not None or (args.placequeue and not args.dryrun))
+
 def main(argv):
     quads_config_file = os.path.join(os.path.dirname(__file__), "..", "conf", "quads.yml")
     quads_config = quads_load_config(quads_config_file)
@@ -57,7 +65,6 @@ def main(argv):
 
     sys.path.append(os.path.join(quads_config["install_dir"], "lib"))
     sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lib"))
-    import Quads
 
     sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lib/hardware_services/hardware_drivers"))
 
@@ -92,37 +99,76 @@ def main(argv):
     parser.add_argument('--define-cloud', dest='cloudresource', type=str, default=None, help='Define a cloud environment')
     parser.add_argument('--define-host', dest='hostresource', type=str, default=None, help='Define a host resource')
     parser.add_argument('--description', dest='description', type=str, default=None, help='Defined description of cloud')
+    parser.add_argument('--host-attributes', dest='hostattributes', type=str, default=None, help='Declare attributes of the host with --define-host; e.g. "model=r630,nics=4"')
     parser.add_argument('--default-cloud', dest='hostcloud', type=str, default=None, help='Defined default cloud for a host')
     parser.add_argument('--force', dest='force', action='store_true', help='Force host or cloud update when already defined')
     parser.add_argument('--summary', dest='summary', action='store_true', help='Generate a summary report')
     parser.add_argument('--full-summary', dest='fullsummary', action='store_true', help='Generate a summary report')
     parser.add_argument('--add-schedule', dest='addschedule', action='store_true', help='Define a host reservation')
     parser.add_argument('--mod-schedule', dest='modschedule', type=int, default=None, help='Modify a host reservation')
-    parser.add_argument('--schedule-query', dest='schedquery', action='store_true', help='Query the schedule for a specific month')
+    parser.add_argument('--schedule-query', dest='schedquery', action='store_true', help='Query the schedule for a specific month, or for the range given by --schedule-start and --schedule-end')
+    parser.add_argument('--cloud-counts', dest='cloudcounts', action='store_true', default=None, help='Print the number of hosts in every cloud for every day (or hour with --hourly) from --schedule-start to --schedule-end, needs numpy')
+    parser.add_argument('--hourly', dest='hourly', action='store_true', default=None, help='Count per hour instead of per day with --cloud-counts')
     parser.add_argument('--month', dest='month', type=str, default=datetime.now().month, help='Query the schedule for a specific month and year')
     parser.add_argument('--year', dest='year', type=str, default=datetime.now().year, help='Query the schedule for a specific month and year')
+    parser.add_argument('--next-change', dest='nextchange', action='store_true', default=None, help='List the next schedule transitions and the host moves they cause')
+    parser.add_argument('--after', dest='after', type=str, default=None, help='Look for changes after this date/time (default now) when used with --next-change')
+    parser.add_argument('--count', dest='count', type=int, default=None, help='Number of transitions listed by --next-change (default 1), or of hosts requested with --queue-request')
+    parser.add_argument('--export', dest='exportformat', type=str, choices=['json'], default=None, help='Print every cloud with its details and hosts, and the active schedule of every host, at --date (default now)')
+    parser.add_argument('--forecast', dest='forecast', action='store_true', default=None, help='Report how many hosts of cloud01 are free on each of the next --days days from --date (default today 08:00)')
+    parser.add_argument('--days', dest='days', type=int, default=None, help='Number of days reported by --forecast (default 180), or requested with --queue-request')
+    parser.add_argument('--group-by', dest='groupby', type=str, default=None, help='Count the hosts per value of this host attribute (e.g. model) with --forecast')
+    parser.add_argument('--format', dest='forecastformat', type=str, choices=['csv', 'json'], default='csv', help='Output format of --forecast')
+    parser.add_argument('--threshold', dest='thresholds', type=str, default=None, help='With --forecast, report the first day at least this many hosts are free instead; e.g. "10,20,50"')
+    parser.add_argument('--queue-request', dest='queuerequest', action='store_true', default=None, help='Queue a request for --count hosts for --days days in --schedule-cloud, starting no earlier than --schedule-start')
+    parser.add_argument('--ls-queue', dest='lsqueue', action='store_true', default=None, help='List the queued requests')
+    parser.add_argument('--rm-queue-request', dest='rmqueuerequest', type=int, default=None, help='Remove a queued request')
+    parser.add_argument('--place-queue', dest='placequeue', action='store_true', default=None, help='Place every queued request from --date (default today 08:00) on, and add their schedules with a single write; use --dry-run to only show the placements')
+    parser.add_argument('--horizon', dest='horizon', type=int, default=365, help='Number of days --place-queue searches ahead')
+    parser.add_argument('--request-description', dest='requestdescription', type=str, default=None, help='Description of the request queued with --queue-request')
+    parser.add_argument('--check-schedules', dest='checkschedules', action='store_true', default=None, help='Check the schedules of every host for overlaps and errors')
+    parser.add_argument('--archive', dest='archive', action='store_true', default=None, help='Move expired schedules and old history to the archive file')
+    parser.add_argument('--archive-before', dest='archivebefore', type=str, default=None, help='Archive schedules that ended before this date/time (default now) when used with --archive')
     parser.add_argument('--schedule-start', dest='schedstart', type=str, default=None, help='Schedule start date/time')
     parser.add_argument('--schedule-end', dest='schedend', type=str, default=None, help='Schedule end date/time')
     parser.add_argument('--schedule-cloud', dest='schedcloud', type=str, default=None, help='Schedule cloud')
+    parser.add_argument('--host-file', dest='hostfile', type=str, default=None, help='File with one host per line, used instead of --host with --add-schedule')
+    parser.add_argument('--apply', dest='applyplan', type=str, default=None, help='Apply the operations in a plan file with a single write, use --dry-run to only show the changes')
+    parser.add_argument('--extend-cloud', dest='extendcloud', type=str, default=None, help='Move the end of the active schedule of every host in this cloud to --schedule-end')
     parser.add_argument('--ls-schedule', dest='lsschedule', action='store_true', help='List the host reservations')
     parser.add_argument('--rm-schedule', dest='rmschedule', type=int, default=None, help='Remove a host reservation')
+    parser.add_argument('--filter', dest='hostfilter', type=str, default=None, help='Only report hosts with these attributes (rack, u, model, nics or declared); e.g. "model=r630,rack=c0[1-4]"')
     parser.add_argument('--ls-hosts', dest='lshosts', action='store_true', default=None, help='List all hosts')
     parser.add_argument('--ls-clouds', dest='lsclouds', action='store_true', default=None, help='List all clouds')
     parser.add_argument('--rm-host', dest='rmhost', type=str, default=None, help='Remove a host')
     parser.add_argument('--rm-cloud', dest='rmcloud', type=str, default=None, help='Remove a cloud')
     parser.add_argument('--statedir', dest='statedir', type=str, default=defaultstatedir, help='Default state dir')
     parser.add_argument('--sync', dest='syncstate', action='store_true', default=None, help='Sync state of hosts')
+    parser.add_argument('--maintain', dest='maintain', action='store_true', default=None, help='Initialize history and sync the state of hosts if the data changed since the last run (always with --force)')
+    parser.add_argument('--export-state', dest='exportstate', action='store_true', default=None, help='Rewrite the per-host files in the state dir from the state file')
     parser.add_argument('--move-hosts', dest='movehosts', action='store_true', default=None, help='Move hosts if schedule has changed')
     parser.add_argument('--move-command', dest='movecommand', type=str, default=defaultmovecommand, help='External command to move a host')
-    parser.add_argument('--dry-run', dest='dryrun', action='store_true', default=None, help='Dont update state when used with --move-hosts')
+    parser.add_argument('--dry-run', dest='dryrun', action='store_true', default=None, help='Dont update state when used with --move-hosts, only show the changes when used with --apply or --place-queue')
     parser.add_argument('--log-path', dest='logpath',type=str,default=None, help='Path to quads log file')
+    parser.add_argument('--daemon', dest='daemon', action='store_true', default=None, help='Run quadsd, answering queries on the daemon_socket from conf/quads.yml')
+    parser.add_argument('--batch', dest='batch', action='store_true', default=None, help='Answer the queries read from stdin, one per line, each answer followed by an empty line')
+    parser.add_argument('--no-daemon', dest='nodaemon', action='store_true', default=None, help='Do not ask quadsd, answer the query in this process')
 
     # command line options to set hardware service and hardware service url manually
     # added to maintain consistency with other config file parameters (which are set either in the config file or through the cli)
     parser.add_argument('--set-hardware-service', dest='hardwareservice', type=str, default=defaulthardwareservice, help='Set Hardware Service');
     parser.add_argument('--set-hardware-service-url', dest='hardwareserviceurl', type=str, default=defaulthardwareserviceurl, help='Set Hardware Service URL');
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    readonly = quads_readonly(args)
+
+    # let quadsd answer queries when it is running
+    if readonly and not args.batch and not args.nodaemon and quads_config.get("daemon_socket"):
+        from QuadsDaemon import quads_daemon_query
+        reply = quads_daemon_query(quads_config["daemon_socket"], argv)
+        if reply is not None:
+            sys.stdout.write(reply[1])
+            exit(reply[0])
 
     if args.logpath :
         quads_config["log"] = args.logpath
@@ -188,12 +234,123 @@ def main(argv):
     #
     #   hardwareservice - ????
     #
+    #   readonly - used for queries.  The state dir is not synced and the data
+    #            is never written, even if the history needs initializing.
+    #            The dirty flag is set instead, run --maintain (e.g. from cron)
+    #            to do that once after a change.
+    #
+
+    import Quads
+
+    # optional journal mode, see "data_journal" in conf/quads.yml
+    journal = None
+    if quads_config.get("data_journal"):
+        import Journal
+        journal = Journal.Journal(args.config, quads_config.get("data_journal_max_size", 1048576),
+                                  quads_config.get("data_journal_max_age", 86400))
+
+    if args.daemon:
+        if not quads_config.get("daemon_socket"):
+            print "quads: Missing \"daemon_socket\" in " + quads_config_file
+            exit(1)
+        from QuadsDaemon import QuadsDaemon
+        args.config = os.path.abspath(args.config)
+
+        def factory():
+            return Quads.Quads(args.config, args.statedir, args.movecommand, None, None, False, False, args.hardwareservice, args.hardwareserviceurl, journal, True)
+
+        # only queries on the same data are answered, anything else is
+        # run by the client itself
+        def handler(quads, queryargv):
+            queryargs = parser.parse_args(queryargv)
+            if not quads_readonly(queryargs) or queryargs.batch or os.path.abspath(queryargs.config) != args.config or \
+                    queryargs.hardwareservice != args.hardwareservice:
+                return False
+            quads_command(quads, queryargs)
+
+        signal.signal(signal.SIGTERM, lambda signum, frame: exit(0))
+        QuadsDaemon(quads_config["daemon_socket"], factory, handler).serve()
+        exit(0)
+
+    quads = Quads.Quads(args.config, args.statedir, args.movecommand, args.datearg, args.syncstate, args.initialize, args.force, args.hardwareservice, args.hardwareserviceurl, journal, readonly)
+
+    if args.batch:
+        # exit() closes sys.stdin, so read from a copy of it
+        exit(quads_batch(quads, parser, os.fdopen(os.dup(sys.stdin.fileno()))))
 
-    quads = Quads.Quads(args.config, args.statedir, args.movecommand, args.datearg, args.syncstate, args.initialize, args.force, args.hardwareservice, args.hardwareserviceurl)
+    quads_command(quads, args)
+
+# the options a --batch query line stands for.  A line is either quads.py
+# options or one of
+#   HOST[@DATE]                     the cloud of HOST
+#   cloud-only CLOUD[@DATE]         the hosts in CLOUD
+#   summary[@DATE], full-summary[@DATE]
+#   owner CLOUD, ticket CLOUD, qinq CLOUD, cc-users CLOUD
+# raises ValueError for anything else
+def quads_batch_argv(line):
+    if line.startswith("-"):
+        try:
+            return shlex.split(line)
+        except ValueError, ex:
+            raise ValueError("Invalid query (%s)" % ex)
+    head, at, date = line.partition("@")
+    words = head.split()
+    argv = []
+    if at:
+        argv = ["--datetime", date.strip()]
+    if words == ["summary"] or words == ["full-summary"]:
+        return ["--" + words[0]] + argv
+    if len(words) == 2 and words[0] == "cloud-only":
+        return ["--cloud-only", words[1]] + argv
+    if len(words) == 2 and words[0] in ["owner", "ticket", "qinq", "cc-users"]:
+        # these list the current settings only
+        if at:
+            raise ValueError("@DATE is not supported for " + words[0] + " queries")
+        return ["--ls-" + words[0], "--cloud-only", words[1]]
+    if len(words) == 1:
+        return ["--host", words[0]] + argv
+    raise ValueError("Invalid query")
+
+# answer the queries in stream against quads, which is loaded once.
+# returns 1 if any of them failed
+def quads_batch(quads, parser, stream):
+    failed = 0
+    # readline() rather than iterating, so answers are not held back
+    # until more queries arrive
+    for line in iter(stream.readline, ""):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            queryargv = quads_batch_argv(line)
+        except ValueError, ex:
+            print "quads: " + str(ex) + ": " + line
+            failed = 1
+        else:
+            try:
+                queryargs = parser.parse_args(queryargv)
+                if not quads_readonly(queryargs) or queryargs.batch:
+                    print "quads: Only queries are allowed with --batch: " + line
+                    failed = 1
+                else:
+                    quads_command(quads, queryargs)
+            except SystemExit, ex:
+                if ex.code:
+                    failed = 1
+        print
+        sys.stdout.flush()
+    return failed
+
+# run the command given by args against quads, always exits
+def quads_command(quads, args):
+    if args.maintain:
+        if args.force:
+            quads.quads_maintain(True)
+        exit(0)
 
     # should these be mutually exclusive?
     if args.lshosts:
-        quads.quads_list_hosts()
+        quads.quads_list_hosts(args.hostfilter)
         exit(0)
 
     if args.lsclouds:
@@ -233,7 +390,7 @@ def main(argv):
         exit(1)
 
     if args.hostresource:
-        quads.quads_update_host(args.hostresource, args.hostcloud, args.force)
+        quads.quads_update_host(args.hostresource, args.hostcloud, args.force, args.hostattributes)
         exit(0)
 
     if args.cloudresource:
@@ -247,31 +404,147 @@ def main(argv):
         print "    --mod-schedule"
         exit(1)
 
+    if args.cloudcounts:
+        if args.schedstart is None or args.schedend is None:
+            print "--cloud-counts needs --schedule-start and --schedule-end"
+            exit(1)
+        try:
+            start = datetime.strptime(args.schedstart, '%Y-%m-%d %H:%M')
+            end = datetime.strptime(args.schedend, '%Y-%m-%d %H:%M')
+        except Exception, ex:
+            logger.error("Data format error : %s" % ex)
+            exit(1)
+        step = timedelta(days=1)
+        if args.hourly:
+            step = timedelta(hours=1)
+        quads.quads_cloud_counts(start, end, step)
+        exit(0)
+
     if args.schedquery:
-        schedule = None
-        schedule = quads.quads_hosts_schedule(month=args.month,year=args.year)
-
-        print "Host Schedule for {}/{}".format(args.schedquery,args.year)
-        print "Note: This is a per-day view. Every entry is a day in a given month."
-        print "      This only shows the cloud number per entry"
-        for host in sorted(schedule.iterkeys()) :
-            _daily=""
-            for day in schedule[host][args.year][args.month]:
-                _daily = "{} {}".format(_daily,schedule[host][args.year][args.month][day][1].strip('cloud'))
-            print "{}\t {}".format(host.split('.')[0],_daily)
+        if args.schedstart is not None or args.schedend is not None:
+            if args.schedstart is None or args.schedend is None:
+                print "Both --schedule-start and --schedule-end are needed for a ranged --schedule-query"
+                exit(1)
+            try:
+                start = datetime.strptime(args.schedstart, '%Y-%m-%d %H:%M')
+                end = datetime.strptime(args.schedend, '%Y-%m-%d %H:%M')
+            except Exception, ex:
+                logger.error("Data format error : %s" % ex)
+                exit(1)
+        else:
+            start = datetime(int(args.year), int(args.month), 1)
+            end = start + timedelta(days=calendar.monthrange(int(args.year), int(args.month))[1])
+
+        samples, schedule = quads.quads_hosts_schedule_range(start, end)
+
+        # one block per month covered by the requested range
+        months = []
+        for sample in samples:
+            if (sample.year, sample.month) not in months:
+                months.append((sample.year, sample.month))
+
+        for year, month in months:
+            print "Host Schedule for {}/{}".format(month, year)
+            print "Note: This is a per-day view. Every entry is a day in a given month."
+            print "      This only shows the cloud number per entry"
+            for host in sorted(schedule.iterkeys()) :
+                _daily=""
+                for sample, current in zip(samples, schedule[host]):
+                    if (sample.year, sample.month) == (year, month):
+                        _daily = "{} {}".format(_daily,current[1].strip('cloud'))
+                print "{}\t {}".format(host.split('.')[0],_daily)
+        exit(0)
+
+    if args.nextchange:
+        if args.count is None:
+            args.count = 1
+        quads.quads_next_change(args.after, args.count)
+        exit(0)
+
+    if args.applyplan:
+        quads.quads_apply_plan(args.applyplan, args.dryrun)
+        exit(0)
+
+    if args.checkschedules:
+        quads.quads_check_schedules()
+        exit(0)
+
+    if args.queuerequest:
+        if args.count is None or args.days is None:
+            print "--queue-request needs --count and --days"
+            exit(1)
+        quads.quads_queue_request(args.count, args.days, args.schedstart, args.schedcloud, args.hostfilter,
+                                  args.requestdescription)
+        exit(0)
+
+    if args.lsqueue:
+        quads.quads_list_queue()
+        exit(0)
+
+    if args.rmqueuerequest is not None:
+        quads.quads_rm_queue_request(args.rmqueuerequest)
+        exit(0)
+
+    if args.placequeue:
+        quads.quads_place_queue(args.dryrun, args.datearg, args.horizon)
+        exit(0)
+
+    if args.forecast:
+        thresholds = []
+        if args.thresholds is not None:
+            try:
+                thresholds = [int(t) for t in args.thresholds.split(",")]
+            except ValueError:
+                print "--threshold needs a comma separated list of host counts"
+                exit(1)
+        if args.days is None:
+            args.days = 180
+        quads.quads_forecast(args.days, args.datearg, args.groupby, args.forecastformat, thresholds, args.hostfilter)
+        exit(0)
+
+    if args.exportformat:
+        quads.quads_export(args.exportformat, args.datearg)
+        exit(0)
+
+    if args.exportstate:
+        quads.quads_export_state()
+        exit(0)
+
+    if args.archive:
+        quads.quads_archive(args.archivebefore)
         exit(0)
 
     if args.addschedule:
-        if args.schedstart is None or args.schedend is None or args.schedcloud is None or args.host is None:
+        if args.schedstart is None or args.schedend is None or args.schedcloud is None or (args.host is None and args.hostfile is None):
             print "Missing option. All these options are required for --add-schedule:"
-            print "    --host"
+            print "    --host (or --host-file)"
             print "    --schedule-start"
             print "    --schedule-end"
             print "    --schedule-cloud"
             exit(1)
+        if args.hostfile is not None:
+            if args.host is not None:
+                print "--host and --host-file are mutually exclusive."
+                exit(1)
+            try:
+                stream = open(args.hostfile, 'r')
+                hosts = [l.strip() for l in stream if l.strip() and not l.strip().startswith('#')]
+                stream.close()
+            except Exception, ex:
+                logger.error("There was a problem with your file %s" % ex)
+                exit(1)
+            quads.quads_add_hosts_schedule(args.schedstart, args.schedend, args.schedcloud, hosts)
+            exit(0)
         quads.quads_add_host_schedule(args.schedstart, args.schedend, args.schedcloud, args.host)
         exit(0)
 
+    if args.extendcloud:
+        if args.schedend is None:
+            print "Missing option. Need --schedule-end when using --extend-cloud"
+            exit(1)
+        quads.quads_extend_cloud_schedule(args.extendcloud, args.schedend, args.datearg)
+        exit(0)
+
     if args.rmschedule is not None:
         quads.quads_rm_host_schedule(args.rmschedule, args.host)
         exit(0)
@@ -299,7 +572,8 @@ def main(argv):
         exit(0)
 
     # finally, this part is just reporting ...
-    quads.quads_print_result(args.host, args.cloudonly, args.datearg, args.summary, args.fullsummary, args.lsschedule)
+    quads.quads_print_result(args.host, args.cloudonly, args.datearg, args.summary, args.fullsummary, args.lsschedule,
+                             args.hostfilter)
 
     exit(0)
 
@@ -0,0 +1,11 @@
+#!/usr/bin/env python
+# run the QUADS query daemon.  It answers the queries of quads.py on the
+# unix socket set as daemon_socket in conf/quads.yml
+# e.g. ./quadsd.py
+#      ./quadsd.py --config /opt/quads/data/schedule.yaml
+
+import os
+import sys
+
+quads = os.path.join(os.path.dirname(os.path.abspath(__file__)), "quads.py")
+os.execv(sys.executable, [sys.executable, quads, "--daemon"] + sys.argv[1:])
@@ -12,7 +12,8 @@ import yaml
 import csv
 from subprocess import call
 from subprocess import check_call
-from datetime import datetime
+from datetime import datetime, timedelta
+import time
 
 parser = argparse.ArgumentParser(description='Generate a simple HTML table with color depicting resource usage for the month')
 requiredArgs=parser.add_argument_group('Required Arguments')
@@ -60,13 +61,20 @@ sys.path.append(quads_config["install_dir"] + "/lib")
 sys.path.append(os.path.dirname(__file__) + "../lib")
 
 from Quads import Quads
+from Journal import Journal
 
 defaultstatedir = quads_config["data_dir"] + "/state"
 defaultmovecommand = "/bin/echo"
 
+journal = None
+if quads_config.get("data_journal"):
+    journal = Journal(quads_config["data_dir"] + "/schedule.yaml", quads_config.get("data_journal_max_size", 1048576),
+                      quads_config.get("data_journal_max_age", 86400))
+
 quads = Quads(quads_config["data_dir"] + "/schedule.yaml",
                        defaultstatedir, defaultmovecommand,
-                       None, None, False, False)
+                       None, None, False, False,
+                       quads_config["hardware_service"], quads_config["hardware_service_url"], journal, True)
 
 # Set maxcloud to maximum defined clouds
 maxcloud = len(quads.get_clouds())
@@ -131,19 +139,21 @@ def print_simple_table(data, data_colors, days):
     for i in range(0, days):
         print "<th width=20>" + ('0' if i < 9 else '') + str(i+1) + "</th>"
     print "</tr>"
+    cell_times = []
+    for j in range(0, days):
+        cell_times.append(time.mktime(datetime(int(year), int(month), j + 1).timetuple()))
+    cloud_history = quads.quads.cloud_history
     for i in range(0, len(data)):
         print "<tr>"
         print "<td>" + str(data[i][0]) + "</td>"
         for j in range(0, days):
             chosen_color = data_colors[i][j]
-            cell_date = year + "-" + month + "-" + str(j + 1) + " 00:00"
-            cell_time = datetime.strptime(cell_date, '%Y-%m-%d %H:%M')
-            history = quads.get_history()
-            for c in sorted(history["cloud" + str(chosen_color)]):
-                if datetime.fromtimestamp(c) <= cell_time:
-                    display_description = history["cloud" + str(chosen_color)][c]["description"]
-                    display_owner = history["cloud" + str(chosen_color)][c]["owner"]
-                    display_ticket = history["cloud" + str(chosen_color)][c]["ticket"]
+            display = cloud_history.as_of("cloud" + str(chosen_color), cell_times[j])
+            if display is None:
+                display = quads.get_clouds()["cloud" + str(chosen_color)]
+            display_description = display["description"]
+            display_owner = display["owner"]
+            display_ticket = display["ticket"]
             print "<td bgcolor=\"" + \
                 color_array[int(chosen_color)-1] + \
                 "\" data-toggle=\"tooltip\" title=\"" + \
@@ -164,20 +174,16 @@ if host_file:
         your_list = list(reader)
 else:
     your_list = []
-    for h in sorted(quads.hosts.data.iterkeys()):
+    for h in sorted(quads.quads.hosts.data.iterkeys()):
         your_list.append([h])
 
+month_start = datetime(int(year), int(month), 1)
+samples, month_schedule = quads.quads_hosts_schedule_range(month_start, month_start + timedelta(days=days))
+
 your_list_colors = []
 for h in your_list:
     one_host = []
-    for d in range(0, days):
-        day = d + 1
-        if day < 10:
-            daystring = "0" + str(day)
-        else:
-            daystring = str(day)
-        print quads._quads_find_current(h[0],"{}-{}-{} 00:00".format(year,month,daystring))
-        default, current, override = quads._quads_find_current(h[0],"{}-{}-{} 00:00".format(year,month,daystring))
+    for default, current, override in month_schedule.get(h[0], []):
         if current:
           one_host.append(current.lstrip("cloud"))
     your_list_colors.append(one_host)
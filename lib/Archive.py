@@ -0,0 +1,108 @@
+# This file is part of QUADs.
+#
+# QUADs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUADs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUADs.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+import yaml
+
+from CloudHistory import CloudHistory
+from ScheduleIndex import quads_refresh_epochs, quads_schedule_epochs
+
+
+class Archive(object):
+    def __init__(self, config):
+        """
+        Initialize an Archive object.  Expired schedules and old history
+        are moved out of the config into config + ".archive", which is
+        only read for queries before the archive horizon recorded in the
+        config.
+        """
+        self.logger = logging.getLogger("quads.Archive")
+        self.logger.setLevel(logging.DEBUG)
+        self.path = config + ".archive"
+        self.data = {"hosts": {}, "history": {}, "cloud_history": {}}
+        if os.path.isfile(self.path):
+            try:
+                stream = open(self.path, 'r')
+                self.data.update(yaml.load(stream))
+                stream.close()
+                quads_refresh_epochs(self.data["hosts"])
+            except Exception, ex:
+                self.logger.error("There was a problem with your archive %s" % ex)
+                exit(1)
+
+    def write(self):
+        try:
+            stream = open(self.path + ".tmp", 'w')
+            stream.write(yaml.dump(self.data, default_flow_style=False))
+            stream.close()
+            os.rename(self.path + ".tmp", self.path)
+        except Exception, ex:
+            self.logger.error("There was a problem with your archive %s" % ex)
+            exit(1)
+
+    def archive(self, quads, horizon):
+        """
+        Move the schedules of quads (a QuadsData object) that ended by the
+        epoch "horizon", and the history entries no longer needed to
+        answer queries from "horizon" on, into the archive.  Returns the
+        number of schedules and history entries moved.
+        """
+        schedules = 0
+        entries = 0
+        for h, host in quads.hosts.data.iteritems():
+            for override in host["schedule"].keys():
+                start, end = quads_schedule_epochs(host["schedule"][override])
+                if end <= horizon:
+                    archived = self.data["hosts"].setdefault(h, {"schedule": {}})
+                    archived["schedule"][override] = host["schedule"].pop(override)
+                    quads.next_schedule_ids[h] = max(quads.next_schedule_ids.get(h, 0), override + 1)
+                    quads.mark_dirty("hosts", h)
+                    schedules += 1
+
+        for section, name in [(quads.history.data, "history"), (quads.cloud_history.data, "cloud_history")]:
+            for key, records in section.iteritems():
+                # the last record at or before the horizon is still in
+                # effect after it and stays in the config
+                times = sorted(t for t in records if t <= horizon)
+                for t in times[:-1]:
+                    self.data[name].setdefault(key, {})[t] = records.pop(t)
+                    quads.mark_dirty(name, key)
+                    entries += 1
+        quads.cloud_history.times = {}
+
+        return schedules, entries
+
+    def merged(self, quads):
+        """
+        Return hosts, history and a CloudHistory object combining the
+        archive with quads (a QuadsData object), for queries before the
+        archive horizon.
+        """
+        hosts = {}
+        for h, host in quads.hosts.data.iteritems():
+            hosts[h] = dict(host)
+            hosts[h]["schedule"] = dict(host["schedule"])
+            if h in self.data["hosts"]:
+                hosts[h]["schedule"].update(self.data["hosts"][h]["schedule"])
+        history = {}
+        for h, records in quads.history.data.iteritems():
+            history[h] = dict(self.data["history"].get(h, {}))
+            history[h].update(records)
+        cloud_history = {}
+        for c, records in quads.cloud_history.data.iteritems():
+            cloud_history[c] = dict(self.data["cloud_history"].get(c, {}))
+            cloud_history[c].update(records)
+        return hosts, history, CloudHistory({"cloud_history": cloud_history})
@@ -0,0 +1,153 @@
+# This file is part of QUADs.
+#
+# QUADs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUADs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUADs.  If not, see <http://www.gnu.org/licenses/>.
+
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+import re
+import time
+
+
+class Availability(object):
+    def __init__(self, quads, pool="cloud01", limit=None, hostfilter=None):
+        """
+        Initialize an Availability object.  This finds when hosts of the
+        spare pool (the cloud hosts are in when not assigned) are free,
+        using the schedule index of quads (a Quads object).  Only hosts
+        whose name matches the regular expression limit, and that match
+        the attribute filter hostfilter (see HostIndex), are considered.
+        """
+        self.quads = quads
+        self.pool = pool
+        self.hosts = sorted(quads.quads.hosts.data.iterkeys())
+        if limit is not None:
+            self.hosts = [h for h in self.hosts if re.search(limit, h)]
+        if hostfilter is not None:
+            selected = quads.quads_filter_hosts(hostfilter)
+            self.hosts = [h for h in self.hosts if h in selected]
+
+    def free_intervals(self, host, start, end):
+        """
+        Return the sorted, disjoint [(start, end), ...] epoch intervals
+        within [start, end) during which host is in the pool and has no
+        schedule at all, so a new schedule there does not conflict.  Hosts
+        whose default cloud is not the pool are never free.
+        """
+        if self.quads.quads.hosts.data[host]["cloud"] != self.pool:
+            return []
+        entries = self.quads.schedule_index.overlapping(host, start, end)
+        busy = [(s, e) for s, e, override, cloud in entries]
+        return _subtract([(start, end)], _merge(busy))
+
+    def find(self, count, days, first, horizon=365):
+        """
+        Return (start, end, hosts) for the earliest start, from the
+        datetime "first" on and in steps of one day, at which "count"
+        hosts are free for "days" consecutive days.  start and end are
+        epochs and hosts are the first "count" free hosts by name.
+        Returns None if there is no such start within "horizon" days.
+        """
+        # local day boundaries, so a start stays at the same time of day
+        # across daylight saving changes
+        grid = [int(time.mktime((first + timedelta(days=k)).timetuple())) for k in range(horizon + days + 1)]
+
+        # every host is free to start from a range of grid positions per
+        # free interval.  sweep over the range boundaries in order.
+        events = []
+        for h in self.hosts:
+            for s, e in self.free_intervals(h, grid[0], grid[-1]):
+                low = bisect_left(grid, s)
+                high = bisect_right(grid, e) - 1 - days
+                if low <= high:
+                    events.append((low, 1, h))
+                    events.append((high + 1, -1, h))
+        events.sort()
+
+        free = set()
+        i = 0
+        while i < len(events):
+            position = events[i][0]
+            while i < len(events) and events[i][0] == position:
+                if events[i][1] > 0:
+                    free.add(events[i][2])
+                else:
+                    free.discard(events[i][2])
+                i += 1
+            if len(free) >= count and position < len(grid) - days:
+                return grid[position], grid[position + days], sorted(free)[:count]
+        return None
+
+    def daily(self, days, first, groupby=None):
+        """
+        Return (days, counts) for the "days" days from the datetime
+        "first" on.  days are the epochs the days start at and counts is
+        {group: [number of hosts free for the whole day, ...]}, with the
+        hosts grouped by the value of the host attribute groupby (see
+        HostIndex), or all in the group "total".
+        """
+        grid = [int(time.mktime((first + timedelta(days=k)).timetuple())) for k in range(days + 1)]
+        # +1 at the first day of every free stretch, -1 after the last
+        changes = {}
+        for h in self.hosts:
+            group = "total"
+            if groupby is not None:
+                group = self.quads.host_index.attributes[h].get(groupby, "unknown")
+            change = changes.setdefault(group, [0] * (days + 1))
+            for s, e in self.free_intervals(h, grid[0], grid[-1]):
+                low = bisect_left(grid, s)
+                high = bisect_right(grid, e) - 1
+                if low < high:
+                    change[low] += 1
+                    change[high] -= 1
+
+        counts = {}
+        for group, change in changes.iteritems():
+            free = 0
+            counts[group] = []
+            for k in range(days):
+                free += change[k]
+                counts[group].append(free)
+        return grid[:-1], counts
+
+
+# merge overlapping [(start, end), ...] intervals
+def _merge(intervals):
+    merged = []
+    for s, e in sorted(intervals):
+        if s >= e:
+            continue
+        if merged and s <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+        else:
+            merged.append((s, e))
+    return merged
+
+
+# the parts of the merged intervals "free" not covered by the merged
+# intervals "busy"
+def _subtract(free, busy):
+    result = []
+    j = 0
+    for s, e in free:
+        while j < len(busy) and busy[j][1] <= s:
+            j += 1
+        k = j
+        while k < len(busy) and busy[k][0] < e:
+            if busy[k][0] > s:
+                result.append((s, busy[k][0]))
+            s = max(s, busy[k][1])
+            k += 1
+        if s < e:
+            result.append((s, e))
+    return result
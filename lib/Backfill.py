@@ -0,0 +1,103 @@
+# This file is part of QUADs.
+#
+# QUADs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUADs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUADs.  If not, see <http://www.gnu.org/licenses/>.
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+import time
+
+from Availability import Availability
+from ScheduleIndex import quads_date_to_epoch
+
+
+class Backfill(object):
+    def __init__(self, quads, first, horizon=365, pool="cloud01"):
+        """
+        Initialize a Backfill object.  This places queued reservation
+        requests (see ReservationQueue) on the free time of the hosts of
+        the spare pool, from the datetime "first" on and at most
+        "horizon" days ahead.
+        """
+        self.quads = quads
+        self.first = first
+        self.horizon = horizon
+        self.availability = Availability(quads, pool)
+
+    def place(self, requests):
+        """
+        Return [(request, start, end, hosts), ...] in queue order.  Every
+        request gets the earliest start, in steps of one day from its own
+        start on, at which enough hosts are free, taking the time given
+        to the requests before it.  Later requests so fill the gaps left
+        before earlier ones (backfill).  Among the free hosts the ones
+        whose free interval is used up best are picked, to keep the free
+        time in few large pieces.  start, end and hosts are None for
+        requests that do not fit.
+        """
+        longest = max([r["days"] for r in requests] + [0])
+        start = int(time.mktime(self.first.timetuple()))
+        end = int(time.mktime((self.first + timedelta(days=self.horizon + longest)).timetuple()))
+        free = dict((h, self.availability.free_intervals(h, start, end)) for h in self.availability.hosts)
+
+        placements = []
+        for request in requests:
+            placements.append((request,) + self._place(request, free))
+        return placements
+
+    def _place(self, request, free):
+        first = self.first
+        if request.get("start") is not None:
+            first = max(first, datetime.fromtimestamp(quads_date_to_epoch(request["start"])))
+        days = request["days"]
+        grid = [int(time.mktime((first + timedelta(days=k)).timetuple()))
+                for k in range(max(0, self.horizon - (first - self.first).days) + days + 1)]
+
+        hosts = free.keys()
+        if request.get("filter") is not None:
+            selected = self.quads.quads_filter_hosts(request["filter"])
+            hosts = [h for h in hosts if h in selected]
+
+        # the grid positions every free interval can start the request
+        # at, swept in order as in Availability.find()
+        events = []
+        for h in hosts:
+            for s, e in free[h]:
+                low = bisect_left(grid, s)
+                high = bisect_right(grid, e) - 1 - days
+                if low <= high:
+                    events.append((low, 1, h, s, e))
+                    events.append((high + 1, -1, h, s, e))
+        events.sort()
+
+        current = {}
+        i = 0
+        while i < len(events):
+            position = events[i][0]
+            while i < len(events) and events[i][0] == position:
+                position, change, h, s, e = events[i]
+                if change > 0:
+                    current[h] = (s, e)
+                else:
+                    current.pop(h, None)
+                i += 1
+            if len(current) >= request["count"] and position < len(grid) - days:
+                start, end = grid[position], grid[position + days]
+                chosen = sorted(current, key=lambda h: (current[h][1] - current[h][0], h))[:request["count"]]
+                for h in chosen:
+                    s, e = current[h]
+                    free[h].remove((s, e))
+                    free[h].extend(piece for piece in [(s, start), (end, e)] if piece[0] < piece[1])
+                    free[h].sort()
+                return start, end, sorted(chosen)
+        return None, None, None
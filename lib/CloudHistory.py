@@ -13,6 +13,8 @@
 # You should have received a copy of the GNU General Public License
 # along with QUADs.  If not, see <http://www.gnu.org/licenses/>.
 
+from bisect import bisect_right
+
 class CloudHistory(object):
     def __init__(self, data):
         """
@@ -24,3 +26,27 @@ class CloudHistory(object):
             self.data = {}
         else:
             self.data = data["cloud_history"]
+        # cloud -> sorted history timestamps, built on first lookup
+        self.times = {}
+
+    # record entry for cloud at epoch "when".  as_of() returns it from
+    # "when" on, until the time of the next entry
+    def add(self, cloud, when, entry):
+        if cloud not in self.data:
+            self.data[cloud] = {}
+        self.data[cloud][when] = entry
+        if cloud in self.times:
+            del self.times[cloud]
+
+    # return the history entry (description, owner, ticket, qinq and
+    # ccusers) in effect for cloud at epoch "when", or None
+    def as_of(self, cloud, when):
+        if cloud not in self.data:
+            return None
+        if cloud not in self.times:
+            self.times[cloud] = sorted(self.data[cloud])
+        times = self.times[cloud]
+        position = bisect_right(times, when) - 1
+        if position < 0:
+            return None
+        return self.data[cloud][times[position]]
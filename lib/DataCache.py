@@ -0,0 +1,139 @@
+# This file is part of QUADs.
+#
+# QUADs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUADs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUADs.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import logging
+import os
+import yaml
+
+from ScheduleIndex import quads_refresh_epochs
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+
+class DataCache(object):
+    def __init__(self, config):
+        """
+        Initialize a DataCache object.  This keeps a pickled copy of the
+        parsed config next to it (config + ".cache"), so loading the data
+        does not go through the YAML parser unless the config changed.
+
+        The cache is keyed by the mtime, size and sha1 of the config and
+        is rebuilt whenever any of them differ.  Every top level section
+        of the data is pickled on its own, so a command only unpickles
+        the sections it uses.
+        """
+        self.logger = logging.getLogger("quads.DataCache")
+        self.logger.setLevel(logging.DEBUG)
+        self.config = config
+        self.path = config + ".cache"
+
+    def load(self):
+        """
+        Return the data in the config, from the cache when it is valid.
+        Errors reading or parsing the config are raised to the caller.
+        """
+        st = os.stat(self.config)
+        stream = open(self.config, 'r')
+        text = stream.read()
+        stream.close()
+        digest = hashlib.sha1(text).hexdigest()
+        key = (st.st_mtime, st.st_size, digest)
+
+        cached = self._read(key)
+        if cached is not None:
+            return cached
+
+        data = yaml.load(text)
+        # the file changed, possibly by hand
+        if isinstance(data, dict):
+            quads_refresh_epochs(data.get("hosts"))
+        self._write(key, data)
+        return data
+
+    # the cache file is a 16 digit header length, the pickled header
+    # (key and {section: (offset, length)}) and then the pickled sections
+    def _read(self, key):
+        if not os.path.isfile(self.path):
+            return None
+        try:
+            stream = open(self.path, 'rb')
+            length = int(stream.read(16))
+            cached_key, offsets = pickle.loads(stream.read(length))
+        except Exception, ex:
+            self.logger.debug("Ignoring unreadable cache %s : %s" % (self.path, ex))
+            return None
+        if cached_key != key:
+            stream.close()
+            return None
+        return CachedSections(stream, 16 + length, offsets)
+
+    def _write(self, key, data):
+        # the cache is only an optimization, failing to write it is fine
+        try:
+            offsets = {}
+            blobs = []
+            position = 0
+            for section in data:
+                blob = pickle.dumps(data[section], pickle.HIGHEST_PROTOCOL)
+                offsets[section] = (position, len(blob))
+                blobs.append(blob)
+                position += len(blob)
+            header = pickle.dumps((key, offsets), pickle.HIGHEST_PROTOCOL)
+            stream = open(self.path + ".tmp", 'wb')
+            stream.write("%016d" % len(header))
+            stream.write(header)
+            for blob in blobs:
+                stream.write(blob)
+            stream.close()
+            os.rename(self.path + ".tmp", self.path)
+        except Exception, ex:
+            self.logger.debug("Could not write cache %s : %s" % (self.path, ex))
+
+
+class CachedSections(dict):
+    def __init__(self, stream, base, offsets):
+        """
+        Initialize a CachedSections object.  This is the data dictionary
+        handed out by DataCache, a section is unpickled from the cache
+        file the first time it is looked up.
+
+        The cache file is kept open, so a cache rewritten by another
+        command in the meantime does not matter.
+        """
+        dict.__init__(self)
+        self.stream = stream
+        self.base = base
+        self.offsets = offsets
+
+    def __missing__(self, section):
+        if section not in self.offsets:
+            raise KeyError(section)
+        offset, length = self.offsets[section]
+        self.stream.seek(self.base + offset)
+        value = pickle.loads(self.stream.read(length))
+        self[section] = value
+        return value
+
+    def __contains__(self, section):
+        return dict.__contains__(self, section) or section in self.offsets
+
+    def get(self, section, default=None):
+        if section in self:
+            return self[section]
+        return default
@@ -0,0 +1,91 @@
+# This file is part of QUADs.
+#
+# QUADs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUADs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUADs.  If not, see <http://www.gnu.org/licenses/>.
+
+from fnmatch import fnmatchcase
+import re
+
+# the attributes every host may have, even if no host has them yet
+QUADS_HOST_ATTRIBUTES = ["rack", "u", "model", "nics"]
+
+
+# the attributes of a host: rack, u and model parsed from the name
+# (<rack>-<u-location>-<type>, e.g. c01-h23-r620), nics from the number
+# of interfaces, then anything declared in the "attributes" of the host
+def quads_host_attributes(name, host):
+    attributes = {}
+    fields = name.split(".")[0].split("-")
+    if len(fields) == 3:
+        attributes["rack"] = fields[0]
+        attributes["u"] = fields[1].lstrip("abcdefghijklmnopqrstuvwxyz") or fields[1]
+        attributes["model"] = fields[2]
+    if host.get("interfaces"):
+        attributes["nics"] = str(len(host["interfaces"]))
+    for key, value in (host.get("attributes") or {}).iteritems():
+        attributes[str(key)] = str(value)
+    return attributes
+
+
+# parse "model=r630,rack=c0[1-4]" into [(attribute, pattern), ...].  commas
+# inside [...] belong to the pattern.
+def quads_parse_filter(hostfilter):
+    terms = []
+    for term in re.split(r",(?![^\[]*\])", hostfilter):
+        if "=" not in term:
+            raise ValueError("attribute filter \"%s\" is not attribute=pattern" % term)
+        attribute, pattern = term.split("=", 1)
+        terms.append((attribute.strip(), pattern.strip()))
+    return terms
+
+
+class HostIndex(object):
+    def __init__(self, hosts):
+        """
+        Initialize a HostIndex object.  The attributes of every host in
+        hosts (the hosts section of the data) are kept in an inverted
+        index, attribute: {value: set of hosts}, so a filter only looks
+        at the distinct values of the attributes it names.
+        """
+        self.attributes = {}
+        self.index = {}
+        for h, host in hosts.iteritems():
+            self.attributes[h] = quads_host_attributes(h, host)
+            for attribute, value in self.attributes[h].iteritems():
+                self.index.setdefault(attribute, {}).setdefault(value, set()).add(h)
+
+    def match(self, hostfilter):
+        """
+        Return the set of hosts matching hostfilter, e.g.
+        "model=r630,rack=c0[1-4]".  Patterns are shell style.  Terms on
+        different attributes must all match, terms repeating an attribute
+        match any of them.  Raises ValueError for an unknown attribute.
+        """
+        selected = {}
+        for attribute, pattern in quads_parse_filter(hostfilter):
+            if attribute not in self.index and attribute not in QUADS_HOST_ATTRIBUTES:
+                raise ValueError("unknown host attribute \"%s\", known are: %s" %
+                                 (attribute, ", ".join(sorted(set(self.index) | set(QUADS_HOST_ATTRIBUTES)))))
+            hosts = selected.setdefault(attribute, set())
+            for value, valuehosts in self.index.get(attribute, {}).iteritems():
+                if fnmatchcase(value, pattern):
+                    hosts.update(valuehosts)
+        result = None
+        for hosts in selected.itervalues():
+            if result is None:
+                result = set(hosts)
+            else:
+                result &= hosts
+        if result is None:
+            return set(self.attributes)
+        return result
@@ -0,0 +1,97 @@
+# This file is part of QUADs.
+#
+# QUADs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUADs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUADs.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+import time
+import yaml
+
+from ScheduleIndex import quads_refresh_epochs
+
+
+class Journal(object):
+    def __init__(self, config, max_size=1048576, max_age=86400):
+        """
+        Initialize a Journal object.  In journal mode the config file is
+        a snapshot and every write appends the changed entries to
+        config + ".journal" instead of rewriting the whole file.  Loading
+        replays the journal on top of the snapshot.
+
+        The journal is folded back into the snapshot (compacted) once it
+        is bigger than max_size bytes or the snapshot is older than
+        max_age seconds.
+        """
+        self.logger = logging.getLogger("quads.Journal")
+        self.logger.setLevel(logging.DEBUG)
+        self.config = config
+        self.path = config + ".journal"
+        self.max_size = max_size
+        self.max_age = max_age
+
+    def replay(self, data):
+        """
+        Apply the journal records, in order, to the data loaded from the
+        snapshot.
+        """
+        if not os.path.isfile(self.path):
+            return
+        try:
+            stream = open(self.path, 'r')
+            records = list(yaml.load_all(stream))
+            stream.close()
+        except Exception, ex:
+            self.logger.error("There was a problem with your journal %s" % ex)
+            exit(1)
+        for record in records:
+            if record is None:
+                continue
+            for section in record:
+                if section not in data:
+                    data[section] = {}
+                for key, value in record[section].iteritems():
+                    # a None value records a removed entry
+                    if value is None:
+                        if key in data[section]:
+                            del data[section][key]
+                    else:
+                        data[section][key] = value
+                if section == "hosts":
+                    quads_refresh_epochs(record[section])
+
+    def append(self, record):
+        """
+        Append a {section: {key: value}} record of changed entries.  The
+        record goes out in a single write, so a crash cannot interleave
+        it with another one.
+        """
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0644)
+        try:
+            os.write(fd, yaml.dump(record, default_flow_style=False, explicit_start=True))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def needs_compaction(self):
+        """ return True when the journal should be folded into the snapshot """
+        if not os.path.isfile(self.path):
+            return False
+        if os.path.getsize(self.path) > self.max_size:
+            return True
+        return time.time() - os.path.getmtime(self.config) > self.max_age
+
+    def clear(self):
+        """ drop the journal, once its records are in the snapshot """
+        if os.path.isfile(self.path):
+            os.remove(self.path)
@@ -0,0 +1,118 @@
+# This file is part of QUADs.
+#
+# QUADs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUADs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUADs.  If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import timedelta
+import time
+
+# numpy is optional, only bulk analytics need it
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class OccupancyMatrix(object):
+    def __init__(self, quads, start, end, step=timedelta(hours=1)):
+        """
+        Initialize an OccupancyMatrix object.  This is a dense
+        hosts x time slots numpy array of cloud ids covering every step
+        between the start (inclusive) and end (exclusive) datetimes, so
+        bulk schedule queries run vectorized.
+
+        Cloud names are interned to small ints, use cloud_id() and
+        cloud_name() to map between the two.  Raises ImportError when
+        numpy is not installed.
+        """
+        if numpy is None:
+            raise ImportError("numpy is required for the occupancy matrix")
+
+        self.samples = []
+        sample = start
+        while sample < end:
+            self.samples.append(sample)
+            sample += step
+        times = numpy.array([time.mktime(s.timetuple()) for s in self.samples], dtype=numpy.float64)
+
+        self.hosts = sorted(quads.quads.hosts.data.iterkeys())
+        self.host_rows = dict((h, row) for row, h in enumerate(self.hosts))
+        self.clouds = []
+        self.cloud_ids = {}
+
+        # every host is piecewise constant between its change points, so
+        # each row is a single searchsorted over the slot times.
+        now = time.time()
+        index = quads.schedule_index
+        if self.samples:
+            index = quads._quads_index_for(times[0])
+        self.matrix = numpy.zeros((len(self.hosts), len(self.samples)), dtype=numpy.int16)
+        for row, host in enumerate(self.hosts):
+            changes = index.changes(host, now)
+            ids = [self.cloud_id(quads.quads.hosts.data[host]["cloud"])]
+            ids.extend(self.cloud_id(cloud) for t, cloud in changes)
+            points = numpy.array([t for t, cloud in changes], dtype=numpy.float64)
+            self.matrix[row] = numpy.array(ids, dtype=numpy.int16)[numpy.searchsorted(points, times, side='right')]
+
+    def cloud_id(self, cloud):
+        """ return the interned id of cloud, adding it if needed """
+        if cloud not in self.cloud_ids:
+            self.cloud_ids[cloud] = len(self.clouds)
+            self.clouds.append(cloud)
+        return self.cloud_ids[cloud]
+
+    def cloud_name(self, cloud_id):
+        return self.clouds[cloud_id]
+
+    def cloud_counts(self):
+        """
+        Return a clouds x slots array of host counts, row i is the count
+        for cloud_name(i).
+        """
+        counts = numpy.zeros((len(self.clouds), len(self.samples)), dtype=numpy.int32)
+        for cloud_id in range(0, len(self.clouds)):
+            counts[cloud_id] = (self.matrix == cloud_id).sum(axis=0)
+        return counts
+
+    def free_mask(self, cloud="cloud01"):
+        """
+        Return a hosts x slots boolean array, true where the host is in
+        the (spare pool) cloud.
+        """
+        if cloud not in self.cloud_ids:
+            return numpy.zeros(self.matrix.shape, dtype=bool)
+        return self.matrix == self.cloud_ids[cloud]
+
+    def free_hosts(self, slot, cloud="cloud01"):
+        """ return the hosts in the (spare pool) cloud during slot """
+        if cloud not in self.cloud_ids:
+            return []
+        return [self.hosts[row] for row in numpy.flatnonzero(self.matrix[:, slot] == self.cloud_ids[cloud])]
+
+    def change_mask(self):
+        """
+        Return a hosts x slots boolean array, true where the host is in
+        a different cloud than in the previous slot.
+        """
+        changed = numpy.zeros(self.matrix.shape, dtype=bool)
+        changed[:, 1:] = self.matrix[:, 1:] != self.matrix[:, :-1]
+        return changed
+
+    def host_changes(self, host):
+        """
+        Return [(slot datetime, cloud), ...] for every slot where host
+        changes cloud.
+        """
+        clouds = self.matrix[self.host_rows[host]]
+        return [(self.samples[slot], self.clouds[clouds[slot]])
+                for slot in numpy.flatnonzero(clouds[1:] != clouds[:-1]) + 1]
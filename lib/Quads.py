@@ -13,21 +13,25 @@
 # You should have received a copy of the GNU General Public License
 # along with QUADs.  If not, see <http://www.gnu.org/licenses/>.
 
-from datetime import datetime
+from datetime import datetime, timedelta
+import calendar
+import difflib
 import time
 import yaml
 import os
 import logging
-import requests
 import sys
 import importlib
 from Clouds import Clouds
 from History import History
 from QuadsData import QuadsData
 from CloudHistory import CloudHistory
-import urllib
-import json
-from subprocess import check_call
+from ScheduleIndex import ScheduleIndex, quads_date_to_epoch, quads_epoch_to_date, quads_schedule_epochs, quads_schedule_entry
+from Timeline import Timeline
+from Archive import Archive
+from StateStore import StateStore
+from HostIndex import HostIndex, quads_parse_filter
+from ReservationQueue import ReservationQueue
 from hardware_services.inventory_service import get_inventory_service, set_inventory_service
 from hardware_services.network_service import get_network_service, set_network_service
 sys.path.append(os.path.dirname(__file__) + "/hardware_services/inventory_drivers/")
@@ -36,11 +40,15 @@ sys.path.append(os.path.dirname(__file__) + "/hardware_services/network_drivers/
 
 class Quads(object):
 
-    def __init__(self, config, statedir, movecommand, datearg, syncstate, initialize, force, hardwareservice, hardwareserviceurl):
+    def __init__(self, config, statedir, movecommand, datearg, syncstate, initialize, force, hardwareservice, hardwareserviceurl, journal=None, readonly=False):
         """
-        Initialize a quads object.
+        Initialize a quads object.  Pass a Journal object as journal to
+        keep the data in journal mode.  With readonly, for queries, the
+        state dir is not touched and the data is never written.
         """
         self.config = config
+        self.journal = journal
+        self.readonly = readonly
         self.statedir = statedir
         self.movecommand = movecommand
         self.datearg = datearg
@@ -48,28 +56,89 @@ class Quads(object):
         self.logger.setLevel(logging.DEBUG)
 
         #EC528 addition - dynamically import driver module and set inventory and network services
+        # the network driver is only loaded when hosts are moved
         inventoryservice = hardwareservice + "InventoryDriver"
-        networkservice = hardwareservice + "NetworkDriver"
+        self.networkservice = hardwareservice + "NetworkDriver"
 
         importlib.import_module(inventoryservice)
-        importlib.import_module(networkservice)
 
-        set_inventory_service(getattr(sys.modules[inventoryservice], inventoryservice)())
-        set_network_service(getattr(sys.modules[networkservice], networkservice)())
+        # a long running process (quadsd) creates Quads objects again and
+        # keeps the driver it already has
+        if get_inventory_service().__class__.__name__ != inventoryservice:
+            set_inventory_service(getattr(sys.modules[inventoryservice], inventoryservice)())
 
         self.inventory_service = get_inventory_service()
-        self.network_service = get_network_service()
+        self._network_service = None
 
         self.hardware_service_url = hardwareserviceurl
+        self.deferwrite = False
+        # set by the Sqlite driver to the SqliteData it loaded from
+        self.sqlite = None
 
 
         self.inventory_service.load_data(self, force, initialize)
 
         self.quads = QuadsData(self.data)
-        self._quads_history_init()
-
+        if self.quads.upgrade():
+            self.logger.info("Upgraded " + self.config + " to schema version " + str(self.quads.version))
+            self.quads_write_data(False)
+        self._schedule_index = None
+        self._state_store = None
+        self._host_index = None
+        self.timeline = None
+        self._archive_index = None
+        self.archive_timeline = None
+
+        if readonly:
+            return
         if syncstate or not datearg:
-            self.quads_sync_state()
+            self.quads_maintain(syncstate)
+
+    # the schedule index (and the history it relies on) is only set up
+    # when a command first needs it, listing clouds or owners never does
+    @property
+    def schedule_index(self):
+        if self._schedule_index is None:
+            if self.sqlite is not None:
+                from SqliteData import SqliteScheduleIndex
+                self._schedule_index = SqliteScheduleIndex(self.sqlite, self.quads)
+            else:
+                self._schedule_index = ScheduleIndex(self.quads.hosts.data, self.quads.history.data)
+            self._quads_history_init()
+        return self._schedule_index
+
+    @property
+    def network_service(self):
+        if self._network_service is None:
+            importlib.import_module(self.networkservice)
+            if get_network_service().__class__.__name__ != self.networkservice:
+                set_network_service(getattr(sys.modules[self.networkservice], self.networkservice)())
+            self._network_service = get_network_service()
+        return self._network_service
+
+    # the current cloud of every host, read from statedir on first use
+    @property
+    def state_store(self):
+        if self._state_store is None:
+            self._state_store = StateStore(self.statedir)
+        return self._state_store
+
+    # the attributes of every host (rack, u, model, nics), for --filter
+    @property
+    def host_index(self):
+        if self._host_index is None:
+            self._host_index = HostIndex(self.quads.hosts.data)
+        return self._host_index
+
+    # the set of hosts matching hostfilter, or None without a filter
+    def quads_filter_hosts(self, hostfilter):
+        if hostfilter is None:
+            return None
+        try:
+            return self.host_index.match(hostfilter)
+        except ValueError, ex:
+            self.logger.error("Host filter error : %s" % ex)
+            exit(1)
 
     def get_clouds(self):
         return self.quads.clouds.data
@@ -86,11 +155,12 @@ class Quads(object):
                 self.quads.history.data[h] = {}
                 default_cloud, current_cloud, current_override = self._quads_find_current(h, None)
                 self.quads.history.data[h][0] = current_cloud
+                self.quads.mark_dirty("history", h)
+                self.schedule_index.invalidate(h)
                 updateyaml = True
 
         for c in sorted(self.quads.clouds.data.iterkeys()):
             if c not in self.quads.cloud_history.data:
-                self.quads.cloud_history.data[c] = {}
                 if 'ccusers' in self.quads.clouds.data[c]:
                     savecc = []
                     for cc in self.quads.clouds.data[c]['ccusers']:
@@ -114,11 +184,12 @@ class Quads(object):
                     ticket = self.quads.clouds.data[c]['ticket']
                 else:
                     ticket = '000000'
-                self.quads.cloud_history.data[c][0] = {'ccusers':ccusers,
-                                                       'description':description,
-                                                       'owner':owner,
-                                                       'qinq':qinq,
-                                                       'ticket':ticket}
+                self.quads.cloud_history.add(c, 0, {'ccusers':ccusers,
+                                                    'description':description,
+                                                    'owner':owner,
+                                                    'qinq':qinq,
+                                                    'ticket':ticket})
+                self.quads.mark_dirty("cloud_history", c)
                 updateyaml = True
 
         if updateyaml:
@@ -126,8 +197,25 @@ class Quads(object):
 
     # we occasionally need to write the data back out
     def quads_write_data(self, doexit = True):
+        # while a plan is applied the data is only written at the end
+        if self.deferwrite:
+            return
+        # history and state need to catch up with the change, see
+        # quads_maintain().  read-only runs leave the write to it as well.
+        if not os.path.isfile(self.config + ".dirty"):
+            try:
+                open(self.config + ".dirty", 'w').close()
+            except Exception, ex:
+                self.logger.error("There was a problem with your file %s" % ex)
+        if self.readonly:
+            return
         self.inventory_service.write_data(self, doexit)
 
+    # the files the data was loaded from, changes to them made by other
+    # processes mean the data has to be loaded again
+    def quads_data_files(self):
+        return self.inventory_service.data_files(self)
+
     # if passed --init, the config data is wiped.
     # typically we will not want to continue execution if user asks to initialize
     def quads_init_data(self, force):
@@ -135,68 +223,140 @@ class Quads(object):
 
     # helper function called from other methods.  Never called from main()
     def _quads_find_current(self, host, datearg):
-        hosts = self.quads.hosts.data
-        history = self.quads.history.data
+        current_time = time.time()
 
-        if host in hosts.keys():
-            default_cloud = hosts[host]["cloud"]
-            current_cloud = default_cloud
-            current_override = None
-            current_time = datetime.now()
-
-            if datearg is None:
-                requested_time = current_time
-            else:
-                try:
-                    requested_time = datetime.strptime(datearg, '%Y-%m-%d %H:%M')
-                except Exception, ex:
-                    self.logger.error("Data format error : %s" % ex)
-                    exit(1)
-
-            if "schedule" in hosts[host].keys():
-                for override in hosts[host]["schedule"]:
-                    start_obj = datetime.strptime(hosts[host]["schedule"][override]["start"], '%Y-%m-%d %H:%M')
-                    end_obj = datetime.strptime(hosts[host]["schedule"][override]["end"], '%Y-%m-%d %H:%M')
-
-                    if start_obj <= requested_time and requested_time < end_obj:
-                        current_cloud = hosts[host]["schedule"][override]["cloud"]
-                        current_override = override
-                        return default_cloud, current_cloud, current_override
-
-            # only consider history data when looking at past data
-            if requested_time < current_time:
-                for h in sorted(history[host]):
-                    if datetime.fromtimestamp(h) <= requested_time:
-                        current_cloud = history[host][h]
+        if datearg is None:
+            requested_time = current_time
+        else:
+            try:
+                requested_time = quads_date_to_epoch(datearg)
+            except Exception, ex:
+                self.logger.error("Data format error : %s" % ex)
+                exit(1)
 
-            return default_cloud, current_cloud, current_override
+        # only consider history data when looking at past data
+        return self._quads_index_for(requested_time).find(host, requested_time, current_time)
 
+    # helper function called from other methods.  Never called from main()
+    # queries before the archive horizon need the archived schedules and
+    # history as well
+    def _quads_index_for(self, when):
+        if self.quads.archive_horizon is None or when >= self.quads.archive_horizon:
+            return self.schedule_index
+        if self._archive_index is None:
+            hosts, history, self.archive_cloud_history = Archive(self.config).merged(self.quads)
+            self._archive_index = ScheduleIndex(hosts, history)
+        return self._archive_index
+
+    # lab wide timeline used for reporting.  rebuilt whenever the
+    # schedule index has changed underneath it, or a schedule change
+    # happened since it was built (quadsd keeps it around).  pass "when"
+    # to get a timeline that also covers the archive if "when" is archived.
+    def quads_timeline(self, when=None):
+        if when is not None and self._quads_index_for(when) is not self.schedule_index:
+            if self.archive_timeline is None:
+                self.archive_timeline = Timeline(self, time.time(), self._archive_index, self.archive_cloud_history)
+            return self.archive_timeline
+        now = time.time()
+        if self.timeline is None or self.timeline.generation != self.schedule_index.generation:
+            self.timeline = Timeline(self, now)
         else:
-            return None, None, None
+            changes = self.timeline.next_changes(self.timeline.now, 1)
+            if changes and changes[0][0] <= now:
+                self.timeline = Timeline(self, now)
+        return self.timeline
 
     # Provide schedule for a given month and year
     def quads_hosts_schedule(self,
                              month=datetime.now().month,
                              year=datetime.now().year):
-        hosts = self.quads.hosts.data
+        start = datetime(int(year), int(month), 1)
+        end = start + timedelta(days=calendar.monthrange(int(year), int(month))[1])
+        samples, hosts_schedule = self.quads_hosts_schedule_range(start, end)
         schedule = {}
-        for host in hosts :
+        for host in hosts_schedule:
             schedule[host] = {}
             schedule[host][year] = {}
             schedule[host][year][month] = {}
-            for day in range(1,calendar.monthrange(int(year),int(month))[1]):
-              schedule[host][year][month][day] = self._quads_find_current(host,"{}-{}-{} 00:00".format(year,month,day))
+            for sample, current in zip(samples, hosts_schedule[host]):
+                schedule[host][year][month][sample.day] = current
 
         return schedule
 
+    # Provide schedule for every step between start (inclusive) and end
+    # (exclusive) datetimes.  Each host's schedule is swept once for the
+    # whole range rather than looked up once per step.
+    def quads_hosts_schedule_range(self, start, end, step=timedelta(days=1)):
+        samples = []
+        sample = start
+        while sample < end:
+            samples.append(sample)
+            sample += step
+        times = [int(time.mktime(s.timetuple())) for s in samples]
+        current_time = time.time()
+
+        index = self.schedule_index
+        if times:
+            index = self._quads_index_for(times[0])
+        schedule = {}
+        for host in self.quads.hosts.data:
+            schedule[host] = index.sweep(host, times, current_time)
+
+        return samples, schedule
+
+    # print how many hosts every cloud has at every step between start
+    # (inclusive) and end (exclusive) datetimes, computed on the numpy
+    # occupancy matrix
+    def quads_cloud_counts(self, start, end, step=timedelta(days=1)):
+        try:
+            from OccupancyMatrix import OccupancyMatrix
+            matrix = OccupancyMatrix(self, start, end, step)
+        except ImportError, ex:
+            self.logger.error("%s" % ex)
+            exit(1)
+        counts = matrix.cloud_counts()
+        clouds = sorted(set(matrix.clouds) | set(self.quads.clouds.data))
+        print ",".join(["date"] + clouds)
+        for slot, sample in enumerate(matrix.samples):
+            row = [sample.strftime('%Y-%m-%d %H:%M')]
+            for c in clouds:
+                if c in matrix.cloud_ids:
+                    row.append(str(counts[matrix.cloud_ids[c]][slot]))
+                else:
+                    row.append("0")
+            print ",".join(row)
+
+    # initialize history and sync the state of hosts, once after every
+    # change to the data (config + ".dirty" exists) or when forced
+    def quads_maintain(self, force=False):
+        if not force and not self.quads_needs_maintenance():
+            return False
+        self.schedule_index
+        self.quads_sync_state()
+        if os.path.isfile(self.config + ".dirty"):
+            os.remove(self.config + ".dirty")
+        return True
+
+    def quads_needs_maintenance(self):
+        # older versions kept no state file and synced on every run
+        return os.path.isfile(self.config + ".dirty") or not os.path.isfile(os.path.join(self.statedir, ".state"))
+
     # sync the statedir db for hosts with schedule
     def quads_sync_state(self):
         # sync state
         self.inventory_service.sync_state(self)
 
+    # rewrite every per-host file in statedir from the state store
+    def quads_export_state(self):
+        self.state_store.export()
+
     # list the hosts
-    def quads_list_hosts(self):
+    def quads_list_hosts(self, hostfilter=None):
         # list just the hostnames
+        if hostfilter is not None:
+            for h in sorted(self.quads_filter_hosts(hostfilter)):
+                print h
+            return
         self.inventory_service.list_hosts(self)
 
     # list the hosts
@@ -289,10 +449,16 @@ class Quads(object):
         return
 
     # update a host resource
-    def quads_update_host(self, hostresource, hostcloud, forceupdate):
+    def quads_update_host(self, hostresource, hostcloud, forceupdate, hostattributes=None):
         # define or update a host resouce
 
         kwargs = {'hostresource': hostresource, 'hostcloud': hostcloud, 'forceupdate': forceupdate}
+        if hostattributes is not None:
+            try:
+                kwargs['hostattributes'] = dict(quads_parse_filter(hostattributes))
+            except ValueError, ex:
+                self.logger.error("Host attributes error : %s" % ex)
+                exit(1)
 
         self.inventory_service.update_host(self, **kwargs)
 
@@ -313,13 +479,13 @@ class Quads(object):
     def quads_add_host_schedule(self, schedstart, schedend, schedcloud, host):
         # add a scheduled override for a given host
         try:
-            datetime.strptime(schedstart, '%Y-%m-%d %H:%M')
+            schedstart_epoch = quads_date_to_epoch(schedstart)
         except Exception, ex:
             self.logger.error("Data format error : %s" % ex)
             exit(1)
 
         try:
-            datetime.strptime(schedend, '%Y-%m-%d %H:%M')
+            schedend_epoch = quads_date_to_epoch(schedend)
         except Exception, ex:
             self.logger.error("Data format error : %s" % ex)
             exit(1)
@@ -332,48 +498,152 @@ class Quads(object):
             self.logger.error("host \"" + host + "\" is not defined.")
             exit(1)
 
+        self._quads_check_horizon(schedstart_epoch)
+
         # before updating the schedule (adding the new override), we need to
         # ensure the host does not have existing schedules that overlap the new
         # schedule being requested
 
-        schedstart_obj = datetime.strptime(schedstart, '%Y-%m-%d %H:%M')
-        schedend_obj = datetime.strptime(schedend, '%Y-%m-%d %H:%M')
+        conflicts = self.schedule_index.overlapping(host, schedstart_epoch, schedend_epoch)
+        if conflicts:
+            print "Error. New schedule conflicts with existing schedule."
+            print "New schedule: "
+            print "   Start: " + schedstart
+            print "   End: " + schedend
+            self._quads_print_conflicts(host, conflicts)
+            exit(1)
+
+        # the next available schedule index should be the max index + 1
+        override = self.quads.next_schedule_id(host)
+        self.quads.hosts.data[host]["schedule"][override] = quads_schedule_entry(schedcloud, schedstart, schedend)
+        self.schedule_index.add_schedule(host, override)
+        self.quads.mark_dirty("hosts", host)
+        self.quads_write_data()
+
+        return
 
-        for s in self.quads.hosts.data[host]["schedule"]:
-            s_start     = self.quads.hosts.data[host]["schedule"][s]["start"]
-            s_end       = self.quads.hosts.data[host]["schedule"][s]["end"]
+    # define the same schedule for many hosts, with a single write
+    def quads_add_hosts_schedule(self, schedstart, schedend, schedcloud, hosts):
+        try:
+            schedstart_epoch = quads_date_to_epoch(schedstart)
+            schedend_epoch = quads_date_to_epoch(schedend)
+        except Exception, ex:
+            self.logger.error("Data format error : %s" % ex)
+            exit(1)
 
-            s_start_obj = datetime.strptime(s_start, '%Y-%m-%d %H:%M')
-            s_end_obj   = datetime.strptime(s_end, '%Y-%m-%d %H:%M')
+        if schedcloud not in self.quads.clouds.data:
+            self.logger.error("cloud \"" + schedcloud + "\" is not defined.")
+            exit(1)
 
-            # need code to see if schedstart or schedend is between s_start and
-            # s_end
+        self._quads_check_horizon(schedstart_epoch)
+
+        # validate every host before touching the data, so the whole
+        # batch is either added or rejected
+        failed = False
+        seen = set()
+        for host in hosts:
+            if host not in self.quads.hosts.data:
+                self.logger.error("host \"" + host + "\" is not defined.")
+                failed = True
+                continue
+            if host in seen:
+                self.logger.error("host \"" + host + "\" is listed more than once.")
+                failed = True
+                continue
+            seen.add(host)
+            conflicts = self.schedule_index.overlapping(host, schedstart_epoch, schedend_epoch)
+            if conflicts:
+                print "Error. New schedule for " + host + " conflicts with existing schedule."
+                self._quads_print_conflicts(host, conflicts)
+                failed = True
+
+        if failed:
+            print "No schedules were added."
+            exit(1)
 
-            if s_start_obj <= schedstart_obj and schedstart_obj < s_end_obj:
-                print "Error. New schedule conflicts with existing schedule."
-                print "New schedule: "
-                print "   Start: " + schedstart
-                print "   End: " + schedend
-                print "Existing schedule: "
-                print "   Start: " + s_start
-                print "   End: " + s_end
-                exit(1)
+        for host in hosts:
+            override = self.quads.next_schedule_id(host)
+            self.quads.hosts.data[host]["schedule"][override] = quads_schedule_entry(schedcloud, schedstart, schedend)
+            self.schedule_index.add_schedule(host, override)
+            self.quads.mark_dirty("hosts", host)
+        self.quads_write_data()
 
-            if s_start_obj < schedend_obj and schedend_obj <= s_end_obj:
-                print "Error. New schedule conflicts with existing schedule."
-                print "New schedule: "
-                print "   Start: " + schedstart
-                print "   End: " + schedend
-                print "Existing schedule: "
-                print "   Start: " + s_start
-                print "   End: " + s_end
-                exit(1)
+        return
 
-        # the next available schedule index should be the max index + 1
-        self.quads.hosts.data[host]["schedule"][max(self.quads.hosts.data[host]["schedule"].keys() or [-1])+1] = { "cloud": schedcloud, "start": schedstart, "end": schedend }
+    # move the end of the active schedule of every host in a cloud, with a
+    # single write
+    def quads_extend_cloud_schedule(self, cloud, schedend, datearg):
+        current_time = time.time()
+        requested_time = current_time
+        try:
+            schedend_epoch = quads_date_to_epoch(schedend)
+            if datearg is not None:
+                requested_time = quads_date_to_epoch(datearg)
+        except Exception, ex:
+            self.logger.error("Data format error : %s" % ex)
+            exit(1)
+
+        if cloud not in self.quads.clouds.data:
+            self.logger.error("cloud \"" + cloud + "\" is not defined.")
+            exit(1)
+
+        extended = {}
+        failed = False
+        for host in sorted(self.quads.hosts.data.iterkeys()):
+            # archived schedules have ended and can not be extended, only
+            # look at the schedules in the data
+            default_cloud, current_cloud, current_override = self.schedule_index.find(host, requested_time, current_time)
+            if current_cloud != cloud:
+                continue
+            if current_override is None:
+                print "Skipping " + host + ", it is in " + cloud + " by default."
+                continue
+            updated = dict(self.quads.hosts.data[host]["schedule"][current_override])
+            updated.update(quads_schedule_entry(cloud, updated["start"], schedend))
+            if updated["end_epoch"] <= updated["start_epoch"]:
+                print "Error. New end for " + host + " is before the start of schedule " + str(current_override) + "."
+                failed = True
+                continue
+            conflicts = self.schedule_index.overlapping(host, updated["start_epoch"], schedend_epoch, current_override)
+            if conflicts:
+                print "Error. Extended schedule for " + host + " conflicts with existing schedule."
+                self._quads_print_conflicts(host, conflicts)
+                failed = True
+                continue
+            extended[host] = (current_override, updated)
+
+        if failed:
+            print "No schedules were extended."
+            exit(1)
+
+        if not extended:
+            print "No active schedules found for " + cloud + "."
+            exit(0)
+
+        for host in extended:
+            override, updated = extended[host]
+            self.quads.hosts.data[host]["schedule"][override].update(updated)
+            self.schedule_index.update_schedule(host, override)
+            self.quads.mark_dirty("hosts", host)
         self.quads_write_data()
 
-        return data
+        return
+
+    # helper function called from other methods.  Never called from main()
+    # schedules may not start in the archived period, they could overlap
+    # archived schedules
+    def _quads_check_horizon(self, schedstart_epoch):
+        if self.quads.archive_horizon is not None and schedstart_epoch < self.quads.archive_horizon:
+            self.logger.error("schedule start is before the archive horizon " +
+                              quads_epoch_to_date(self.quads.archive_horizon) + ".")
+            exit(1)
+
+    def _quads_print_conflicts(self, host, conflicts):
+        for start, end, override, cloud in conflicts:
+            s = self.quads.hosts.data[host]["schedule"][override]
+            print "Existing schedule: " + str(override)
+            print "   Start: " + s["start"]
+            print "   End: " + s["end"]
 
     # remove a scheduled override for a given host
     def quads_rm_host_schedule(self, rmschedule, host):
@@ -391,6 +661,8 @@ class Quads(object):
             exit(1)
 
         del(self.quads.hosts.data[host]["schedule"][rmschedule])
+        self.schedule_index.remove_schedule(host, rmschedule)
+        self.quads.mark_dirty("hosts", host)
         self.quads_write_data()
 
         return
@@ -400,14 +672,14 @@ class Quads(object):
         # add a scheduled override for a given host
         if schedstart:
             try:
-                datetime.strptime(schedstart, '%Y-%m-%d %H:%M')
+                quads_date_to_epoch(schedstart)
             except Exception, ex:
                 self.logger.error("Data format error : %s" % ex)
                 exit(1)
 
         if schedend:
             try:
-                datetime.strptime(schedend, '%Y-%m-%d %H:%M')
+                quads_date_to_epoch(schedend)
             except Exception, ex:
                 self.logger.error("Data format error : %s" % ex)
                 exit(1)
@@ -436,108 +708,480 @@ class Quads(object):
         if not schedstart:
             schedstart = self.quads.hosts.data[host]["schedule"][modschedule]["start"]
 
-        schedstart_obj = datetime.strptime(schedstart, '%Y-%m-%d %H:%M')
-
         if not schedend:
             schedend = self.quads.hosts.data[host]["schedule"][modschedule]["end"]
 
-        schedend_obj = datetime.strptime(schedend, '%Y-%m-%d %H:%M')
+        updated = quads_schedule_entry(schedcloud, schedstart, schedend)
+        schedstart_epoch = updated["start_epoch"]
+        schedend_epoch = updated["end_epoch"]
+
+        # schedules that began before the archive horizon can still be
+        # changed, as long as their start is left alone
+        oldstart_epoch = quads_schedule_epochs(self.quads.hosts.data[host]["schedule"][modschedule])[0]
+        if schedstart_epoch != oldstart_epoch:
+            self._quads_check_horizon(min(schedstart_epoch, oldstart_epoch))
+
+        conflicts = self.schedule_index.overlapping(host, schedstart_epoch, schedend_epoch, modschedule)
+        if conflicts:
+            print "Error. Updated schedule conflicts with existing schedule."
+            print "Updated schedule: "
+            print "   Start: " + schedstart
+            print "   End: " + schedend
+            self._quads_print_conflicts(host, conflicts)
+            exit(1)
+
+        self.quads.hosts.data[host]["schedule"][modschedule].update(updated)
+        self.schedule_index.update_schedule(host, modschedule)
+        self.quads.mark_dirty("hosts", host)
 
-        for s in self.quads.hosts.data[host]["schedule"]:
-            if s != modschedule:
-                s_start = self.quads.hosts.data[host]["schedule"][s]["start"]
-                s_end   = self.quads.hosts.data[host]["schedule"][s]["end"]
+        self.quads_write_data()
 
-                s_start_obj = datetime.strptime(s_start, '%Y-%m-%d %H:%M')
-                s_end_obj   = datetime.strptime(s_end, '%Y-%m-%d %H:%M')
+        return
 
-                # need code to see if schedstart or schedend is between s_start and
-                # s_end
+    # print every cloud with its metadata and hosts, and the active
+    # schedule of every host, as one document
+    def quads_export(self, exportformat, datearg):
+        current_time = time.time()
+        if datearg is None:
+            requested_time = current_time
+        else:
+            try:
+                requested_time = quads_date_to_epoch(datearg)
+            except Exception, ex:
+                self.logger.error("Data format error : %s" % ex)
+                exit(1)
 
-                if s_start_obj <= schedstart_obj and schedstart_obj < s_end_obj:
-                    print "Error. Updated schedule conflicts with existing schedule."
-                    print "Updated schedule: "
-                    print "   Start: " + schedstart
-                    print "   End: " + schedend
-                    print "Existing schedule: "
-                    print "   Start: " + s_start
-                    print "   End: " + s_end
-                    exit(1)
+        index = self._quads_index_for(requested_time)
+        cloud_history = self.quads.cloud_history
+        if index is not self.schedule_index:
+            cloud_history = self.archive_cloud_history
 
-                if s_start_obj < schedend_obj and schedend_obj <= s_end_obj:
-                    print "Error. Updated schedule conflicts with existing schedule."
-                    print "Updated schedule: "
-                    print "   Start: " + schedstart
-                    print "   End: " + schedend
-                    print "Existing schedule: "
-                    print "   Start: " + s_start
-                    print "   End: " + s_end
-                    exit(1)
+        clouds = {}
+        for c, cloud in self.quads.clouds.data.iteritems():
+            # cloud history is only consulted for times before now
+            entry = None
+            if requested_time < current_time:
+                entry = cloud_history.as_of(c, requested_time)
+            if entry is None:
+                entry = cloud
+            clouds[c] = {"description": entry.get("description"), "owner": entry.get("owner"),
+                         "ccusers": entry.get("ccusers", []), "ticket": entry.get("ticket"),
+                         "qinq": entry.get("qinq"), "hosts": []}
+
+        hosts = {}
+        for h in sorted(self.quads.hosts.data.iterkeys()):
+            default_cloud, current_cloud, current_override = index.find(h, requested_time, current_time)
+            hosts[h] = {"cloud": current_cloud, "default_cloud": default_cloud, "schedule": current_override,
+                        "schedule_end": None}
+            if current_override is not None:
+                hosts[h]["schedule_end"] = index.hosts[h]["schedule"][current_override]["end"]
+            if current_cloud in clouds:
+                clouds[current_cloud]["hosts"].append(h)
+
+        document = {"date": quads_epoch_to_date(requested_time), "clouds": clouds, "hosts": hosts}
+        if exportformat == "json":
+            import json
+            print json.dumps(document, indent=2, sort_keys=True, separators=(',', ': '))
 
-        self.quads.hosts.data[host]["schedule"][modschedule]["start"] = schedstart
-        self.quads.hosts.data[host]["schedule"][modschedule]["end"] = schedend
-        self.quads.hosts.data[host]["schedule"][modschedule]["cloud"] = schedcloud
+        return
+
+    # print how many hosts of the spare pool are free on each of the next
+    # days, per value of the host attribute groupby, and the first day
+    # each of the thresholds (a list of counts) is reached
+    def quads_forecast(self, days, datearg, groupby, forecastformat, thresholds, hostfilter):
+        from Availability import Availability
+        first = self._quads_first_day(datearg)
+        if days < 1:
+            self.logger.error("--days must be at least 1")
+            exit(1)
+
+        starts, counts = Availability(self, hostfilter=hostfilter).daily(days, first, groupby)
+        dates = [time.strftime('%Y-%m-%d', time.localtime(t)) for t in starts]
+        groups = sorted(g for g in counts if g != "total")
+        if groupby is not None:
+            counts["total"] = [sum(free) for free in zip(*[counts[g] for g in groups])] or [0] * days
+        elif "total" not in counts:
+            counts["total"] = [0] * days
+        columns = ["total"] + groups
+
+        reached = {}
+        for threshold in thresholds:
+            reached[threshold] = {}
+            for c in columns:
+                reached[threshold][c] = None
+                for k, free in enumerate(counts[c]):
+                    if free >= threshold:
+                        reached[threshold][c] = dates[k]
+                        break
+
+        if forecastformat == "json":
+            import json
+            document = {"dates": dates, "free": dict((c, counts[c]) for c in columns)}
+            if thresholds:
+                document["thresholds"] = dict((str(t), reached[t]) for t in thresholds)
+            print json.dumps(document, indent=2, sort_keys=True, separators=(',', ': '))
+        elif thresholds:
+            print ",".join(["threshold"] + columns)
+            for t in thresholds:
+                print ",".join([str(t)] + [reached[t][c] or "" for c in columns])
+        else:
+            print ",".join(["date"] + columns)
+            for k in range(days):
+                print ",".join([dates[k]] + [str(counts[c][k]) for c in columns])
+
+        return
+
+    # the datetime reports and placements start from: datearg, or 08:00
+    # today
+    def _quads_first_day(self, datearg):
+        if datearg is None:
+            return datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+        try:
+            return datetime.fromtimestamp(quads_date_to_epoch(datearg))
+        except Exception, ex:
+            self.logger.error("Data format error : %s" % ex)
+            exit(1)
+
+    # queue a request for count hosts for days days, starting no earlier
+    # than schedstart, to be placed by quads_place_queue()
+    def quads_queue_request(self, count, days, schedstart, schedcloud, hostfilter, description):
+        if schedcloud not in self.quads.clouds.data:
+            self.logger.error("cloud \"" + str(schedcloud) + "\" is not defined.")
+            exit(1)
+        if days is None or days < 1 or count < 1:
+            self.logger.error("--count and --days must be at least 1")
+            exit(1)
+        if schedstart is not None:
+            try:
+                quads_date_to_epoch(schedstart)
+            except Exception, ex:
+                self.logger.error("Data format error : %s" % ex)
+                exit(1)
+        # fail now rather than when the queue is placed
+        self.quads_filter_hosts(hostfilter)
+
+        queue = ReservationQueue(self.config)
+        requestid = queue.add(count, days, schedstart, schedcloud, hostfilter, description)
+        queue.write()
+        print "Queued request " + str(requestid)
+
+        return
+
+    def quads_list_queue(self):
+        for request in ReservationQueue(self.config).requests:
+            line = str(request["id"]) + "| count=" + str(request["count"]) + ",days=" + str(request["days"]) + \
+                ",start=" + str(request.get("start")) + ",cloud=" + request["cloud"]
+            if request.get("filter") is not None:
+                line += ",filter=" + request["filter"]
+            if request.get("description") is not None:
+                line += ",description=" + request["description"]
+            print line
+
+    def quads_rm_queue_request(self, requestid):
+        queue = ReservationQueue(self.config)
+        if not queue.remove([requestid]):
+            self.logger.error("request " + str(requestid) + " is not queued.")
+            exit(1)
+        queue.write()
+
+    # place every queued request, and unless dryrun add the schedules of
+    # the placed requests with a single write and take them off the queue.
+    # placements that would conflict are reported and left queued.
+    def quads_place_queue(self, dryrun, datearg, horizon):
+        from Backfill import Backfill
+        queue = ReservationQueue(self.config)
+        placements = Backfill(self, self._quads_first_day(datearg), horizon).place(queue.requests)
+
+        placed = []
+        failed = False
+        for request, start, end, hosts in placements:
+            line = "request " + str(request["id"]) + ": " + str(request["count"]) + " hosts for " + \
+                str(request["days"]) + " days in " + request["cloud"]
+            if hosts is None:
+                print line + ", not placed within " + str(horizon) + " days"
+                continue
+            print line + ", " + quads_epoch_to_date(start) + " - " + quads_epoch_to_date(end)
+            problems = self._quads_placement_problems(request["cloud"], start, end, hosts)
+            if problems:
+                for p in problems:
+                    print "  " + p
+                print "  not placed"
+                failed = True
+                continue
+            for h in hosts:
+                print "  - " + h
+            placed.append((request, start, end, hosts))
+        print str(len(placed)) + " of " + str(len(placements)) + " requests placed."
+
+        if not dryrun and placed:
+            for request, start, end, hosts in placed:
+                for h in hosts:
+                    override = self.quads.next_schedule_id(h)
+                    self.quads.hosts.data[h]["schedule"][override] = quads_schedule_entry(
+                        request["cloud"], quads_epoch_to_date(start), quads_epoch_to_date(end))
+                    self.schedule_index.add_schedule(h, override)
+                    self.quads.mark_dirty("hosts", h)
+            self.quads_write_data(False)
+            queue.remove([request["id"] for request, start, end, hosts in placed])
+            queue.write()
+
+        if failed:
+            exit(1)
+
+        return
+
+    # the reasons the schedules of a placement cannot be added, the same
+    # checks quads_add_host_schedule() does
+    def _quads_placement_problems(self, cloud, start, end, hosts):
+        problems = []
+        if cloud not in self.quads.clouds.data:
+            problems.append("cloud \"" + cloud + "\" is not defined.")
+        if self.quads.archive_horizon is not None and start < self.quads.archive_horizon:
+            problems.append("schedule start is before the archive horizon " +
+                            quads_epoch_to_date(self.quads.archive_horizon) + ".")
+        for h in hosts:
+            if h not in self.quads.hosts.data:
+                problems.append("host \"" + h + "\" is not defined.")
+                continue
+            for s, e, override, c in self.schedule_index.overlapping(h, start, end):
+                problems.append(h + " conflicts with existing schedule " + str(override) + " (" +
+                                self.quads.hosts.data[h]["schedule"][override]["start"] + " - " +
+                                self.quads.hosts.data[h]["schedule"][override]["end"] + ")")
+        return problems
+
+    # list the next schedule transitions and the host moves they cause
+    def quads_next_change(self, after, count):
+        if after is None:
+            timeline = self.quads_timeline()
+            after_time = timeline.now
+        else:
+            try:
+                after_time = quads_date_to_epoch(after)
+            except Exception, ex:
+                self.logger.error("Data format error : %s" % ex)
+                exit(1)
+            # transitions before the archive horizon are in the archive
+            timeline = self.quads_timeline(after_time)
+
+        for when, moves in timeline.next_changes(after_time, count):
+            print quads_epoch_to_date(when)
+            for h, old_cloud, new_cloud in moves:
+                print "  " + h + " : " + old_cloud + " -> " + new_cloud
+
+        return
+
+    # helper function called from other methods.  Never called from main()
+    # returns a list of messages, one per problem found in the data
+    def _quads_data_problems(self):
+        problems = []
+        for h in sorted(self.quads.hosts.data.iterkeys()):
+            if self.quads.hosts.data[h]["cloud"] not in self.quads.clouds.data:
+                problems.append(h + " : default cloud " + self.quads.hosts.data[h]["cloud"] + " is not defined")
+            schedule = self.quads.hosts.data[h]["schedule"]
+            for override in sorted(schedule):
+                s = schedule[override]
+                start, end = quads_schedule_epochs(s)
+                if start >= end:
+                    problems.append(h + " : schedule " + str(override) + " ends before it starts (" + s["start"] + " - " + s["end"] + ")")
+                if s["cloud"] not in self.quads.clouds.data:
+                    problems.append(h + " : schedule " + str(override) + " uses undefined cloud " + s["cloud"])
+            for first, second in self.schedule_index.conflicts(h):
+                problems.append(h + " : schedule " + str(first[2]) + " (" + quads_epoch_to_date(first[0]) + " - " +
+                                quads_epoch_to_date(first[1]) + ") overlaps schedule " + str(second[2]) + " (" +
+                                quads_epoch_to_date(second[0]) + " - " + quads_epoch_to_date(second[1]) + ")")
+        return problems
+
+    # validate the schedules of every host in the lab
+    def quads_check_schedules(self):
+        problems = self._quads_data_problems()
+        for p in problems:
+            print p
+
+        if problems:
+            exit(1)
+        print "No schedule problems found."
+        return
+
+    # move expired schedules and old history to the archive file
+    def quads_archive(self, before):
+        now = time.time()
+        if before is None:
+            horizon = int(now)
+        else:
+            try:
+                horizon = quads_date_to_epoch(before)
+            except Exception, ex:
+                self.logger.error("Data format error : %s" % ex)
+                exit(1)
+        if horizon > now:
+            self.logger.error("archive date can not be in the future.")
+            exit(1)
+
+        # make sure the history is initialized before it is split up
+        self.schedule_index
+        archive = Archive(self.config)
+        schedules, entries = archive.archive(self.quads, horizon)
+        self.quads.archive_horizon = max(horizon, self.quads.archive_horizon)
+        self.quads.dirty_all = True
+        # the archive goes out first, so a failed write of the config
+        # never loses the archived entries
+        archive.write()
+        self.schedule_index.invalidate()
+        self._archive_index = None
+        self.archive_timeline = None
+        self.quads_write_data(False)
+
+        print "Archived " + str(schedules) + " schedules and " + str(entries) + " history entries before " + quads_epoch_to_date(self.quads.archive_horizon) + "."
+        return
+
+    # run the operations of a plan file in memory and write the result
+    # once, or not at all if any of them fails
+    def quads_apply_plan(self, planfile, dryrun):
+        try:
+            stream = open(planfile, 'r')
+            plan = yaml.safe_load(stream)
+            stream.close()
+        except Exception, ex:
+            self.logger.error("There was a problem with your file %s" % ex)
+            exit(1)
+
+        if not isinstance(plan, list):
+            self.logger.error("plan file must be a list of operations.")
+            exit(1)
+
+        saved = self.quads.save()
+        self.deferwrite = True
+        for step, operation in enumerate(plan, 1):
+            try:
+                self._quads_apply_operation(operation)
+            except SystemExit:
+                self.quads.restore(saved)
+                self.schedule_index.invalidate()
+                self.deferwrite = False
+                print "Error in step " + str(step) + " of " + planfile + ": " + str(operation)
+                print "Plan not applied."
+                exit(1)
+        self.deferwrite = False
+
+        problems = self._quads_data_problems()
+        if problems:
+            for p in problems:
+                print p
+            self.quads.restore(saved)
+            self.schedule_index.invalidate()
+            print "Plan not applied."
+            exit(1)
+
+        if dryrun:
+            before = yaml.dump(saved, default_flow_style=False).splitlines(True)
+            after = yaml.dump(self.quads.as_dict(), default_flow_style=False).splitlines(True)
+            for line in difflib.unified_diff(before, after, self.config, planfile):
+                sys.stdout.write(line)
+            self.quads.restore(saved)
+            self.schedule_index.invalidate()
+            return
 
         self.quads_write_data()
 
         return
 
+    # helper function called from other methods.  Never called from main()
+    def _quads_apply_operation(self, operation):
+        operations = ['define-cloud', 'define-host', 'add-schedule', 'mod-schedule', 'rm-schedule', 'rm-host', 'rm-cloud']
+        if not isinstance(operation, dict):
+            self.logger.error("unknown operation " + str(operation))
+            exit(1)
+        found = [o for o in operations if o in operation]
+        if len(found) != 1:
+            self.logger.error("each step needs exactly one of: " + ", ".join(operations))
+            exit(1)
+        op = found[0]
+        target = operation[op]
+        force = operation.get('force', False)
+
+        if op == 'define-cloud':
+            self.quads_update_cloud(target, operation.get('description'), force, operation.get('cloud-owner'),
+                                    operation.get('cc-users'), operation.get('cloud-ticket'), operation.get('qinq'))
+        elif op == 'define-host':
+            self.quads_update_host(target, operation.get('default-cloud'), force)
+        elif op == 'add-schedule':
+            if 'schedule-start' not in operation or 'schedule-end' not in operation or 'schedule-cloud' not in operation:
+                self.logger.error("add-schedule needs schedule-start, schedule-end and schedule-cloud")
+                exit(1)
+            self.quads_add_host_schedule(operation['schedule-start'], operation['schedule-end'],
+                                         operation['schedule-cloud'], target)
+        elif op == 'mod-schedule':
+            if 'id' not in operation:
+                self.logger.error("mod-schedule needs the schedule id")
+                exit(1)
+            self.quads_mod_host_schedule(operation['id'], operation.get('schedule-start'),
+                                         operation.get('schedule-end'), operation.get('schedule-cloud'), target)
+        elif op == 'rm-schedule':
+            if 'id' not in operation:
+                self.logger.error("rm-schedule needs the schedule id")
+                exit(1)
+            self.quads_rm_host_schedule(operation['id'], target)
+        elif op == 'rm-host':
+            # removing an unknown host is not an error on the command
+            # line, but it is in a plan
+            if target not in self.quads.hosts.data:
+                self.logger.error("host \"" + target + "\" is not defined.")
+                exit(1)
+            self.quads_remove_host(target)
+        elif op == 'rm-cloud':
+            if target not in self.quads.clouds.data:
+                self.logger.error("cloud \"" + target + "\" is not defined.")
+                exit(1)
+            self.quads_remove_cloud(target)
+            # the cloud is kept if a host still uses it
+            if target in self.quads.clouds.data:
+                exit(1)
+
     # as needed move host(s) based on defined schedules
     def quads_move_hosts(self, movecommand, dryrun, statedir, datearg):
         # move a host
 
+        if statedir == self.statedir:
+            statestore = self.state_store
+        else:
+            statestore = StateStore(statedir)
         kwargs = {'movecommand': movecommand, 'dryrun': dryrun, 'statedir': statedir,
-                  'datearg': datearg}
+                  'statestore': statestore, 'datearg': datearg}
 
         self.network_service.move_hosts(self, **kwargs)
 
         exit(0)
 
     # generally the last thing that happens is reporting results
-    def quads_print_result(self, host, cloudonly, datearg, summaryreport, fullsummaryreport, lsschedule):
+    def quads_print_result(self, host, cloudonly, datearg, summaryreport, fullsummaryreport, lsschedule, hostfilter=None):
         # If we're here, we're done with all other options and just need to
         # print either summary, full report if no host is specified
         if host is None:
-            summary = {}
-
-            for cloud in sorted(self.quads.clouds.data.iterkeys()):
-                summary[cloud] = []
-
-            for h in sorted(self.quads.hosts.data.iterkeys()):
-                default_cloud, current_cloud, current_override = self._quads_find_current(h, datearg)
-                summary[current_cloud].append(h)
-
-            cloud_history = self.quads.cloud_history.data
-            current_time = datetime.now()
+            selected = self.quads_filter_hosts(hostfilter)
             if datearg is None:
-                requested_time = current_time
+                timeline = self.quads_timeline()
+                requested_time = timeline.now
             else:
                 try:
-                    requested_time = datetime.strptime(datearg, '%Y-%m-%d %H:%M')
+                    requested_time = quads_date_to_epoch(datearg)
                 except Exception, ex:
                     self.logger.error("Data format error : %s" % ex)
                     exit(1)
+                timeline = self.quads_timeline(requested_time)
+
+            snapshot = timeline.clouds_at(requested_time)
+
+            summary = {}
+            for cloud in sorted(self.quads.clouds.data.iterkeys()):
+                summary[cloud] = snapshot.get(cloud, [])
+                if selected is not None:
+                    summary[cloud] = [h for h in summary[cloud] if h in selected]
 
             if summaryreport or fullsummaryreport:
-                if fullsummaryreport:
-                    for cloud in sorted(self.quads.clouds.data.iterkeys()):
-                        if requested_time < current_time:
-                            for c in sorted(cloud_history[cloud]):
-                                if datetime.fromtimestamp(c) <= requested_time:
-                                    requested_description = cloud_history[cloud][c]["description"]
-                        else:
-                            requested_description = self.quads.clouds.data[cloud]["description"]
+                for cloud in sorted(self.quads.clouds.data.iterkeys()):
+                    if fullsummaryreport or len(summary[cloud]) > 0:
+                        requested_description = timeline.description(cloud, requested_time)
                         print cloud + " : " + str(len(summary[cloud])) + " (" + requested_description + ")"
-                else:
-                    for cloud in sorted(self.quads.clouds.data.iterkeys()):
-                        if len(summary[cloud]) > 0:
-                            if requested_time < current_time:
-                                for c in sorted(cloud_history[cloud]):
-                                    if datetime.fromtimestamp(c) <= requested_time:
-                                        requested_description = cloud_history[cloud][c]["description"]
-                            else:
-                                requested_description = self.quads.clouds.data[cloud]["description"]
-                            print cloud + " : " + str(len(summary[cloud])) + " (" + requested_description + ")"
             else:
                 for cloud in sorted(self.quads.clouds.data.iterkeys()):
                     if cloudonly is None:
@@ -569,6 +1213,7 @@ class Quads(object):
 
     # add for EC528 HIL-QUADS integration project
     def quads_rest_call(self, method, url, request, json_data=None):
+        import requests
         r = requests.request(method, url + request, data=json_data)
         if method == 'GET':
             return r
@@ -584,6 +1229,8 @@ class Quads(object):
         if url is None:
             sys.exit("Error: server url not specified")
 
+        import urllib
+
         for arg in args:
             url += '/' + urllib.quote(arg, '')
         return url
@@ -601,21 +1248,27 @@ class Quads(object):
 
     @classmethod
     def quads_put(self, url, data={}):
+        import requests
+        import json
         self.quads_status_code_check(requests.put(url, data=json.dumps(data)))
 
 
     @classmethod
     def quads_post(self, url, data={}):
+        import requests
+        import json
         self.quads_status_code_check(requests.post(url, data=json.dumps(data)))
 
 
     @classmethod
     def quads_get(self, url, params=None):
+        import requests
         return self.quads_status_code_check(requests.get(url, params=params))
 
 
     @classmethod
     def quads_delete(self, url):
+        import requests
         self.quads_status_code_check(requests.delete(url))
 
 
@@ -0,0 +1,170 @@
+# This file is part of QUADs.
+#
+# QUADs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUADs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUADs.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import logging
+import os
+import socket
+import sys
+from StringIO import StringIO
+
+
+# ask the daemon listening on socketpath to run the command line argv.
+# returns (exit code, output), or None when there is no daemon or it
+# does not serve this command, in which case the caller runs it itself.
+def quads_daemon_query(socketpath, argv):
+    try:
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.connect(socketpath)
+    except Exception:
+        return None
+    try:
+        s.sendall(json.dumps({"argv": argv, "cwd": os.getcwd()}) + "\n")
+        s.shutdown(socket.SHUT_WR)
+        reply = ""
+        while True:
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            reply += chunk
+        s.close()
+        reply = json.loads(reply)
+    except Exception:
+        return None
+    if reply["code"] is None:
+        return None
+    return reply["code"], reply["output"].encode("utf-8")
+
+
+class QuadsDaemon(object):
+    def __init__(self, socketpath, factory, handler):
+        """
+        Initialize a QuadsDaemon object.  The daemon keeps the Quads
+        object returned by factory() in memory and answers queries on the
+        unix socket socketpath, so repeated queries do not have to load
+        and index the data again.
+
+        handler(quads, argv) runs a command line against quads and may
+        return False for commands the daemon does not serve.  Everything
+        it prints, and the code it exits with, is sent back to the client.
+        The data is loaded again whenever one of the files it was loaded
+        from (quads_data_files() of the Quads object) changes.
+        """
+        self.logger = logging.getLogger("quads.QuadsDaemon")
+        self.logger.setLevel(logging.DEBUG)
+        self.socketpath = socketpath
+        self.files = []
+        self.factory = factory
+        self.handler = handler
+        self.quads = None
+        self.signature = None
+
+    def _signature(self):
+        signature = []
+        for f in self.files:
+            try:
+                st = os.stat(f)
+                signature.append((st.st_mtime, st.st_size, st.st_ino))
+            except OSError:
+                signature.append(None)
+        return signature
+
+    def current(self):
+        """ return the Quads object, loading the data again if it changed """
+        signature = self._signature()
+        if self.quads is None or signature != self.signature:
+            self.quads = self.factory()
+            files = self.quads.quads_data_files()
+            if files != self.files:
+                self.files = files
+                signature = self._signature()
+            self.signature = signature
+        return self.quads
+
+    def serve(self):
+        """
+        Answer queries until killed.  The socket is removed on the way
+        out, so have SIGTERM raise SystemExit to stop the daemon.
+        """
+        if os.path.exists(self.socketpath):
+            # a daemon still answering owns the socket
+            if quads_daemon_query(self.socketpath, []) is not None:
+                self.logger.error("quadsd is already running on " + self.socketpath)
+                exit(1)
+            os.remove(self.socketpath)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socketpath)
+        os.chmod(self.socketpath, 0660)
+        server.listen(64)
+        self.logger.info("quadsd listening on " + self.socketpath)
+        try:
+            while True:
+                conn, address = server.accept()
+                try:
+                    self._answer(conn)
+                except Exception, ex:
+                    self.logger.error("quadsd request failed: %s" % ex)
+                conn.close()
+        finally:
+            server.close()
+            os.remove(self.socketpath)
+
+    def _answer(self, conn):
+        request = ""
+        while not request.endswith("\n"):
+            chunk = conn.recv(65536)
+            if not chunk:
+                break
+            request += chunk
+        request = json.loads(request)
+        code, output = self.run(request["argv"], request["cwd"])
+        conn.sendall(json.dumps({"code": code, "output": output}))
+
+    def run(self, argv, cwd):
+        """
+        Run argv in the directory cwd and return (exit code, output), or
+        (None, "") if the daemon does not serve the command.
+        """
+        output = StringIO()
+        stdout, stderr = sys.stdout, sys.stderr
+        # log messages printed to the console go to the client as well
+        handlers = [h for h in logging.getLogger("quads").handlers
+                    if isinstance(h, logging.StreamHandler) and h.stream in [stdout, stderr]]
+        streams = [h.stream for h in handlers]
+        olddir = os.getcwd()
+        code = 0
+        try:
+            os.chdir(cwd)
+            sys.stdout = sys.stderr = output
+            for h in handlers:
+                h.stream = output
+            if self.handler(self.current(), argv) is False:
+                code = None
+        except SystemExit, ex:
+            if ex.code is None:
+                code = 0
+            elif isinstance(ex.code, int):
+                code = ex.code
+            else:
+                output.write(str(ex.code) + "\n")
+                code = 1
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+            for h, stream in zip(handlers, streams):
+                h.stream = stream
+            os.chdir(olddir)
+        if code is None:
+            return None, ""
+        return code, output.getvalue()
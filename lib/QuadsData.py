@@ -13,17 +13,128 @@
 # You should have received a copy of the GNU General Public License
 # along with QUADs.  If not, see <http://www.gnu.org/licenses/>.
 
+import copy
+
 from Clouds import Clouds
 from Hosts import Hosts
 from History import History
 from CloudHistory import CloudHistory
 
+from ScheduleIndex import quads_refresh_epochs
+
+# version 1: schedule start/end only stored as "YYYY-MM-DD hh:mm" strings
+# version 2: schedule entries also carry start_epoch/end_epoch
+QUADS_SCHEMA_VERSION = 2
+
 class QuadsData(object):
     def __init__(self, data):
         """
-        Initialize the QuadsData object.
+        Initialize the QuadsData object.  The hosts, clouds, history and
+        cloud_history sections are only wrapped (and so only read from
+        data) the first time they are used.
         """
-        self.hosts = Hosts(data)
-        self.clouds = Clouds(data)
-        self.history = History(data)
-        self.cloud_history = CloudHistory(data)
+        self.data = data
+        self._sections = {}
+        if 'version' not in data:
+            self.version = 1
+        else:
+            self.version = data["version"]
+        # schedules and history before archive_horizon may have been moved
+        # to the archive, next_schedule_ids keeps archived schedule ids
+        # from being handed out again
+        archive = data.get("archive") or {}
+        self.archive_horizon = archive.get("horizon")
+        self.next_schedule_ids = archive.get("next_schedule_ids", {})
+        # (section, key) of the entries changed since the last write,
+        # for journal mode.  dirty_all means everything has to be written.
+        self.dirty = set()
+        self.dirty_all = False
+
+    def _section(self, name, section_class):
+        if name not in self._sections:
+            self._sections[name] = section_class(self.data)
+        return self._sections[name]
+
+    @property
+    def hosts(self):
+        return self._section("hosts", Hosts)
+
+    @property
+    def clouds(self):
+        return self._section("clouds", Clouds)
+
+    @property
+    def history(self):
+        return self._section("history", History)
+
+    @property
+    def cloud_history(self):
+        return self._section("cloud_history", CloudHistory)
+
+    # bring data written by older versions up to the current schema.
+    # returns True if anything changed and the data should be written.
+    def upgrade(self):
+        if self.version >= QUADS_SCHEMA_VERSION:
+            return False
+
+        quads_refresh_epochs(self.hosts.data)
+
+        self.version = QUADS_SCHEMA_VERSION
+        self.dirty_all = True
+        return True
+
+    # note that an entry ("clouds", "hosts", "history" or "cloud_history"
+    # section and cloud or host key) was changed or removed
+    def mark_dirty(self, section, key):
+        self.dirty.add((section, key))
+
+    # return the changed entries as a {section: {key: value}} record, with
+    # None for removed entries, and start tracking afresh
+    def journal_record(self):
+        sections = {"clouds":self.clouds.data, "hosts":self.hosts.data, "history":self.history.data,
+                    "cloud_history":self.cloud_history.data}
+        record = {}
+        for section, key in self.dirty:
+            if section not in record:
+                record[section] = {}
+            record[section][key] = sections[section].get(key)
+        self.clear_dirty()
+        return record
+
+    def clear_dirty(self):
+        self.dirty = set()
+        self.dirty_all = False
+
+    # the next free schedule id for host
+    def next_schedule_id(self, host):
+        ids = self.hosts.data[host]["schedule"].keys()
+        return max(ids + [self.next_schedule_ids.get(host, 0) - 1, -1]) + 1
+
+    # the data as written to the config file
+    def as_dict(self):
+        data = {"clouds":self.clouds.data, "hosts":self.hosts.data, "history":self.history.data,
+                "cloud_history":self.cloud_history.data, "version":self.version}
+        if self.archive_horizon is not None:
+            data["archive"] = {"horizon":self.archive_horizon, "next_schedule_ids":self.next_schedule_ids}
+        return data
+
+    # return a deep copy of the data, to be handed back to restore()
+    def save(self):
+        return copy.deepcopy(self.as_dict())
+
+    # put back data returned by save().  the sections are refilled in
+    # place, so anything holding a reference to them stays valid.
+    def restore(self, saved):
+        saved = copy.deepcopy(saved)
+        for section in [self.clouds, self.hosts, self.history, self.cloud_history]:
+            section.data.clear()
+        self.clouds.data.update(saved["clouds"])
+        self.hosts.data.update(saved["hosts"])
+        self.history.data.update(saved["history"])
+        self.cloud_history.data.update(saved["cloud_history"])
+        self.cloud_history.times = {}
+        self.version = saved["version"]
+        archive = saved.get("archive") or {}
+        self.archive_horizon = archive.get("horizon")
+        self.next_schedule_ids = archive.get("next_schedule_ids", {})
+        self.dirty_all = True
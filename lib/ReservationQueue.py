@@ -0,0 +1,71 @@
+# This file is part of QUADs.
+#
+# QUADs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUADs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUADs.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+import yaml
+
+
+class ReservationQueue(object):
+    def __init__(self, config):
+        """
+        Initialize a ReservationQueue object.  The pending reservation
+        requests ("count hosts for days days, starting no earlier than
+        start, for cloud") are kept in config + ".queue", in the order
+        they were queued, until they are placed.
+        """
+        self.logger = logging.getLogger("quads.ReservationQueue")
+        self.logger.setLevel(logging.DEBUG)
+        self.path = config + ".queue"
+        self.data = {"next_id": 1, "requests": []}
+        if os.path.isfile(self.path):
+            try:
+                stream = open(self.path, 'r')
+                self.data.update(yaml.safe_load(stream) or {})
+                stream.close()
+            except Exception, ex:
+                self.logger.error("There was a problem with your queue %s" % ex)
+                exit(1)
+
+    @property
+    def requests(self):
+        return self.data["requests"]
+
+    def write(self):
+        try:
+            stream = open(self.path + ".tmp", 'w')
+            stream.write(yaml.safe_dump(self.data, default_flow_style=False))
+            stream.close()
+            os.rename(self.path + ".tmp", self.path)
+        except Exception, ex:
+            self.logger.error("There was a problem with your queue %s" % ex)
+            exit(1)
+
+    def add(self, count, days, start, cloud, hostfilter=None, description=None):
+        """ queue a request and return its id """
+        request = {"id": self.data["next_id"], "count": count, "days": days, "start": start, "cloud": cloud}
+        if hostfilter is not None:
+            request["filter"] = hostfilter
+        if description is not None:
+            request["description"] = description
+        self.data["requests"].append(request)
+        self.data["next_id"] += 1
+        return request["id"]
+
+    def remove(self, ids):
+        """ remove the requests with the given ids, return how many were removed """
+        before = len(self.data["requests"])
+        self.data["requests"] = [r for r in self.data["requests"] if r["id"] not in ids]
+        return before - len(self.data["requests"])
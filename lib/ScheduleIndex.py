@@ -0,0 +1,339 @@
+# This file is part of QUADs.
+#
+# QUADs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUADs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUADs.  If not, see <http://www.gnu.org/licenses/>.
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+import time
+
+QUADS_DATE_FORMAT = '%Y-%m-%d %H:%M'
+
+
+def quads_date_to_epoch(datestring):
+    """
+    Convert a "YYYY-MM-DD hh:mm" string (local time) into epoch seconds.
+    Well formed strings are converted without going through strptime,
+    anything else falls back to strptime (and raises ValueError on
+    malformed input).
+    """
+    s = datestring
+    if len(s) == 16 and s[4] == '-' and s[7] == '-' and s[10] == ' ' and s[13] == ':':
+        try:
+            d = datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]), int(s[11:13]), int(s[14:16]))
+        except ValueError:
+            d = datetime.strptime(s, QUADS_DATE_FORMAT)
+    else:
+        d = datetime.strptime(s, QUADS_DATE_FORMAT)
+    return int(time.mktime(d.timetuple()))
+
+
+def quads_epoch_to_date(epoch):
+    """
+    Convert epoch seconds into a "YYYY-MM-DD hh:mm" string (local time).
+    """
+    return datetime.fromtimestamp(epoch).strftime(QUADS_DATE_FORMAT)
+
+
+def quads_schedule_epochs(schedule):
+    """
+    Return the (start, end) epochs of a schedule entry, using the epochs
+    cached in the entry when they are present.  Data is passed through
+    quads_refresh_epochs() whenever it is parsed, so the cached epochs
+    match the start and end strings.
+    """
+    if "start_epoch" in schedule and "end_epoch" in schedule:
+        return schedule["start_epoch"], schedule["end_epoch"]
+    return quads_date_to_epoch(schedule["start"]), quads_date_to_epoch(schedule["end"])
+
+
+def quads_refresh_epochs(hosts):
+    """
+    Compute the cached epochs of every schedule in hosts (the hosts
+    section of the data) from its start and end strings again, so hand
+    edits and writers that only change the strings are picked up.
+    """
+    for host in (hosts or {}).itervalues():
+        for schedule in (host or {}).get("schedule", {}).itervalues():
+            schedule["start_epoch"] = quads_date_to_epoch(schedule["start"])
+            schedule["end_epoch"] = quads_date_to_epoch(schedule["end"])
+
+
+def quads_schedule_entry(cloud, start, end):
+    """
+    Return a schedule entry for cloud between the start and end
+    "YYYY-MM-DD hh:mm" strings, with their epochs cached alongside.
+    """
+    return {"cloud": cloud, "start": start, "end": end,
+            "start_epoch": quads_date_to_epoch(start), "end_epoch": quads_date_to_epoch(end)}
+
+
+class ScheduleIndex(object):
+    def __init__(self, hosts, history):
+        """
+        Initialize a ScheduleIndex object. This indexes the host
+        schedules and host history of the Quads data so point in
+        time lookups are a binary search instead of a scan of every
+        schedule entry.
+
+        The per-host index is built the first time a host is looked up
+        and kept in step with the data by the schedule mutators.
+        """
+        self.hosts = hosts
+        self.history = history
+        # host -> list of (start, end, override, cloud) sorted by start
+        self.schedules = {}
+        # host -> list of start epochs (parallel to self.schedules)
+        self.starts = {}
+        # host -> running max of end epochs (parallel to self.schedules)
+        self.maxends = {}
+        # host -> (sorted history timestamps, clouds)
+        self.timestamps = {}
+        # bumped on every change so derived views know to rebuild
+        self.generation = 0
+
+    def _schedule_entry(self, host, override):
+        s = self.hosts[host]["schedule"][override]
+        start, end = quads_schedule_epochs(s)
+        return (start, end, override, s["cloud"])
+
+    def _index_host(self, host):
+        entries = []
+        if "schedule" in self.hosts[host]:
+            for override in self.hosts[host]["schedule"]:
+                entries.append(self._schedule_entry(host, override))
+        entries.sort()
+        self.schedules[host] = entries
+        self.starts[host] = [e[0] for e in entries]
+        self.maxends[host] = []
+        self._update_maxends(host, 0)
+
+        times = []
+        clouds = []
+        if host in self.history:
+            for t in sorted(self.history[host]):
+                times.append(t)
+                clouds.append(self.history[host][t])
+        self.timestamps[host] = (times, clouds)
+
+    def _update_maxends(self, host, position):
+        entries = self.schedules[host]
+        maxends = self.maxends[host]
+        del maxends[position:]
+        current = maxends[-1] if maxends else None
+        for e in entries[position:]:
+            if current is None or e[1] > current:
+                current = e[1]
+            maxends.append(current)
+
+    def _require(self, host):
+        if host not in self.schedules:
+            self._index_host(host)
+
+    def invalidate(self, host=None):
+        """
+        Drop the index for a host (or every host) so it is rebuilt from
+        the data on the next lookup.
+        """
+        self.generation += 1
+        if host is None:
+            self.schedules = {}
+            self.starts = {}
+            self.maxends = {}
+            self.timestamps = {}
+            return
+        for d in [self.schedules, self.starts, self.maxends, self.timestamps]:
+            if host in d:
+                del d[host]
+
+    def add_schedule(self, host, override):
+        """ index a schedule entry that was added to the data """
+        self.generation += 1
+        if host not in self.schedules:
+            return
+        entry = self._schedule_entry(host, override)
+        position = bisect_right(self.schedules[host], entry)
+        self.schedules[host].insert(position, entry)
+        self.starts[host].insert(position, entry[0])
+        self._update_maxends(host, position)
+
+    def remove_schedule(self, host, override):
+        """ drop a schedule entry that was removed from the data """
+        self.generation += 1
+        if host not in self.schedules:
+            return
+        for position, e in enumerate(self.schedules[host]):
+            if e[2] == override:
+                del self.schedules[host][position]
+                del self.starts[host][position]
+                self._update_maxends(host, position)
+                return
+
+    def update_schedule(self, host, override):
+        """ re-index a schedule entry that was modified in the data """
+        self.remove_schedule(host, override)
+        self.add_schedule(host, override)
+
+    def schedule_at(self, host, when):
+        """
+        Return the (start, end, override, cloud) schedule entry active
+        for host at epoch "when", or None.  Should entries overlap the
+        lowest schedule id wins.
+        """
+        self._require(host)
+        entries = self.schedules[host]
+        maxends = self.maxends[host]
+        found = None
+        # every entry after position starts later than "when".  walk back
+        # while some earlier entry can still reach past "when".
+        position = bisect_right(self.starts[host], when) - 1
+        while position >= 0 and maxends[position] > when:
+            e = entries[position]
+            if when < e[1] and (found is None or e[2] < found[2]):
+                found = e
+            position -= 1
+        return found
+
+    def overlapping(self, host, start, end, exclude=None):
+        """
+        Return every (start, end, override, cloud) schedule entry of host
+        overlapping the [start, end) epoch window, in start order.  The
+        "exclude" schedule id is skipped (for modifying an entry in place).
+        """
+        self._require(host)
+        entries = self.schedules[host]
+        maxends = self.maxends[host]
+        found = []
+        # entries from position on start at or after "end".  walk back
+        # while some earlier entry can still reach past "start".
+        position = bisect_left(self.starts[host], end) - 1
+        while position >= 0 and maxends[position] > start:
+            e = entries[position]
+            if start < e[1] and e[2] != exclude:
+                found.append(e)
+            position -= 1
+        found.reverse()
+        return found
+
+    def conflicts(self, host):
+        """
+        Return every pair of overlapping schedule entries of host as
+        ((start, end, override, cloud), (start, end, override, cloud))
+        tuples, the earlier starting entry first.
+        """
+        self._require(host)
+        entries = self.schedules[host]
+        maxends = self.maxends[host]
+        pairs = []
+        for i, e in enumerate(entries):
+            position = i - 1
+            while position >= 0 and maxends[position] > e[0]:
+                if entries[position][1] > e[0]:
+                    pairs.append((entries[position], e))
+                position -= 1
+        return pairs
+
+    def history_at(self, host, when):
+        """
+        Return the cloud recorded in the host history at epoch "when",
+        or None if there is no history that early.
+        """
+        self._require(host)
+        times, clouds = self.timestamps[host]
+        position = bisect_right(times, when) - 1
+        if position < 0:
+            return None
+        return clouds[position]
+
+    def find(self, host, when, now):
+        """
+        Return default_cloud, current_cloud, current_override for host
+        at epoch "when".  History is only consulted for times before
+        "now".
+        """
+        if host not in self.hosts:
+            return None, None, None
+
+        default_cloud = self.hosts[host]["cloud"]
+        entry = self.schedule_at(host, when)
+        if entry is not None:
+            return default_cloud, entry[3], entry[2]
+
+        current_cloud = default_cloud
+        if when < now:
+            cloud = self.history_at(host, when)
+            if cloud is not None:
+                current_cloud = cloud
+
+        return default_cloud, current_cloud, None
+
+    def sweep(self, host, times, now):
+        """
+        Same as find() for every epoch in the sorted list "times", but
+        done in a single pass over the schedules and history of host.
+        """
+        if host not in self.hosts:
+            return [(None, None, None)] * len(times)
+
+        self._require(host)
+        default_cloud = self.hosts[host]["cloud"]
+        entries = self.schedules[host]
+        maxends = self.maxends[host]
+        history_times, history_clouds = self.timestamps[host]
+
+        results = []
+        started = 0
+        recorded = 0
+        for when in times:
+            while started < len(entries) and entries[started][0] <= when:
+                started += 1
+            while recorded < len(history_times) and history_times[recorded] <= when:
+                recorded += 1
+
+            found = None
+            position = started - 1
+            while position >= 0 and maxends[position] > when:
+                e = entries[position]
+                if when < e[1] and (found is None or e[2] < found[2]):
+                    found = e
+                position -= 1
+
+            if found is not None:
+                results.append((default_cloud, found[3], found[2]))
+            elif when < now and recorded > 0:
+                results.append((default_cloud, history_clouds[recorded - 1], None))
+            else:
+                results.append((default_cloud, default_cloud, None))
+        return results
+
+    def changes(self, host, now):
+        """
+        Return the list of (epoch, cloud) points where the current cloud
+        of host changes, in time order.  Before the first point the host
+        is in its default cloud.
+        """
+        self._require(host)
+        points = set(self.starts[host])
+        points.update(e[1] for e in self.schedules[host])
+        points.update(t for t in self.timestamps[host][0] if t < now)
+        # history stops applying at "now"
+        points.add(now)
+
+        changes = []
+        current = self.hosts[host]["cloud"]
+        for t in sorted(points):
+            default_cloud, cloud, override = self.find(host, t, now)
+            if cloud != current:
+                changes.append((t, cloud))
+                current = cloud
+        return changes
@@ -0,0 +1,224 @@
+# This file is part of QUADs.
+#
+# QUADs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUADs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUADs.  If not, see <http://www.gnu.org/licenses/>.
+
+import sqlite3
+import yaml
+
+from ScheduleIndex import ScheduleIndex, quads_schedule_epochs
+
+QUADS_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS clouds (name TEXT PRIMARY KEY, description TEXT, owner TEXT, ticket TEXT,
+                                   qinq TEXT, ccusers TEXT, networks TEXT);
+CREATE TABLE IF NOT EXISTS hosts (name TEXT PRIMARY KEY, cloud TEXT, interfaces TEXT, attributes TEXT);
+CREATE TABLE IF NOT EXISTS schedules (host TEXT, id INTEGER, cloud TEXT, start TEXT, end TEXT,
+                                      start_epoch INTEGER, end_epoch INTEGER, PRIMARY KEY (host, id));
+CREATE TABLE IF NOT EXISTS history (host TEXT, time INTEGER, cloud TEXT, PRIMARY KEY (host, time));
+CREATE TABLE IF NOT EXISTS cloud_history (cloud TEXT, time INTEGER, description TEXT, owner TEXT,
+                                          ticket TEXT, qinq TEXT, ccusers TEXT, PRIMARY KEY (cloud, time));
+CREATE INDEX IF NOT EXISTS schedules_host_time ON schedules (host, start_epoch, end_epoch);
+CREATE INDEX IF NOT EXISTS schedules_cloud_time ON schedules (cloud, start_epoch, end_epoch);
+"""
+
+
+class SqliteData(object):
+    def __init__(self, path):
+        """
+        Initialize a SqliteData object.  This stores the Quads data (clouds,
+        hosts, schedules, history and cloud_history) in normalized tables
+        of a SQLite database, in WAL mode so readers do not block while a
+        write is in progress.
+
+        load() and save() convert to and from the dictionaries found in
+        the YAML data file.  The schedules are indexed by host and by
+        cloud on their epochs, for the point in time and range queries
+        below.
+        """
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=30)
+        # the rest of quads expects str, not unicode
+        self.db.text_factory = str
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(QUADS_SQLITE_SCHEMA)
+        # databases created before hosts had declared attributes
+        if "attributes" not in [column[1] for column in self.db.execute("PRAGMA table_info(hosts)")]:
+            self.db.execute("ALTER TABLE hosts ADD COLUMN attributes TEXT")
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def load(self):
+        """ return the data as a dictionary in the YAML file layout """
+        data = {"clouds": {}, "hosts": {}, "history": {}, "cloud_history": {}}
+        for name, description, owner, ticket, qinq, ccusers, networks in self.db.execute(
+                "SELECT name, description, owner, ticket, qinq, ccusers, networks FROM clouds"):
+            data["clouds"][name] = {"description": description, "owner": owner, "ticket": ticket,
+                                    "qinq": qinq, "ccusers": yaml.safe_load(ccusers),
+                                    "networks": yaml.safe_load(networks)}
+        for name, cloud, interfaces, attributes in self.db.execute("SELECT name, cloud, interfaces, attributes FROM hosts"):
+            data["hosts"][name] = {"cloud": cloud, "interfaces": yaml.safe_load(interfaces), "schedule": {}}
+            if attributes:
+                data["hosts"][name]["attributes"] = yaml.safe_load(attributes)
+        for host, override, cloud, start, end, start_epoch, end_epoch in self.db.execute(
+                "SELECT host, id, cloud, start, end, start_epoch, end_epoch FROM schedules"):
+            if host in data["hosts"]:
+                data["hosts"][host]["schedule"][override] = {"cloud": cloud, "start": start, "end": end,
+                                                             "start_epoch": start_epoch, "end_epoch": end_epoch}
+        for host, when, cloud in self.db.execute("SELECT host, time, cloud FROM history"):
+            data["history"].setdefault(host, {})[when] = cloud
+        for cloud, when, description, owner, ticket, qinq, ccusers in self.db.execute(
+                "SELECT cloud, time, description, owner, ticket, qinq, ccusers FROM cloud_history"):
+            data["cloud_history"].setdefault(cloud, {})[when] = {"description": description, "owner": owner,
+                                                                 "ticket": ticket, "qinq": qinq,
+                                                                 "ccusers": yaml.safe_load(ccusers)}
+        for key, value in self.db.execute("SELECT key, value FROM meta WHERE key IN ('version', 'archive')"):
+            if key == "version":
+                data["version"] = int(value)
+            else:
+                data["archive"] = yaml.safe_load(value)
+        return data
+
+    def save(self, data):
+        """ replace everything in the database with data, in one transaction """
+        with self.db:
+            for table in ["clouds", "hosts", "schedules", "history", "cloud_history"]:
+                self.db.execute("DELETE FROM " + table)
+            for section in ["clouds", "hosts", "history", "cloud_history"]:
+                for key, value in data.get(section, {}).iteritems():
+                    self._insert(section, key, value)
+            if "version" in data:
+                self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)",
+                                (str(data["version"]),))
+            if "archive" in data:
+                self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('archive', ?)",
+                                (yaml.safe_dump(data["archive"]),))
+            else:
+                self.db.execute("DELETE FROM meta WHERE key = 'archive'")
+
+    def save_entries(self, data, entries):
+        """
+        Rewrite only the rows of the given (section, key) entries, in one
+        transaction.  Entries missing from data are deleted.
+        """
+        with self.db:
+            for section, key in entries:
+                self._delete(section, key)
+                if key in data[section]:
+                    self._insert(section, key, data[section][key])
+
+    def _delete(self, section, key):
+        if section == "clouds":
+            self.db.execute("DELETE FROM clouds WHERE name = ?", (key,))
+        elif section == "hosts":
+            self.db.execute("DELETE FROM hosts WHERE name = ?", (key,))
+            self.db.execute("DELETE FROM schedules WHERE host = ?", (key,))
+        elif section == "history":
+            self.db.execute("DELETE FROM history WHERE host = ?", (key,))
+        elif section == "cloud_history":
+            self.db.execute("DELETE FROM cloud_history WHERE cloud = ?", (key,))
+
+    def _insert(self, section, key, value):
+        if section == "clouds":
+            self.db.execute("INSERT INTO clouds (name, description, owner, ticket, qinq, ccusers, networks) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (key, value.get("description"), value.get("owner"), value.get("ticket"),
+                             value.get("qinq"), yaml.safe_dump(value.get("ccusers", [])),
+                             yaml.safe_dump(value.get("networks", {}))))
+        elif section == "hosts":
+            attributes = None
+            if value.get("attributes"):
+                attributes = yaml.safe_dump(value["attributes"])
+            self.db.execute("INSERT INTO hosts (name, cloud, interfaces, attributes) VALUES (?, ?, ?, ?)",
+                            (key, value["cloud"], yaml.safe_dump(value.get("interfaces", {})), attributes))
+            for override, s in value.get("schedule", {}).iteritems():
+                start_epoch, end_epoch = quads_schedule_epochs(s)
+                self.db.execute("INSERT INTO schedules (host, id, cloud, start, end, start_epoch, end_epoch) "
+                                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                (key, override, s["cloud"], s["start"], s["end"], start_epoch, end_epoch))
+        elif section == "history":
+            for when, cloud in value.iteritems():
+                self.db.execute("INSERT INTO history (host, time, cloud) VALUES (?, ?, ?)", (key, when, cloud))
+        elif section == "cloud_history":
+            for when, entry in value.iteritems():
+                self.db.execute("INSERT INTO cloud_history (cloud, time, description, owner, ticket, qinq, ccusers) "
+                                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                (key, when, entry.get("description"), entry.get("owner"), entry.get("ticket"),
+                                 entry.get("qinq"), yaml.safe_dump(entry.get("ccusers", []))))
+
+    def schedules_at(self, when, host=None):
+        """
+        Return [(host, schedule id, cloud), ...] for the schedules active
+        at epoch "when", for every host or only for host.
+        """
+        if host is None:
+            rows = self.db.execute("SELECT host, id, cloud FROM schedules WHERE start_epoch <= ? AND ? < end_epoch "
+                                   "ORDER BY host, id", (when, when))
+        else:
+            rows = self.db.execute("SELECT host, id, cloud FROM schedules WHERE host = ? AND start_epoch <= ? "
+                                   "AND ? < end_epoch ORDER BY id", (host, when, when))
+        return rows.fetchall()
+
+    def schedules_between(self, cloud, start, end):
+        """
+        Return [(host, schedule id, start epoch, end epoch), ...] for the
+        schedules of cloud overlapping the [start, end) epoch window.
+        """
+        rows = self.db.execute("SELECT host, id, start_epoch, end_epoch FROM schedules WHERE cloud = ? "
+                               "AND start_epoch < ? AND ? < end_epoch ORDER BY start_epoch, host",
+                               (cloud, end, start))
+        return rows.fetchall()
+
+    def host_schedules_between(self, host, start, end):
+        """
+        Return [(start epoch, end epoch, schedule id, cloud), ...] for the
+        schedules of host overlapping the [start, end) epoch window, in
+        start order.
+        """
+        rows = self.db.execute("SELECT start_epoch, end_epoch, id, cloud FROM schedules WHERE host = ? "
+                               "AND start_epoch < ? AND ? < end_epoch ORDER BY start_epoch, end_epoch, id",
+                               (host, end, start))
+        return rows.fetchall()
+
+
+class SqliteScheduleIndex(ScheduleIndex):
+    def __init__(self, sqlite, quads):
+        """
+        Initialize a SqliteScheduleIndex object.  This answers the point
+        in time and overlap lookups of a ScheduleIndex with the indexed
+        queries of sqlite (a SqliteData object), for the hosts whose
+        schedules are as saved in the database.  Hosts changed in quads
+        (a QuadsData object) since the last write, and the other lookups,
+        use the in memory index.
+        """
+        ScheduleIndex.__init__(self, quads.hosts.data, quads.history.data)
+        self.sqlite = sqlite
+        self.quads = quads
+
+    def _saved(self, host):
+        return not self.quads.dirty_all and ("hosts", host) not in self.quads.dirty
+
+    def schedule_at(self, host, when):
+        if not self._saved(host):
+            return ScheduleIndex.schedule_at(self, host, when)
+        rows = self.sqlite.schedules_at(when, host)
+        if not rows:
+            return None
+        return self._schedule_entry(host, rows[0][1])
+
+    def overlapping(self, host, start, end, exclude=None):
+        if not self._saved(host):
+            return ScheduleIndex.overlapping(self, host, start, end, exclude)
+        return [e for e in self.sqlite.host_schedules_between(host, start, end) if e[2] != exclude]
@@ -0,0 +1,136 @@
+# This file is part of QUADs.
+#
+# QUADs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUADs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUADs.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+
+
+class StateStore(object):
+    def __init__(self, statedir):
+        """
+        Initialize a StateStore object.  The cloud each host is currently
+        in, and when it was last moved, are kept in a single file
+        (statedir + "/.state", one "host cloud moved" line per host) that
+        is read once and replaced atomically by save().
+
+        The per-host files in statedir are still written for the hosts
+        that changed, for the scripts that read them.  The first time the
+        store is used it is filled from those files.
+        """
+        self.logger = logging.getLogger("quads.StateStore")
+        self.logger.setLevel(logging.DEBUG)
+        self.statedir = statedir
+        self.path = os.path.join(statedir, ".state")
+        # host: [cloud, epoch of the last move or None]
+        self.hosts = {}
+        self.changed = set()
+        # filled from the per-host files, the state file is still missing
+        self.imported = False
+        if os.path.isfile(self.path):
+            self._read()
+        elif os.path.isdir(statedir):
+            self._import()
+
+    def _read(self):
+        try:
+            stream = open(self.path, 'r')
+            for line in stream:
+                fields = line.split()
+                moved = None
+                if len(fields) > 2:
+                    moved = int(fields[2])
+                self.hosts[fields[0]] = [fields[1], moved]
+            stream.close()
+        except Exception, ex:
+            self.logger.error("There was a problem with your file %s" % ex)
+            exit(1)
+
+    # the per-host files written by older versions
+    def _import(self):
+        for h in os.listdir(self.statedir):
+            if h.startswith("."):
+                continue
+            try:
+                stream = open(os.path.join(self.statedir, h), 'r')
+                cloud = stream.readline().rstrip()
+                stream.close()
+            except Exception, ex:
+                self.logger.error("There was a problem with your file %s" % ex)
+                continue
+            if cloud:
+                self.hosts[h] = [cloud, None]
+                self.imported = True
+
+    def __contains__(self, host):
+        return host in self.hosts
+
+    def cloud(self, host):
+        """ return the cloud host is in, or None if it is not known """
+        if host not in self.hosts:
+            return None
+        return self.hosts[host][0]
+
+    def moved(self, host):
+        """ return the epoch host was last moved at, or None """
+        if host not in self.hosts:
+            return None
+        return self.hosts[host][1]
+
+    def set(self, host, cloud, moved=None):
+        """ record the cloud of host, and the epoch it was moved at """
+        if moved is None and host in self.hosts and self.hosts[host][0] == cloud:
+            return
+        self.hosts[host] = [cloud, moved]
+        self.changed.add(host)
+
+    def save(self):
+        """
+        Replace the state file with the current state, then update the
+        per-host files of the hosts that changed.  Nothing is written
+        when nothing changed since the state file was written.
+        """
+        if not self.changed and not self.imported and os.path.isfile(self.path):
+            return
+        try:
+            stream = open(self.path + ".tmp", 'w')
+            for h in sorted(self.hosts):
+                cloud, moved = self.hosts[h]
+                if moved is None:
+                    stream.write(h + " " + cloud + "\n")
+                else:
+                    stream.write(h + " " + cloud + " " + str(moved) + "\n")
+            stream.close()
+            os.rename(self.path + ".tmp", self.path)
+        except Exception, ex:
+            self.logger.error("There was a problem with your file %s" % ex)
+            exit(1)
+        self.export(self.changed)
+        self.changed = set()
+        self.imported = False
+
+    def export(self, hosts=None):
+        """
+        Write the per-host state files for hosts (default every host),
+        each containing the name of the cloud the host is in.
+        """
+        if hosts is None:
+            hosts = self.hosts.keys()
+        for h in sorted(hosts):
+            try:
+                stream = open(os.path.join(self.statedir, h), 'w')
+                stream.write(self.hosts[h][0] + '\n')
+                stream.close()
+            except Exception, ex:
+                self.logger.error("There was a problem with your file %s" % ex)
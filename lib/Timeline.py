@@ -0,0 +1,117 @@
+# This file is part of QUADs.
+#
+# QUADs is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QUADs is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QUADs.  If not, see <http://www.gnu.org/licenses/>.
+
+from bisect import bisect_right
+
+# a full host -> cloud mapping is kept every KEYFRAME_INTERVAL change
+# points, so a snapshot never applies more deltas than this.
+KEYFRAME_INTERVAL = 64
+
+
+class Timeline(object):
+    def __init__(self, quads, now, index=None, cloud_history=None):
+        """
+        Initialize a Timeline object.  This compiles the schedules and
+        history of every host into a single sorted list of lab wide
+        change points, so "who is where at time T" is a bisect plus
+        a few deltas instead of a lookup per host.
+
+        The timeline is only valid for the "now" it was built with, as
+        host history is only consulted for times before "now".  It is
+        built from the schedule index and cloud history of quads unless
+        others (e.g. including the archive) are passed.
+        """
+        if index is None:
+            index = quads.schedule_index
+        if cloud_history is None:
+            cloud_history = quads.quads.cloud_history
+        self.now = now
+        self.generation = index.generation
+        self.clouds = quads.quads.clouds.data
+        self.cloud_history = cloud_history
+
+        hosts = quads.quads.hosts.data
+        initial = {}
+        events = {}
+        for h in hosts:
+            current = hosts[h]["cloud"]
+            initial[h] = current
+            for t, cloud in index.changes(h, now):
+                events.setdefault(t, []).append((h, current, cloud))
+                current = cloud
+
+        # change point times and the (host, old cloud, new cloud) moves
+        # happening at each of them
+        self.times = sorted(events)
+        self.deltas = [events[t] for t in self.times]
+
+        # keyframes[k] is the host -> cloud mapping in effect before the
+        # deltas at times[k * KEYFRAME_INTERVAL] are applied
+        self.keyframes = []
+        state = initial
+        for i, delta in enumerate(self.deltas):
+            if i % KEYFRAME_INTERVAL == 0:
+                self.keyframes.append(dict(state))
+            for h, old, new in delta:
+                state[h] = new
+        if not self.keyframes:
+            self.keyframes.append(dict(state))
+
+    def snapshot(self, when):
+        """
+        Return the host -> cloud mapping in effect at epoch "when".
+        """
+        applied = bisect_right(self.times, when)
+        k = min(applied // KEYFRAME_INTERVAL, len(self.keyframes) - 1)
+        state = dict(self.keyframes[k])
+        for delta in self.deltas[k * KEYFRAME_INTERVAL:applied]:
+            for h, old, new in delta:
+                state[h] = new
+        return state
+
+    def clouds_at(self, when):
+        """
+        Return a cloud -> sorted list of hosts mapping for epoch "when".
+        """
+        summary = {}
+        for h, cloud in self.snapshot(when).iteritems():
+            summary.setdefault(cloud, []).append(h)
+        for cloud in summary:
+            summary[cloud].sort()
+        return summary
+
+    def next_changes(self, after, count=None):
+        """
+        Return [(epoch, [(host, old cloud, new cloud), ...]), ...] for the
+        first "count" change points after epoch "after" (all of them if
+        count is None).
+        """
+        first = bisect_right(self.times, after)
+        if count is None:
+            last = len(self.times)
+        else:
+            last = min(first + count, len(self.times))
+        return [(self.times[i], sorted(self.deltas[i])) for i in range(first, last)]
+
+    def description(self, cloud, when):
+        """
+        Return the description of cloud as it was at epoch "when".  The
+        cloud_history is only consulted for times before "now".
+        """
+        if when < self.now:
+            entry = self.cloud_history.as_of(cloud, when)
+            if entry is not None:
+                return entry["description"]
+        return self.clouds[cloud]["description"]
@@ -91,6 +91,9 @@ class HilInventoryDriver(InventoryService):
         """
         """
 
+    def data_files(self, quads):
+        return []
+
     ######################################################################################################
     # the following private methods are based on the HIL cli and are wrappers for the hil rest api calls #
     ######################################################################################################
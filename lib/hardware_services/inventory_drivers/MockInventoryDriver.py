@@ -3,15 +3,13 @@ from datetime import datetime
 import calendar
 import time
 import yaml
-import argparse
 import os
 import sys
-import requests
 import logging
-from subprocess import call
-from subprocess import check_call
 
 from hardware_services.inventory_service import InventoryService
+from QuadsData import QUADS_SCHEMA_VERSION
+from DataCache import DataCache
 
 class MockInventoryDriver(InventoryService):
 
@@ -64,13 +62,15 @@ class MockInventoryDriver(InventoryService):
                     save_ticket = quadsinstance.quads.clouds.data[cloudresource]['ticket']
                 else:
                     save_ticket = '000000'
-                quadsinstance.quads.cloud_history.data[cloudresource][int(time.time())] = {'ccusers':savecc,
+                quadsinstance.quads.cloud_history.add(cloudresource, int(time.time()), {'ccusers':savecc,
                                                        'description':save_description,
                                                        'owner':save_owner,
                                                        'qinq':save_qinq,
-                                                       'ticket':save_ticket}
+                                                       'ticket':save_ticket})
+                quadsinstance.quads.mark_dirty("cloud_history", cloudresource)
 
             quadsinstance.quads.clouds.data[cloudresource] = { "description": description, "networks": {}, "owner": cloudowner, "ccusers": ccusers, "ticket": cloudticket, "qinq": qinq }
+            quadsinstance.quads.mark_dirty("clouds", cloudresource)
             quadsinstance.quads_write_data()
 
         return
@@ -88,14 +88,23 @@ class MockInventoryDriver(InventoryService):
                 quadsinstance.logger.error("Host \"%s\" already defined. Use --force to replace" % kwargs['hostresource'])
                 exit(1)
 
+            # declared attributes are kept unless new ones are given
+            attributes = kwargs.get('hostattributes')
+            if attributes is None and kwargs['hostresource'] in quadsinstance.quads.hosts.data:
+                attributes = quadsinstance.quads.hosts.data[kwargs['hostresource']].get("attributes")
             if kwargs['hostresource'] in quadsinstance.quads.hosts.data:
-                quadsinstance.quads.hosts.data[kwargs['hostresource']] = { "cloud": kwargs['hostcloud'], "interfaces": self.quads.hosts.data[kwargs['hostresource']]["interfaces"],
+                quadsinstance.quads.hosts.data[kwargs['hostresource']] = { "cloud": kwargs['hostcloud'], "interfaces": quadsinstance.quads.hosts.data[kwargs['hostresource']]["interfaces"],
                     "schedule": quadsinstance.quads.hosts.data[kwargs['hostresource']]["schedule"] }
                 quadsinstance.quads.history.data[kwargs['hostresource']][int(time.time())] = kwargs['hostcloud']
             else:
                 quadsinstance.quads.hosts.data[kwargs['hostresource']] = { "cloud": kwargs['hostcloud'], "interfaces": {}, "schedule": {}}
                 quadsinstance.quads.history.data[kwargs['hostresource']] = {}
                 quadsinstance.quads.history.data[kwargs['hostresource']][0] = kwargs['hostcloud']
+            if attributes:
+                quadsinstance.quads.hosts.data[kwargs['hostresource']]["attributes"] = attributes
+            quadsinstance.schedule_index.invalidate(kwargs['hostresource'])
+            quadsinstance.quads.mark_dirty("hosts", kwargs['hostresource'])
+            quadsinstance.quads.mark_dirty("history", kwargs['hostresource'])
             quadsinstance.quads_write_data()
 
             return
@@ -117,18 +126,19 @@ class MockInventoryDriver(InventoryService):
                     print "Delete schedule before deleting this cloud"
                     return
         del(quadsinstance.quads.clouds.data[kwargs['rmcloud']])
+        quadsinstance.quads.mark_dirty("clouds", kwargs['rmcloud'])
         quadsinstance.quads_write_data()
 
         return
 
     def remove_host(self, quadsinstance, **kwargs):
         # remove a specific host
-        print(quadsinstance)
-        #print(kwargs)
         if kwargs['rmhost'] not in quadsinstance.quads.hosts.data:
             print kwargs['rmhost'] + " not found"
             return
         del(quadsinstance.quads.hosts.data[kwargs['rmhost']])
+        quadsinstance.schedule_index.invalidate(kwargs['rmhost'])
+        quadsinstance.quads.mark_dirty("hosts", kwargs['rmhost'])
         quadsinstance.quads_write_data()
 
         return
@@ -144,19 +154,38 @@ class MockInventoryDriver(InventoryService):
         if initialize:
             quadsinstance.quads_init_data(force)
         try:
-            stream = open(quadsinstance.config, 'r')
-            quadsinstance.data = yaml.load(stream)
-            stream.close()
+            quadsinstance.data = DataCache(quadsinstance.config).load()
         except Exception, ex:
             quadsinstance.logger.error(ex)
             exit(1)
+        if quadsinstance.journal is not None:
+            quadsinstance.journal.replay(quadsinstance.data)
 
     def write_data(self, quadsinstance, doexit):
+        # in journal mode only the changed entries are appended, until
+        # the journal is due to be compacted into the config
+        journal = quadsinstance.journal
+        if journal is not None and not quadsinstance.quads.dirty_all and not journal.needs_compaction():
+            try:
+                journal.append(quadsinstance.quads.journal_record())
+                if doexit:
+                    exit(0)
+            except Exception, ex:
+                quadsinstance.logger.error("There was a problem with your journal %s" % ex)
+                if doexit:
+                    exit(1)
+            return
         try:
-            stream = open(quadsinstance.config, 'w')
-            quadsinstance.data = {"clouds":quadsinstance.quads.clouds.data,
-             "hosts":quadsinstance.quads.hosts.data, "history":quadsinstance.quads.history.data, "cloud_history":quadsinstance.quads.cloud_history.data}
+            # write a temporary file and rename it over the config, so the
+            # config is never left half written
+            stream = open(quadsinstance.config + ".tmp", 'w')
+            quadsinstance.data = quadsinstance.quads.as_dict()
             stream.write( yaml.dump(quadsinstance.data, default_flow_style=False))
+            stream.close()
+            os.rename(quadsinstance.config + ".tmp", quadsinstance.config)
+            quadsinstance.quads.clear_dirty()
+            if journal is not None:
+                journal.clear()
             if doexit:
                 exit(0)
         except Exception, ex:
@@ -164,20 +193,23 @@ class MockInventoryDriver(InventoryService):
             if doexit:
                 exit(1)
 
+    def data_files(self, quadsinstance):
+        files = [quadsinstance.config]
+        if quadsinstance.journal is not None:
+            files.append(quadsinstance.journal.path)
+        return files
+
     def sync_state(self, quadsinstance):
         # sync state
         if quadsinstance.datearg is not None:
             quadsinstance.logger.error("--sync and --date are mutually exclusive.")
             exit(1)
+        state = quadsinstance.state_store
         for h in sorted(quadsinstance.quads.hosts.data.iterkeys()):
-            default_cloud, current_cloud, current_override = quadsinstance._quads_find_current(h, quadsinstance.datearg)
-            if not os.path.isfile(quadsinstance.statedir + "/" + h):
-                try:
-                    stream = open(quadsinstance.statedir + "/" + h, 'w')
-                    stream.write(current_cloud + '\n')
-                    stream.close()
-                except Exception, ex:
-                    quadsinstance.logger.error("There was a problem with your file %s" % ex)
+            if h not in state:
+                default_cloud, current_cloud, current_override = quadsinstance._quads_find_current(h, quadsinstance.datearg)
+                state.set(h, current_cloud)
+        state.save()
         return
 
     def init_data(self, quadsinstance, force):
@@ -187,8 +219,11 @@ class MockInventoryDriver(InventoryService):
                 exit(1)
         try:
             stream = open(quadsinstance.config, 'w')
-            data = {"clouds":{}, "hosts":{}, "history":{}, "cloud_history":{}}
+            data = {"clouds":{}, "hosts":{}, "history":{}, "cloud_history":{}, "version":QUADS_SCHEMA_VERSION}
             stream.write( yaml.dump(data, default_flow_style=False))
+            stream.close()
+            if quadsinstance.journal is not None:
+                quadsinstance.journal.clear()
             exit(0)
         except Exception, ex:
             quadsinstance.logger.error("There was a problem with your file %s" % ex)
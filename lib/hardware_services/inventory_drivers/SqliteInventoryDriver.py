@@ -0,0 +1,61 @@
+# inherits from the QuadsNative inventory driver and keeps its behavior, but
+# stores the data in a SQLite database (schedule.db next to schedule.yaml)
+# instead of the YAML file
+import os
+
+from QuadsNativeInventoryDriver import QuadsNativeInventoryDriver
+from QuadsData import QUADS_SCHEMA_VERSION
+from SqliteData import SqliteData
+
+class SqliteInventoryDriver(QuadsNativeInventoryDriver):
+
+    def _database(self, quadsinstance):
+        return os.path.splitext(quadsinstance.config)[0] + ".db"
+
+    def load_data(self, quadsinstance, force, initialize):
+        if initialize:
+            quadsinstance.quads_init_data(force)
+        database = self._database(quadsinstance)
+        if not os.path.isfile(database):
+            quadsinstance.logger.error(database + " does not exist. Create it with --init or bin/quads-sqlite.py --import")
+            exit(1)
+        try:
+            quadsinstance.sqlite = SqliteData(database)
+            quadsinstance.data = quadsinstance.sqlite.load()
+        except Exception, ex:
+            quadsinstance.logger.error(ex)
+            exit(1)
+
+    def write_data(self, quadsinstance, doexit):
+        # only the rows of the entries that changed are rewritten
+        try:
+            if quadsinstance.quads.dirty_all:
+                quadsinstance.sqlite.save(quadsinstance.quads.as_dict())
+            else:
+                quadsinstance.sqlite.save_entries(quadsinstance.quads.as_dict(), quadsinstance.quads.dirty)
+            quadsinstance.quads.clear_dirty()
+            if doexit:
+                exit(0)
+        except Exception, ex:
+            quadsinstance.logger.error("There was a problem with your database %s" % ex)
+            if doexit:
+                exit(1)
+
+    def data_files(self, quadsinstance):
+        # changes are written to the write-ahead log first
+        database = self._database(quadsinstance)
+        return [database, database + "-wal"]
+
+    def init_data(self, quadsinstance, force):
+        database = self._database(quadsinstance)
+        if not force:
+            if os.path.isfile(database):
+                quadsinstance.logger.warn("Warning: " + database + " exists. Use --force to initialize.")
+                exit(1)
+        try:
+            data = {"clouds":{}, "hosts":{}, "history":{}, "cloud_history":{}, "version":QUADS_SCHEMA_VERSION}
+            SqliteData(database).save(data)
+            exit(0)
+        except Exception, ex:
+            quadsinstance.logger.error("There was a problem with your database %s" % ex)
+            exit(1)
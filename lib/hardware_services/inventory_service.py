@@ -89,6 +89,12 @@ class InventoryService(object):
         """ TODO add documentation
         """
 
+    @abstractmethod
+    def data_files(self, quads):
+        """ return the files the data is kept in, so changes made by
+            other processes can be noticed (see QuadsDaemon)
+        """
+
 
 _inventory_service = None
 
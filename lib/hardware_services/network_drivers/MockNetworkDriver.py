@@ -3,13 +3,9 @@ from datetime import datetime
 import calendar
 import time
 import yaml
-import argparse
 import os
 import sys
-import requests
 import logging
-from subprocess import call
-from subprocess import check_call
 
 #from bin 
 from hardware_services.network_service import NetworkService
@@ -31,21 +27,15 @@ class MockNetworkDriver(NetworkService):
 
     def move_hosts(self, quadsinstance, **kwargs):
     	#move a host
+        state = kwargs['statestore']
         for h in sorted(quadsinstance.quads.hosts.data.iterkeys()):
             default_cloud, current_cloud, current_override = quadsinstance._quads_find_current(h, kwargs['datearg'])
 	    #print current_cloud
-            if not os.path.isfile(kwargs['statedir'] + "/" + h):
-                try:
-                    stream = open(kwargs['statedir'] + "/" + h, 'w')
-                    stream.write(current_cloud + '\n')
-                    stream.close()
-                except Exception, ex:
-                    quadsinstance.logger.error("There was a problem with your file %s" % ex)
-            else:
-                stream = open(kwargs['statedir'] + "/" + h, 'r')
-                current_state = stream.readline().rstrip()
-                stream.close()
-                if current_state != current_cloud:
-                    quadsinstance.logger.info("Moving " + h + " from " + current_state + " to " + current_cloud)
+            current_state = state.cloud(h)
+            if current_state is None:
+                state.set(h, current_cloud)
+            elif current_state != current_cloud:
+                quadsinstance.logger.info("Moving " + h + " from " + current_state + " to " + current_cloud)
+        state.save()
 	print "Moving "+ h+ " from " + default_cloud + " to " + current_cloud
         return
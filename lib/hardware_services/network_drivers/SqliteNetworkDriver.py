@@ -0,0 +1,6 @@
+# the SQLite inventory driver only changes where the data is stored, hosts are
+# moved the same way as with the QuadsNative driver
+from QuadsNativeNetworkDriver import QuadsNativeNetworkDriver
+
+class SqliteNetworkDriver(QuadsNativeNetworkDriver):
+    pass
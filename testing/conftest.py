@@ -0,0 +1,39 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+import os
+import sys
+import subprocess as sp
+import yaml
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lib"))
+from ScheduleIndex import quads_schedule_entry
+
+# run bin/quads.py on a small lab in tmpdir (schedule.yaml, state and
+# quads.log), returns (exit code, output).  stdin="..." is fed to it.
+@pytest.fixture(scope='function')
+def quads_cli(tmpdir):
+    hosts = {"host01": {"cloud": "cloud02", "interfaces": {}, "schedule": {}},
+             "host02": {"cloud": "cloud01", "interfaces": {}, "schedule": {}}}
+    # host01 is only lent to the pool, a new schedule would conflict
+    hosts["host01"]["schedule"][0] = quads_schedule_entry("cloud01", "2030-01-01 08:00", "2030-02-01 08:00")
+    config = tmpdir.join("schedule.yaml")
+    clouds = {}
+    for c, description, owner in [("cloud01", "spare pool", "nobody"), ("cloud02", "ospd", "bob"),
+                                  ("cloud03", "ocp", "alice")]:
+        clouds[c] = {"description": description, "owner": owner, "ticket": "00000", "qinq": "0",
+                     "ccusers": [], "networks": {}}
+    config.write(yaml.dump({"clouds": clouds, "hosts": hosts,
+                            "history": {}, "cloud_history": {}}))
+    tmpdir.mkdir("state")
+    tmpdir.join("quads.log").write("")
+    quads = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bin", "quads.py")
+
+    def run(*args, **options):
+        process = sp.Popen([sys.executable, quads, "-c", str(config), "--statedir", str(tmpdir.join("state")),
+                            "--log-path", str(tmpdir.join("quads.log")), "--no-daemon"] + list(args),
+                           stdin=sp.PIPE, stdout=sp.PIPE, stderr=sp.STDOUT)
+        output = process.communicate(options.get("stdin", ""))[0]
+        return process.returncode, output
+    return run
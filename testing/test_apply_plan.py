@@ -0,0 +1,74 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+import os
+import sys
+import yaml
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lib"))
+from Quads import Quads
+from QuadsData import QUADS_SCHEMA_VERSION
+from ScheduleIndex import quads_schedule_entry
+
+@pytest.fixture(scope='function')
+def quads(tmpdir):
+    clouds = {}
+    for c in ["cloud01", "cloud02", "cloud03"]:
+        clouds[c] = {"description": c, "owner": "nobody", "ticket": "00000", "qinq": "0", "ccusers": [], "networks": {}}
+    hosts = {"host01": {"cloud": "cloud02", "interfaces": {}, "schedule": {
+                 0: quads_schedule_entry("cloud01", "2030-01-01 08:00", "2030-02-01 08:00")}},
+             "host02": {"cloud": "cloud01", "interfaces": {}, "schedule": {}}}
+    config = tmpdir.join("schedule.yaml")
+    config.write(yaml.dump({"clouds": clouds, "hosts": hosts, "history": {}, "cloud_history": {},
+                            "version": QUADS_SCHEMA_VERSION}))
+    # the first run initializes the history and writes it out
+    return Quads(str(config), str(tmpdir.mkdir("state")), "/bin/echo", None, None, False, False, "QuadsNative", "",
+                 None, False)
+
+def write_plan(tmpdir, plan):
+    tmpdir.join("plan.yaml").write(yaml.dump(plan))
+    return str(tmpdir.join("plan.yaml"))
+
+PLAN = [{"define-host": "host03", "default-cloud": "cloud01"},
+        {"add-schedule": "host02", "schedule-start": "2030-03-01 08:00", "schedule-end": "2030-03-10 08:00",
+         "schedule-cloud": "cloud03"},
+        {"add-schedule": "host03", "schedule-start": "2030-03-01 08:00", "schedule-end": "2030-03-10 08:00",
+         "schedule-cloud": "cloud03"}]
+
+class Test_ApplyPlan:
+    def test_apply(self, quads, tmpdir):
+        with pytest.raises(SystemExit) as ex:
+            quads.quads_apply_plan(write_plan(tmpdir, PLAN), False)
+        assert ex.value.code == 0
+        data = yaml.safe_load(tmpdir.join("schedule.yaml").read())
+        assert sorted(data["hosts"]) == ["host01", "host02", "host03"]
+        for h in ["host02", "host03"]:
+            assert data["hosts"][h]["schedule"][0]["cloud"] == "cloud03"
+
+    def test_rollback(self, quads, tmpdir, capsys):
+        before = tmpdir.join("schedule.yaml").read()
+        # host01 is in cloud01 for all of January
+        plan = PLAN + [{"add-schedule": "host01", "schedule-start": "2030-01-10 08:00",
+                        "schedule-end": "2030-01-20 08:00", "schedule-cloud": "cloud03"}]
+        with pytest.raises(SystemExit) as ex:
+            quads.quads_apply_plan(write_plan(tmpdir, plan), False)
+        assert ex.value.code == 1
+        assert "Error in step 4 of " in capsys.readouterr()[0]
+        # the first three steps were undone, in the data and its index
+        assert sorted(quads.quads.hosts.data) == ["host01", "host02"]
+        assert quads.quads.hosts.data["host02"]["schedule"] == {}
+        assert "host03" not in quads.quads.history.data
+        assert quads._quads_find_current("host02", "2030-03-05 08:00")[1] == "cloud01"
+        assert tmpdir.join("schedule.yaml").read() == before
+
+    def test_dry_run(self, quads, tmpdir, capsys):
+        before = tmpdir.join("schedule.yaml").read()
+        quads.quads_apply_plan(write_plan(tmpdir, PLAN), True)
+        diff = capsys.readouterr()[0]
+        assert diff.startswith("--- " + str(tmpdir.join("schedule.yaml")))
+        assert "+  host03:\n" in diff
+        assert "+        cloud: cloud03\n" in diff
+        assert tmpdir.join("schedule.yaml").read() == before
+        assert sorted(quads.quads.hosts.data) == ["host01", "host02"]
+        assert quads._quads_find_current("host02", "2030-03-05 08:00")[1] == "cloud01"
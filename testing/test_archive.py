@@ -0,0 +1,77 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+import os
+import sys
+import yaml
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lib"))
+from Archive import Archive
+from Quads import Quads
+from QuadsData import QuadsData
+from ScheduleIndex import ScheduleIndex, quads_date_to_epoch, quads_schedule_entry
+
+@pytest.fixture(scope='function')
+def quads():
+    return QuadsData({"clouds": {"cloud01": {}, "cloud02": {}},
+                      "hosts": {"host01": {"cloud": "cloud01", "interfaces": {}, "schedule": {
+                          0: quads_schedule_entry("cloud02", "2017-01-01 00:00", "2017-01-08 00:00"),
+                          1: quads_schedule_entry("cloud02", "2017-02-01 00:00", "2017-02-08 00:00")}}},
+                      "history": {"host01": {0: "cloud01", 1483228800: "cloud02", 1483833600: "cloud01"}},
+                      "cloud_history": {"cloud01": {0: {}}, "cloud02": {0: {}}}})
+
+class Test_Archive:
+    def test_archive(self, quads, tmpdir):
+        archive = Archive(str(tmpdir.join("schedule.yaml")))
+        horizon = quads_date_to_epoch("2017-01-15 00:00")
+        assert archive.archive(quads, horizon) == (1, 2)
+        assert quads.hosts.data["host01"]["schedule"].keys() == [1]
+        assert quads.history.data["host01"] == {1483833600: "cloud01"}
+        # archived schedule ids are not handed out again
+        quads.hosts.data["host01"]["schedule"].pop(1)
+        assert quads.next_schedule_id("host01") == 1
+
+        archive.write()
+        hosts, history, cloud_history = Archive(str(tmpdir.join("schedule.yaml"))).merged(quads)
+        assert sorted(hosts["host01"]["schedule"].keys()) == [0]
+        assert history["host01"] == {0: "cloud01", 1483228800: "cloud02", 1483833600: "cloud01"}
+        index = ScheduleIndex(hosts, history)
+        assert index.find("host01", quads_date_to_epoch("2017-01-02 00:00"), horizon)[1] == "cloud02"
+
+    def test_mod_schedule_before_horizon(self, tmpdir):
+        hosts = {"host01": {"cloud": "cloud01", "interfaces": {}, "schedule": {
+            0: quads_schedule_entry("cloud02", "2017-01-01 00:00", "2017-03-01 00:00")}}}
+        config = tmpdir.join("schedule.yaml")
+        config.write(yaml.dump({"clouds": {"cloud01": {}, "cloud02": {}}, "hosts": hosts, "history": {},
+                                "cloud_history": {}}))
+        quads = Quads(str(config), str(tmpdir), "/bin/echo", None, None, False, False, "QuadsNative", "", None, True)
+        quads.quads.archive_horizon = quads_date_to_epoch("2017-01-15 00:00")
+        # extending a schedule that began before the horizon is fine
+        quads.quads_mod_host_schedule(0, None, "2017-04-01 00:00", None, "host01")
+        assert quads.quads.hosts.data["host01"]["schedule"][0]["end"] == "2017-04-01 00:00"
+        # moving its start is not, either way
+        for start in ["2016-12-01 00:00", "2017-02-01 00:00"]:
+            with pytest.raises(SystemExit):
+                quads.quads_mod_host_schedule(0, start, None, None, "host01")
+
+    def test_extend_cloud_before_horizon(self, tmpdir):
+        hosts = {"host01": {"cloud": "cloud01", "interfaces": {}, "schedule": {
+                     0: quads_schedule_entry("cloud02", "2017-01-01 00:00", "2017-01-08 00:00")}},
+                 "host02": {"cloud": "cloud01", "interfaces": {}, "schedule": {
+                     0: quads_schedule_entry("cloud02", "2017-01-01 00:00", "2017-03-01 00:00")}}}
+        config = tmpdir.join("schedule.yaml")
+        config.write(yaml.dump({"clouds": {"cloud01": {}, "cloud02": {}}, "hosts": hosts, "history": {},
+                                "cloud_history": {}}))
+        quads = Quads(str(config), str(tmpdir), "/bin/echo", None, None, False, False, "QuadsNative", "", None, True)
+        quads.schedule_index
+        horizon = quads_date_to_epoch("2017-01-15 00:00")
+        archive = Archive(str(config))
+        archive.archive(quads.quads, horizon)
+        archive.write()
+        quads.quads.archive_horizon = horizon
+        quads.schedule_index.invalidate()
+        # host01 was in cloud02 on that date, but its schedule is archived
+        quads.quads_extend_cloud_schedule("cloud02", "2017-04-01 00:00", "2017-01-02 00:00")
+        assert quads.quads.hosts.data["host01"]["schedule"] == {}
+        assert quads.quads.hosts.data["host02"]["schedule"][0]["end"] == "2017-04-01 00:00"
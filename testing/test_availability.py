@@ -0,0 +1,62 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+import os
+import sys
+import yaml
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lib"))
+from Quads import Quads
+from Availability import Availability
+from ScheduleIndex import quads_date_to_epoch, quads_schedule_entry
+
+@pytest.fixture(scope='function')
+def quads(tmpdir):
+    hosts = {}
+    for h in ["host01", "host02", "host03"]:
+        hosts[h] = {"cloud": "cloud01", "interfaces": {}, "schedule": {}}
+    hosts["host04"] = {"cloud": "cloud02", "interfaces": {}, "schedule": {}}
+    hosts["host01"]["schedule"][0] = quads_schedule_entry("cloud02", "2030-01-01 08:00", "2030-01-05 08:00")
+    hosts["host02"]["schedule"][0] = quads_schedule_entry("cloud02", "2030-01-03 08:00", "2030-01-04 08:00")
+    hosts["host04"]["schedule"][0] = quads_schedule_entry("cloud01", "2030-01-02 08:00", "2030-01-20 08:00")
+    config = tmpdir.join("schedule.yaml")
+    config.write(yaml.dump({"clouds": {"cloud01": {}, "cloud02": {}}, "hosts": hosts, "history": {},
+                            "cloud_history": {}}))
+    return Quads(str(config), str(tmpdir), "/bin/echo", None, None, False, False, "QuadsNative", "", None, True)
+
+class Test_Availability:
+    def test_free_intervals(self, quads):
+        availability = Availability(quads)
+        start = quads_date_to_epoch("2030-01-01 00:00")
+        end = quads_date_to_epoch("2030-02-01 00:00")
+        assert availability.free_intervals("host01", start, end) == [(start, quads_date_to_epoch("2030-01-01 08:00")),
+                                                                      (quads_date_to_epoch("2030-01-05 08:00"), end)]
+        # a schedule into the pool still conflicts with a new schedule
+        assert availability.free_intervals("host04", start, end) == []
+
+    def test_find(self, quads):
+        first = datetime(2030, 1, 1, 8, 0)
+        start, end, hosts = Availability(quads).find(3, 2, first)
+        assert start == quads_date_to_epoch("2030-01-05 08:00")
+        assert end == quads_date_to_epoch("2030-01-07 08:00")
+        assert hosts == ["host01", "host02", "host03"]
+        start, end, hosts = Availability(quads, limit="host0[12]").find(2, 2, first)
+        assert start == quads_date_to_epoch("2030-01-05 08:00")
+        assert Availability(quads).find(4, 30, first, 10) is None
+
+    def test_find_filter(self, quads):
+        first = datetime(2030, 1, 1, 8, 0)
+        quads.quads.hosts.data["host03"]["attributes"] = {"model": "r630"}
+        start, end, hosts = Availability(quads, hostfilter="model=r630").find(1, 2, first)
+        assert start == quads_date_to_epoch("2030-01-01 08:00")
+        assert hosts == ["host03"]
+
+    def test_daily(self, quads):
+        starts, counts = Availability(quads).daily(5, datetime(2030, 1, 1, 8, 0))
+        assert starts[0] == quads_date_to_epoch("2030-01-01 08:00")
+        assert counts == {"total": [2, 2, 1, 2, 3]}
+        quads.quads.hosts.data["host03"]["attributes"] = {"model": "r630"}
+        starts, counts = Availability(quads).daily(2, datetime(2030, 1, 1, 8, 0), "model")
+        assert counts == {"r630": [1, 1], "unknown": [1, 1]}
@@ -0,0 +1,72 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+import os
+import sys
+import yaml
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lib"))
+from Quads import Quads
+from Backfill import Backfill
+from ScheduleIndex import quads_date_to_epoch, quads_schedule_entry
+
+@pytest.fixture(scope='function')
+def quads(tmpdir):
+    hosts = {}
+    for h in ["host01", "host02", "host03"]:
+        hosts[h] = {"cloud": "cloud01", "interfaces": {}, "schedule": {}}
+    hosts["host01"]["schedule"][0] = quads_schedule_entry("cloud02", "2030-01-03 08:00", "2030-01-05 08:00")
+    hosts["host03"]["attributes"] = {"model": "r630"}
+    config = tmpdir.join("schedule.yaml")
+    config.write(yaml.dump({"clouds": {"cloud01": {}, "cloud02": {}}, "hosts": hosts, "history": {},
+                            "cloud_history": {}}))
+    return Quads(str(config), str(tmpdir), "/bin/echo", None, None, False, False, "QuadsNative", "", None, True)
+
+class Test_Backfill:
+    def test_place(self, quads):
+        requests = [{"id": 1, "count": 3, "days": 3, "start": None, "cloud": "cloud02"},
+                    {"id": 2, "count": 1, "days": 2, "start": None, "cloud": "cloud02"},
+                    {"id": 3, "count": 1, "days": 1, "start": "2030-01-02 08:00", "cloud": "cloud02",
+                     "filter": "model=r630"},
+                    {"id": 4, "count": 4, "days": 1, "start": None, "cloud": "cloud02"}]
+        placements = Backfill(quads, datetime(2030, 1, 1, 8, 0), 30).place(requests)
+        # the first request waits for host01, the others fill the gap before it
+        assert placements[0][1:] == (quads_date_to_epoch("2030-01-05 08:00"), quads_date_to_epoch("2030-01-08 08:00"),
+                                     ["host01", "host02", "host03"])
+        assert placements[1][1:] == (quads_date_to_epoch("2030-01-01 08:00"), quads_date_to_epoch("2030-01-03 08:00"),
+                                     ["host01"])
+        assert placements[2][1:] == (quads_date_to_epoch("2030-01-02 08:00"), quads_date_to_epoch("2030-01-03 08:00"),
+                                     ["host03"])
+        assert placements[3][1:] == (None, None, None)
+
+class Test_PlaceQueue:
+    def test_queue_request_needs_count(self, quads_cli):
+        code, output = quads_cli("--queue-request", "--days", "5", "--schedule-cloud", "cloud03")
+        assert code == 1
+        assert "--queue-request needs --count and --days" in output
+        assert quads_cli("--ls-queue")[1] == ""
+
+    def test_pool_schedule_not_placed(self, quads_cli):
+        quads_cli("--queue-request", "--count", "2", "--days", "5", "--schedule-start", "2030-01-01 08:00",
+                  "--schedule-cloud", "cloud03")
+        code, output = quads_cli("--place-queue", "--horizon", "10", "-d", "2030-01-01 08:00")
+        assert code == 0
+        assert "0 of 1 requests placed." in output
+        assert quads_cli("--ls-queue")[1].startswith("1|")
+
+    def test_conflict_reported(self, quads_cli):
+        quads_cli("--queue-request", "--count", "1", "--days", "5", "--schedule-start", "2030-01-01 08:00",
+                  "--schedule-cloud", "cloud03")
+        quads_cli("--queue-request", "--count", "1", "--days", "5", "--schedule-start", "2030-01-01 08:00",
+                  "--schedule-cloud", "cloud02")
+        assert quads_cli("--rm-cloud", "cloud03")[0] == 0
+        code, output = quads_cli("--place-queue", "-d", "2030-01-01 08:00")
+        assert code == 1
+        assert "cloud \"cloud03\" is not defined." in output
+        assert "1 of 2 requests placed." in output
+        # the placed request left the queue and its schedule was written
+        assert quads_cli("--ls-queue")[1].startswith("1|")
+        assert "start=2030-01-06 08:00,end=2030-01-11 08:00,cloud=cloud02" in \
+            quads_cli("--ls-schedule", "--host", "host02")[1]
@@ -0,0 +1,31 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lib"))
+from CloudHistory import CloudHistory
+
+@pytest.fixture(scope='function')
+def history():
+    return CloudHistory({"cloud_history": {"cloud02": {100: {"description": "first"},
+                                                       200: {"description": "second"}}}})
+
+class Test_CloudHistory:
+    def test_as_of(self, history):
+        assert history.as_of("cloud02", 99) is None
+        assert history.as_of("cloud02", 100)["description"] == "first"
+        assert history.as_of("cloud02", 150)["description"] == "first"
+        assert history.as_of("cloud02", 200)["description"] == "second"
+        assert history.as_of("cloud02", 10 ** 10)["description"] == "second"
+        assert history.as_of("cloud03", 150) is None
+
+    def test_add(self, history):
+        assert history.as_of("cloud02", 175)["description"] == "first"
+        history.add("cloud02", 150, {"description": "between"})
+        history.add("cloud03", 0, {"description": "new"})
+        assert history.as_of("cloud02", 149)["description"] == "first"
+        assert history.as_of("cloud02", 175)["description"] == "between"
+        assert history.as_of("cloud03", 0)["description"] == "new"
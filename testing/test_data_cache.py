@@ -0,0 +1,55 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+import os
+import sys
+import yaml
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lib"))
+from DataCache import DataCache
+from ScheduleIndex import quads_date_to_epoch, quads_schedule_entry, quads_schedule_epochs
+
+class Test_DataCache:
+    def test_load(self, tmpdir):
+        config = tmpdir.join("schedule.yaml")
+        config.write("hosts:\n  host01:\n    cloud: cloud01\n")
+        cache = DataCache(str(config))
+        assert cache.load() == {"hosts": {"host01": {"cloud": "cloud01"}}}
+        assert tmpdir.join("schedule.yaml.cache").check()
+        # sections come out of the cache one at a time
+        cached = cache.load()
+        assert "hosts" in cached
+        assert "clouds" not in cached
+        assert cached["hosts"] == {"host01": {"cloud": "cloud01"}}
+        assert cached.get("clouds", {}) == {}
+
+    def test_stale(self, tmpdir):
+        config = tmpdir.join("schedule.yaml")
+        config.write("hosts:\n  host01:\n    cloud: cloud01\n")
+        cache = DataCache(str(config))
+        cache.load()
+        # same size and mtime, different content
+        st = os.stat(str(config))
+        config.write("hosts:\n  host01:\n    cloud: cloud02\n")
+        os.utime(str(config), (st.st_atime, st.st_mtime))
+        assert cache.load()["hosts"] == {"host01": {"cloud": "cloud02"}}
+
+    def test_corrupt_cache(self, tmpdir):
+        config = tmpdir.join("schedule.yaml")
+        config.write("hosts: {}\n")
+        tmpdir.join("schedule.yaml.cache").write("garbage")
+        assert DataCache(str(config)).load()["hosts"] == {}
+
+    def test_hand_edited_schedule(self, tmpdir):
+        config = tmpdir.join("schedule.yaml")
+        entry = quads_schedule_entry("cloud02", "2030-01-01 08:00", "2030-01-05 08:00")
+        # the end was moved by hand, the cached epoch was left alone
+        entry["end"] = "2030-02-01 08:00"
+        config.write(yaml.dump({"hosts": {"host01": {"cloud": "cloud01", "schedule": {0: entry}}}}))
+        schedule = DataCache(str(config)).load()["hosts"]["host01"]["schedule"][0]
+        assert quads_schedule_epochs(schedule) == (quads_date_to_epoch("2030-01-01 08:00"),
+                                                   quads_date_to_epoch("2030-02-01 08:00"))
+        # and the cache holds the recomputed epochs
+        schedule = DataCache(str(config)).load()["hosts"]["host01"]["schedule"][0]
+        assert schedule["end_epoch"] == quads_date_to_epoch("2030-02-01 08:00")
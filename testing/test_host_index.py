@@ -0,0 +1,39 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lib"))
+from HostIndex import HostIndex, quads_host_attributes, quads_parse_filter
+
+@pytest.fixture(scope='function')
+def index():
+    hosts = {}
+    for h in ["c01-h21-r630.example.com", "c02-h23-r630.example.com", "c05-h01-r620.example.com"]:
+        hosts[h] = {"cloud": "cloud01", "interfaces": {}, "schedule": {}}
+    hosts["c01-h21-r630.example.com"]["interfaces"] = {"em1": {}, "em2": {}}
+    hosts["gpu01.example.com"] = {"cloud": "cloud01", "interfaces": {}, "schedule": {},
+                                  "attributes": {"model": "r730", "rack": "c03"}}
+    return HostIndex(hosts)
+
+class Test_HostIndex:
+    def test_attributes(self):
+        assert quads_host_attributes("c01-h21-r630.example.com", {"interfaces": {"em1": {}}}) == \
+            {"rack": "c01", "u": "21", "model": "r630", "nics": "1"}
+        assert quads_host_attributes("gpu01", {"attributes": {"model": "r730"}}) == {"model": "r730"}
+
+    def test_parse_filter(self):
+        assert quads_parse_filter("model=r630,rack=c0[1,2]") == [("model", "r630"), ("rack", "c0[1,2]")]
+        with pytest.raises(ValueError):
+            quads_parse_filter("r630")
+
+    def test_match(self, index):
+        assert index.match("model=r630") == set(["c01-h21-r630.example.com", "c02-h23-r630.example.com"])
+        assert index.match("model=r6*,rack=c0[1-4]") == set(["c01-h21-r630.example.com", "c02-h23-r630.example.com"])
+        assert index.match("rack=c03") == set(["gpu01.example.com"])
+        assert index.match("model=r620,model=r730") == set(["c05-h01-r620.example.com", "gpu01.example.com"])
+        assert index.match("nics=2,u=2?") == set(["c01-h21-r630.example.com"])
+        with pytest.raises(ValueError):
+            index.match("color=red")
@@ -0,0 +1,36 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lib"))
+from Journal import Journal
+
+@pytest.fixture(scope='function')
+def journal(tmpdir):
+    config = str(tmpdir.join("schedule.yaml"))
+    open(config, 'w').close()
+    return Journal(config, max_size=4096, max_age=3600)
+
+class Test_Journal:
+    def test_replay(self, journal):
+        journal.append({"clouds": {"cloud02": {"description": "new"}}, "hosts": {"host01": None}})
+        journal.append({"clouds": {"cloud02": {"description": "newer"}}, "history": {"host02": {0: "cloud02"}}})
+        data = {"clouds": {"cloud01": {"description": "spare"}}, "hosts": {"host01": {"cloud": "cloud01"}}}
+        journal.replay(data)
+        assert data == {"clouds": {"cloud01": {"description": "spare"}, "cloud02": {"description": "newer"}},
+                        "hosts": {}, "history": {"host02": {0: "cloud02"}}}
+
+    def test_compaction(self, journal):
+        assert not journal.needs_compaction()
+        journal.append({"hosts": {"host01": {"cloud": "cloud01"}}})
+        assert not journal.needs_compaction()
+        journal.append({"hosts": {"host01": {"cloud": "x" * 4096}}})
+        assert journal.needs_compaction()
+        journal.clear()
+        assert not journal.needs_compaction()
+        data = {"hosts": {}}
+        journal.replay(data)
+        assert data == {"hosts": {}}
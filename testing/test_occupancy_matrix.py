@@ -0,0 +1,63 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+import os
+import sys
+import time
+import yaml
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lib"))
+import OccupancyMatrix as occupancy
+from Quads import Quads
+from ScheduleIndex import quads_schedule_entry
+
+numpy = pytest.importorskip("numpy")
+
+@pytest.fixture(scope='function')
+def quads(tmpdir):
+    hosts = {"host01": {"cloud": "cloud01", "interfaces": {}, "schedule": {}},
+             "host02": {"cloud": "cloud01", "interfaces": {}, "schedule": {}},
+             "host03": {"cloud": "cloud02", "interfaces": {}, "schedule": {}}}
+    hosts["host01"]["schedule"][0] = quads_schedule_entry("cloud02", "2030-01-02 08:00", "2030-01-04 08:00")
+    hosts["host01"]["schedule"][1] = quads_schedule_entry("cloud03", "2030-01-05 08:00", "2030-01-06 20:00")
+    hosts["host02"]["schedule"][0] = quads_schedule_entry("cloud03", "2030-01-03 14:00", "2030-01-08 08:00")
+    hosts["host03"]["schedule"][0] = quads_schedule_entry("cloud01", "2029-12-20 08:00", "2030-01-05 08:00")
+    config = tmpdir.join("schedule.yaml")
+    config.write(yaml.dump({"clouds": {"cloud01": {}, "cloud02": {}, "cloud03": {}}, "hosts": hosts,
+                            "history": {}, "cloud_history": {}}))
+    return Quads(str(config), str(tmpdir), "/bin/echo", None, None, False, False, "QuadsNative", "", None, True)
+
+# the cloud of every host at every slot, looked up one at a time
+def brute_force(quads, samples):
+    now = time.time()
+    return dict((h, [quads.schedule_index.find(h, int(time.mktime(s.timetuple())), now)[1] for s in samples])
+                for h in quads.quads.hosts.data)
+
+class Test_OccupancyMatrix:
+    def test_matrix(self, quads):
+        start = datetime(2030, 1, 1, 0, 0)
+        matrix = occupancy.OccupancyMatrix(quads, start, start + timedelta(days=10), timedelta(hours=1))
+        expected = brute_force(quads, matrix.samples)
+        for row, h in enumerate(matrix.hosts):
+            assert [matrix.cloud_name(c) for c in matrix.matrix[row]] == expected[h]
+
+        counts = matrix.cloud_counts()
+        for slot in range(len(matrix.samples)):
+            for c in matrix.clouds:
+                assert counts[matrix.cloud_id(c)][slot] == sum(1 for h in expected if expected[h][slot] == c)
+            assert sorted(matrix.free_hosts(slot)) == sorted(h for h in expected if expected[h][slot] == "cloud01")
+            assert list(matrix.free_mask()[:, slot]) == [expected[h][slot] == "cloud01" for h in matrix.hosts]
+
+        for h in matrix.hosts:
+            changes = [(matrix.samples[slot], expected[h][slot]) for slot in range(1, len(matrix.samples))
+                       if expected[h][slot] != expected[h][slot - 1]]
+            assert matrix.host_changes(h) == changes
+        assert matrix.host_changes("host01")[0] == (datetime(2030, 1, 2, 8, 0), "cloud02")
+
+    def test_without_numpy(self, quads, monkeypatch):
+        monkeypatch.setattr(occupancy, "numpy", None)
+        start = datetime(2030, 1, 1, 0, 0)
+        with pytest.raises(ImportError):
+            occupancy.OccupancyMatrix(quads, start, start + timedelta(days=1))
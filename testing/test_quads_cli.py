@@ -0,0 +1,156 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+import json
+import yaml
+
+# the quads_cli fixture is in conftest.py
+
+class Test_HostFile:
+    def test_add(self, quads_cli, tmpdir):
+        tmpdir.join("hosts").write("host01\nhost02\n")
+        code, output = quads_cli("--add-schedule", "--host-file", str(tmpdir.join("hosts")), "--schedule-start",
+                                 "2030-03-01 08:00", "--schedule-end", "2030-03-10 08:00", "--schedule-cloud", "cloud03")
+        assert code == 0
+        for h in ["host01", "host02"]:
+            assert "start=2030-03-01 08:00,end=2030-03-10 08:00,cloud=cloud03" in \
+                quads_cli("--ls-schedule", "--host", h)[1]
+
+    def test_conflict_rejects_all(self, quads_cli, tmpdir):
+        # the first run upgrades the data and sets up the history
+        quads_cli("--maintain")
+        config = tmpdir.join("schedule.yaml")
+        before = config.read()
+        # host01 is lent to cloud01 for all of January
+        tmpdir.join("hosts").write("host02\nhost01\n")
+        code, output = quads_cli("--add-schedule", "--host-file", str(tmpdir.join("hosts")), "--schedule-start",
+                                 "2030-01-10 08:00", "--schedule-end", "2030-01-20 08:00", "--schedule-cloud", "cloud03")
+        assert code == 1
+        assert "New schedule for host01 conflicts with existing schedule." in output
+        assert "No schedules were added." in output
+        assert config.read() == before
+
+class Test_ExtendCloud:
+    def test_extend(self, quads_cli):
+        quads_cli("--add-schedule", "--host", "host02", "--schedule-start", "2030-03-01 08:00",
+                  "--schedule-end", "2030-03-10 08:00", "--schedule-cloud", "cloud03")
+        code, output = quads_cli("--extend-cloud", "cloud03", "--schedule-end", "2030-03-20 08:00",
+                                 "-d", "2030-03-02 08:00")
+        assert code == 0
+        assert "start=2030-03-01 08:00,end=2030-03-20 08:00,cloud=cloud03" in \
+            quads_cli("--ls-schedule", "--host", "host02")[1]
+
+    def test_conflict_rejects_all(self, quads_cli, tmpdir):
+        for h in ["host01", "host02"]:
+            quads_cli("--add-schedule", "--host", h, "--schedule-start", "2030-03-01 08:00",
+                      "--schedule-end", "2030-03-10 08:00", "--schedule-cloud", "cloud03")
+        quads_cli("--add-schedule", "--host", "host02", "--schedule-start", "2030-03-15 08:00",
+                  "--schedule-end", "2030-03-25 08:00", "--schedule-cloud", "cloud02")
+        config = tmpdir.join("schedule.yaml")
+        before = config.read()
+        code, output = quads_cli("--extend-cloud", "cloud03", "--schedule-end", "2030-03-20 08:00",
+                                 "-d", "2030-03-02 08:00")
+        assert code == 1
+        assert "Extended schedule for host02 conflicts with existing schedule." in output
+        assert "No schedules were extended." in output
+        assert config.read() == before
+        assert "end=2030-03-10 08:00" in quads_cli("--ls-schedule", "--host", "host01")[1]
+
+class Test_Batch:
+    def test_answers(self, quads_cli):
+        quads_cli("--maintain")
+        queries = "host01@2030-01-02 08:00\n" \
+                  "# comments and empty lines are skipped\n" \
+                  "\n" \
+                  "--host 'host01' -d '2030-03-01 08:00'\n" \
+                  "cloud-only cloud01@2030-01-02 08:00\n" \
+                  "summary@2030-01-02 08:00\n" \
+                  "owner cloud02\n"
+        code, output = quads_cli("--batch", stdin=queries)
+        assert code == 0
+        assert output == "cloud01\n\n" \
+                         "cloud02\n\n" \
+                         "host01\nhost02\n\n" \
+                         "cloud01 : 2 (spare pool)\n\n" \
+                         "bob\n\n"
+
+    def test_errors(self, quads_cli):
+        quads_cli("--maintain")
+        queries = "owner cloud02@2030-01-02 08:00\n" \
+                  "--rm-host host02\n" \
+                  "--host 'host01\n" \
+                  "two words\n" \
+                  "host02\n"
+        code, output = quads_cli("--batch", stdin=queries)
+        assert code == 1
+        assert output == "quads: @DATE is not supported for owner queries: owner cloud02@2030-01-02 08:00\n\n" \
+                         "quads: Only queries are allowed with --batch: --rm-host host02\n\n" \
+                         "quads: Invalid query (No closing quotation): --host 'host01\n\n" \
+                         "quads: Invalid query: two words\n\n" \
+                         "cloud01\n\n"
+        assert quads_cli("--ls-hosts")[1] == "host01\nhost02\n"
+
+    def test_date_rejected(self, quads_cli):
+        quads_cli("--maintain")
+        for query in ["owner", "ticket", "qinq", "cc-users"]:
+            code, output = quads_cli("--batch", stdin=query + " cloud02@2030-01-02 08:00\n")
+            assert code == 1
+            assert output == "quads: @DATE is not supported for " + query + " queries: " + \
+                query + " cloud02@2030-01-02 08:00\n\n"
+
+class Test_Maintain:
+    def test_query_read_only(self, quads_cli, tmpdir):
+        config = tmpdir.join("schedule.yaml")
+        before = config.read()
+        # the data needs upgrading and its history initialized
+        assert quads_cli("--host", "host01", "-d", "2030-01-02 08:00")[1].endswith("cloud01\n")
+        assert config.read() == before
+        assert tmpdir.join("state").listdir() == []
+        assert tmpdir.join("schedule.yaml.dirty").check()
+
+    def test_maintain(self, quads_cli, tmpdir):
+        config = tmpdir.join("schedule.yaml")
+        before = config.read()
+        quads_cli("--host", "host01")
+        assert quads_cli("--maintain")[0] == 0
+        assert not tmpdir.join("schedule.yaml.dirty").check()
+        assert config.read() != before
+        data = yaml.safe_load(config.read())
+        assert sorted(data["history"]) == ["host01", "host02"]
+        assert tmpdir.join("state", ".state").check()
+        # nothing is left to do
+        after = config.read()
+        assert quads_cli("--host", "host01")[1] == "cloud02\n"
+        assert quads_cli("--maintain") == (0, "")
+        assert config.read() == after
+        assert not tmpdir.join("schedule.yaml.dirty").check()
+
+class Test_Export:
+    def test_json(self, quads_cli, tmpdir):
+        quads_cli("--maintain")
+        quads_cli("--define-cloud", "cloud02", "--description", "ospd", "--cloud-owner", "carol", "--force")
+        quads_cli("--define-host", "host02", "--default-cloud", "cloud03", "--force")
+        data = yaml.safe_load(tmpdir.join("schedule.yaml").read())
+
+        code, output = quads_cli("--export", "json", "-d", "2030-01-02 08:00")
+        assert code == 0
+        document = json.loads(output)
+        assert document["date"] == "2030-01-02 08:00"
+        assert sorted(document["clouds"]) == sorted(data["clouds"])
+        for c in data["clouds"]:
+            for field in ["description", "owner", "ticket", "qinq", "ccusers"]:
+                assert document["clouds"][c][field] == data["clouds"][c][field]
+        assert document["clouds"]["cloud01"]["hosts"] == ["host01"]
+        assert document["clouds"]["cloud03"]["hosts"] == ["host02"]
+        assert document["hosts"]["host01"] == {"cloud": "cloud01", "default_cloud": "cloud02", "schedule": 0,
+                                               "schedule_end": data["hosts"]["host01"]["schedule"][0]["end"]}
+        assert document["hosts"]["host02"] == {"cloud": "cloud03", "default_cloud": "cloud03", "schedule": None,
+                                               "schedule_end": None}
+
+        # before the changes above the history applies
+        document = json.loads(quads_cli("--export", "json", "-d", "2020-01-01 08:00")[1])
+        assert document["clouds"]["cloud02"]["owner"] == "bob"
+        assert document["clouds"]["cloud02"]["hosts"] == ["host01"]
+        assert document["hosts"]["host02"] == {"cloud": "cloud01", "default_cloud": "cloud03", "schedule": None,
+                                               "schedule_end": None}
@@ -0,0 +1,94 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+import os
+import sys
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lib"))
+from QuadsDaemon import QuadsDaemon, quads_daemon_query
+from Quads import Quads
+from SqliteData import SqliteData
+from QuadsData import QUADS_SCHEMA_VERSION
+from hardware_services import inventory_service
+
+class Data(dict):
+    def __init__(self, files, hosts):
+        dict.__init__(self, hosts=hosts)
+        self.files = files
+
+    def quads_data_files(self):
+        return self.files
+
+def handler(quads, argv):
+    if argv == ["--move-hosts"]:
+        return False
+    print quads["hosts"][argv[0]]
+    if argv[0] == "host02":
+        exit(1)
+
+def ls_hosts(quads, argv):
+    for h in sorted(quads.quads.hosts.data):
+        print h
+
+class Test_QuadsDaemon:
+    def test_run(self, tmpdir):
+        config = tmpdir.join("schedule.yaml")
+        config.write("")
+        daemon = QuadsDaemon(str(tmpdir.join("quadsd.sock")),
+                             lambda: Data([str(config)], {"host01": "cloud01", "host02": "cloud02"}), handler)
+        assert daemon.run(["host01"], str(tmpdir)) == (0, "cloud01\n")
+        assert daemon.run(["host02"], str(tmpdir)) == (1, "cloud02\n")
+        assert daemon.run(["--move-hosts"], str(tmpdir)) == (None, "")
+
+    def test_reload(self, tmpdir):
+        config = tmpdir.join("schedule.yaml")
+        config.write("host01: cloud01\n")
+        loads = []
+
+        def factory():
+            loads.append(1)
+            return Data([str(config)], {"host01": config.read().split()[1]})
+        daemon = QuadsDaemon(str(tmpdir.join("quadsd.sock")), factory, handler)
+        assert daemon.run(["host01"], str(tmpdir)) == (0, "cloud01\n")
+        assert daemon.run(["host01"], str(tmpdir)) == (0, "cloud01\n")
+        assert len(loads) == 1
+        config.write("host01: cloud02 \n")
+        assert daemon.run(["host01"], str(tmpdir)) == (0, "cloud02\n")
+        assert len(loads) == 2
+
+    def test_sqlite_reload(self, tmpdir, monkeypatch):
+        # the driver is chosen per process, start afresh with Sqlite
+        monkeypatch.setattr(inventory_service, "_inventory_service", None)
+        config = str(tmpdir.join("schedule.yaml"))
+        SqliteData(str(tmpdir.join("schedule.db"))).save(
+            {"clouds": {"cloud01": {"description": "spare pool"}},
+             "hosts": {"host01": {"cloud": "cloud01", "interfaces": {}, "schedule": {}},
+                       "host02": {"cloud": "cloud01", "interfaces": {}, "schedule": {}}},
+             "history": {}, "cloud_history": {}, "version": QUADS_SCHEMA_VERSION})
+        statedir = str(tmpdir.mkdir("state"))
+
+        def factory():
+            return Quads(config, statedir, "/bin/echo", None, None, False, False, "Sqlite", "", None, True)
+        daemon = QuadsDaemon(str(tmpdir.join("quadsd.sock")), factory, ls_hosts)
+        assert daemon.run([], str(tmpdir)) == (0, "host01\nhost02\n")
+
+        writer = Quads(config, statedir, "/bin/echo", None, None, False, False, "Sqlite", "", None, False)
+        with pytest.raises(SystemExit):
+            writer.quads_update_host("host03", "cloud01", False)
+        assert daemon.run([], str(tmpdir)) == (0, "host01\nhost02\nhost03\n")
+
+    def test_query(self, tmpdir):
+        socketpath = str(tmpdir.join("quadsd.sock"))
+        assert quads_daemon_query(socketpath, ["host01"]) is None
+        config = tmpdir.join("schedule.yaml")
+        config.write("")
+        daemon = QuadsDaemon(socketpath, lambda: Data([str(config)], {"host01": "cloud01"}), handler)
+        thread = threading.Thread(target=daemon.serve)
+        thread.daemon = True
+        thread.start()
+        while not os.path.exists(socketpath):
+            pass
+        assert quads_daemon_query(socketpath, ["host01"]) == (0, "cloud01\n")
+        assert quads_daemon_query(socketpath, ["--move-hosts"]) is None
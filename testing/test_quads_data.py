@@ -0,0 +1,38 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lib"))
+from QuadsData import QuadsData, QUADS_SCHEMA_VERSION
+
+@pytest.fixture(scope='function')
+def quads():
+    data = {"clouds": {"cloud01": {"description": "spare pool"}},
+            "hosts": {"host01": {"cloud": "cloud01", "interfaces": {}, "schedule": {
+                0: {"cloud": "cloud01", "start": "2016-01-01 08:00", "end": "2016-01-10 08:00"}}}},
+            "history": {"host01": {0: "cloud01"}}}
+    return QuadsData(data)
+
+class Test_QuadsData:
+    def test_upgrade(self, quads):
+        assert quads.version == 1
+        assert quads.upgrade()
+        assert quads.version == QUADS_SCHEMA_VERSION
+        assert "start_epoch" in quads.hosts.data["host01"]["schedule"][0]
+        assert not quads.upgrade()
+
+    def test_restore(self, quads):
+        hosts = quads.hosts.data
+        saved = quads.save()
+        hosts["host02"] = {"cloud": "cloud01", "interfaces": {}, "schedule": {}}
+        hosts["host01"]["schedule"][0]["cloud"] = "cloud02"
+        quads.cloud_history.add("cloud01", 10, {"description": "old"})
+        quads.restore(saved)
+        # sections are refilled in place
+        assert quads.hosts.data is hosts
+        assert sorted(hosts) == ["host01"]
+        assert hosts["host01"]["schedule"][0]["cloud"] == "cloud01"
+        assert quads.cloud_history.as_of("cloud01", 20) is None
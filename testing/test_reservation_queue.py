@@ -0,0 +1,25 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lib"))
+from ReservationQueue import ReservationQueue
+
+class Test_ReservationQueue:
+    def test_add_remove(self, tmpdir):
+        config = str(tmpdir.join("schedule.yaml"))
+        queue = ReservationQueue(config)
+        assert queue.add(10, 5, "2030-01-01 08:00", "cloud02") == 1
+        assert queue.add(2, 3, None, "cloud03", "model=r630") == 2
+        queue.write()
+        queue = ReservationQueue(config)
+        assert [r["id"] for r in queue.requests] == [1, 2]
+        assert queue.requests[1]["filter"] == "model=r630"
+        assert queue.remove([1, 7]) == 1
+        queue.write()
+        queue = ReservationQueue(config)
+        assert [r["id"] for r in queue.requests] == [2]
+        assert queue.add(1, 1, None, "cloud02") == 3
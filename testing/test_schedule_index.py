@@ -0,0 +1,85 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lib"))
+from ScheduleIndex import ScheduleIndex, quads_date_to_epoch
+
+@pytest.fixture(scope='function')
+def index():
+    hosts = {"host01": {"cloud": "cloud01", "interfaces": {}, "schedule": {
+                 0: {"cloud": "cloud02", "start": "2016-01-01 08:00", "end": "2016-01-10 08:00"},
+                 1: {"cloud": "cloud03", "start": "2016-01-10 08:00", "end": "2016-01-20 08:00"}}},
+             "host02": {"cloud": "cloud01", "interfaces": {}, "schedule": {}}}
+    history = {"host01": {0: "cloud01"},
+               "host02": {0: "cloud04", quads_date_to_epoch("2016-01-05 00:00"): "cloud01"}}
+    return ScheduleIndex(hosts, history)
+
+class Test_ScheduleIndex:
+    now = quads_date_to_epoch("2017-01-01 00:00")
+
+    def test_date_to_epoch(self):
+        assert quads_date_to_epoch("2016-1-2 8:00") == quads_date_to_epoch("2016-01-02 08:00")
+        with pytest.raises(ValueError):
+            quads_date_to_epoch("2016-13-02 08:00")
+
+    def test_find_schedule(self, index):
+        t = quads_date_to_epoch("2016-01-02 09:00")
+        assert index.find("host01", t, self.now) == ("cloud01", "cloud02", 0)
+        t = quads_date_to_epoch("2016-01-10 08:00")
+        assert index.find("host01", t, self.now) == ("cloud01", "cloud03", 1)
+        t = quads_date_to_epoch("2016-01-20 08:00")
+        assert index.find("host01", t, self.now) == ("cloud01", "cloud01", None)
+
+    def test_find_history(self, index):
+        t = quads_date_to_epoch("2016-01-02 09:00")
+        assert index.find("host02", t, self.now) == ("cloud01", "cloud04", None)
+        # history is ignored for times after now
+        assert index.find("host02", t, t) == ("cloud01", "cloud01", None)
+
+    def test_find_unknown_host(self, index):
+        assert index.find("host10", self.now, self.now) == (None, None, None)
+
+    def test_mutations(self, index):
+        t = quads_date_to_epoch("2016-02-02 09:00")
+        assert index.find("host01", t, t) == ("cloud01", "cloud01", None)
+        index.hosts["host01"]["schedule"][2] = {"cloud": "cloud04", "start": "2016-02-01 08:00", "end": "2016-03-01 08:00"}
+        index.add_schedule("host01", 2)
+        assert index.find("host01", t, t) == ("cloud01", "cloud04", 2)
+        index.hosts["host01"]["schedule"][2]["start"] = "2016-02-03 08:00"
+        index.update_schedule("host01", 2)
+        assert index.find("host01", t, t) == ("cloud01", "cloud01", None)
+        del index.hosts["host01"]["schedule"][1]
+        index.remove_schedule("host01", 1)
+        t = quads_date_to_epoch("2016-01-12 09:00")
+        assert index.find("host01", t, t) == ("cloud01", "cloud01", None)
+
+    def test_sweep_matches_find(self, index):
+        start = quads_date_to_epoch("2015-12-31 00:00")
+        times = [start + hour * 3600 for hour in range(0, 24 * 25)]
+        for host in ["host01", "host02", "host10"]:
+            assert index.sweep(host, times, self.now) == [index.find(host, t, self.now) for t in times]
+
+    def test_overlapping(self, index):
+        first = quads_date_to_epoch("2016-01-01 08:00")
+        second = quads_date_to_epoch("2016-01-10 08:00")
+        end = quads_date_to_epoch("2016-01-20 08:00")
+        # a window containing both entries conflicts with both of them
+        t = quads_date_to_epoch("2015-12-01 08:00")
+        u = quads_date_to_epoch("2016-02-01 08:00")
+        assert [e[2] for e in index.overlapping("host01", t, u)] == [0, 1]
+        assert [e[2] for e in index.overlapping("host01", t, u, 0)] == [1]
+        # touching windows do not conflict
+        assert index.overlapping("host01", t, first) == []
+        assert index.overlapping("host01", end, u) == []
+        assert [e[2] for e in index.overlapping("host01", second - 60, second + 60)] == [0, 1]
+        assert index.overlapping("host02", t, u) == []
+
+    def test_conflicts(self, index):
+        assert index.conflicts("host01") == []
+        index.hosts["host01"]["schedule"][2] = {"cloud": "cloud04", "start": "2016-01-02 08:00", "end": "2016-01-03 08:00"}
+        index.add_schedule("host01", 2)
+        assert [(a[2], b[2]) for a, b in index.conflicts("host01")] == [(0, 2)]
@@ -0,0 +1,102 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lib"))
+from SqliteData import SqliteData, SqliteScheduleIndex
+from QuadsData import QuadsData
+from ScheduleIndex import ScheduleIndex, quads_date_to_epoch, quads_schedule_entry
+
+@pytest.fixture(scope='function')
+def data():
+    return {"clouds": {"cloud01": {"description": "spare pool", "owner": "nobody", "ticket": "00000", "qinq": "0",
+                                   "ccusers": [], "networks": {}},
+                       "cloud02": {"description": "ospd", "owner": "bob", "ticket": "12345", "qinq": "1",
+                                   "ccusers": ["joe"], "networks": {}}},
+            "hosts": {"host01": {"cloud": "cloud01", "interfaces": {}, "schedule": {
+                          0: quads_schedule_entry("cloud02", "2016-01-01 08:00", "2016-01-10 08:00")}},
+                      "host02": {"cloud": "cloud01", "interfaces": {}, "schedule": {}}},
+            "history": {"host01": {0: "cloud01"}, "host02": {0: "cloud01", 1451635200: "cloud02"}},
+            "cloud_history": {"cloud02": {0: {"description": "old", "owner": "nobody", "ticket": "0",
+                                              "qinq": "0", "ccusers": []}}},
+            "version": 2}
+
+class Test_SqliteData:
+    def test_round_trip(self, tmpdir, data):
+        store = SqliteData(str(tmpdir.join("schedule.db")))
+        store.save(data)
+        assert store.load() == data
+
+    def test_save_entries(self, tmpdir, data):
+        store = SqliteData(str(tmpdir.join("schedule.db")))
+        store.save(data)
+        del data["hosts"]["host02"]
+        data["hosts"]["host01"]["schedule"][1] = quads_schedule_entry("cloud02", "2016-02-01 08:00", "2016-02-10 08:00")
+        store.save_entries(data, set([("hosts", "host01"), ("hosts", "host02")]))
+        assert store.load()["hosts"] == data["hosts"]
+
+    def test_archive_removed(self, tmpdir, data):
+        store = SqliteData(str(tmpdir.join("schedule.db")))
+        data["archive"] = {"horizon": 1451635200, "next_schedule_ids": {"host01": 3}}
+        store.save(data)
+        assert store.load()["archive"] == data["archive"]
+        del data["archive"]
+        store.save(data)
+        assert "archive" not in store.load()
+
+    def test_queries(self, tmpdir, data):
+        store = SqliteData(str(tmpdir.join("schedule.db")))
+        store.save(data)
+        t = quads_date_to_epoch("2016-01-02 08:00")
+        assert store.schedules_at(t) == [("host01", 0, "cloud02")]
+        assert store.schedules_at(t, "host02") == []
+        assert store.schedules_at(quads_date_to_epoch("2016-01-10 08:00")) == []
+        start = quads_date_to_epoch("2016-01-09 08:00")
+        end = quads_date_to_epoch("2016-02-01 08:00")
+        assert store.schedules_between("cloud02", start, end) == \
+            [("host01", 0, quads_date_to_epoch("2016-01-01 08:00"), quads_date_to_epoch("2016-01-10 08:00"))]
+        assert store.schedules_between("cloud01", start, end) == []
+        assert store.host_schedules_between("host01", start, end) == \
+            [(quads_date_to_epoch("2016-01-01 08:00"), quads_date_to_epoch("2016-01-10 08:00"), 0, "cloud02")]
+        assert store.host_schedules_between("host02", start, end) == []
+        for query in ["SELECT id FROM schedules WHERE host = 'host01' AND start_epoch < 1 AND 0 < end_epoch",
+                      "SELECT id FROM schedules WHERE cloud = 'cloud02' AND start_epoch < 1 AND 0 < end_epoch"]:
+            plan = " ".join(str(row) for row in store.db.execute("EXPLAIN QUERY PLAN " + query))
+            assert "USING INDEX" in plan or "USING COVERING INDEX" in plan
+
+class Test_SqliteScheduleIndex:
+    def test_lookups(self, tmpdir, data):
+        data["hosts"]["host01"]["schedule"][1] = quads_schedule_entry("cloud02", "2016-01-05 08:00", "2016-01-20 08:00")
+        data["hosts"]["host02"]["schedule"][0] = quads_schedule_entry("cloud02", "2016-01-15 08:00", "2016-01-25 08:00")
+        store = SqliteData(str(tmpdir.join("schedule.db")))
+        store.save(data)
+        quads = QuadsData(store.load())
+        index = SqliteScheduleIndex(store, quads)
+        expected = ScheduleIndex(quads.hosts.data, quads.history.data)
+        now = quads_date_to_epoch("2016-06-01 08:00")
+        for h in ["host01", "host02"]:
+            for day in range(1, 31):
+                t = quads_date_to_epoch("2016-01-%02d 08:00" % day)
+                assert index.schedule_at(h, t) == expected.schedule_at(h, t)
+                assert index.find(h, t, now) == expected.find(h, t, now)
+                assert index.overlapping(h, t, t + 5 * 86400) == expected.overlapping(h, t, t + 5 * 86400)
+                assert index.overlapping(h, t, t + 5 * 86400, 1) == expected.overlapping(h, t, t + 5 * 86400, 1)
+
+    def test_unsaved_changes(self, tmpdir, data):
+        store = SqliteData(str(tmpdir.join("schedule.db")))
+        store.save(data)
+        quads = QuadsData(store.load())
+        index = SqliteScheduleIndex(store, quads)
+        t = quads_date_to_epoch("2016-02-02 08:00")
+        assert index.schedule_at("host02", t) is None
+        quads.hosts.data["host02"]["schedule"][0] = quads_schedule_entry("cloud02", "2016-02-01 08:00", "2016-02-10 08:00")
+        quads.mark_dirty("hosts", "host02")
+        index.add_schedule("host02", 0)
+        assert index.schedule_at("host02", t)[2:] == (0, "cloud02")
+        assert [e[2] for e in index.overlapping("host02", t, t + 86400)] == [0]
+        store.save_entries(quads.as_dict(), quads.dirty)
+        quads.clear_dirty()
+        assert index.schedule_at("host02", t)[2:] == (0, "cloud02")
@@ -0,0 +1,33 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lib"))
+from StateStore import StateStore
+
+class Test_StateStore:
+    def test_import(self, tmpdir):
+        tmpdir.join("host01").write("cloud02\n")
+        state = StateStore(str(tmpdir))
+        assert state.cloud("host01") == "cloud02"
+        assert state.cloud("host02") is None
+        state.save()
+        assert tmpdir.join(".state").read() == "host01 cloud02\n"
+
+    def test_save(self, tmpdir):
+        state = StateStore(str(tmpdir))
+        state.set("host01", "cloud01")
+        state.set("host02", "cloud01")
+        state.save()
+        state.set("host02", "cloud03", 1483228800)
+        state.save()
+        assert tmpdir.join("host02").read() == "cloud03\n"
+        state = StateStore(str(tmpdir))
+        assert state.cloud("host01") == "cloud01"
+        assert state.moved("host02") == 1483228800
+        tmpdir.join("host01").remove()
+        state.export()
+        assert tmpdir.join("host01").read() == "cloud01\n"
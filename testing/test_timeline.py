@@ -0,0 +1,107 @@
+#!/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+import os
+import random
+import sys
+import yaml
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "lib"))
+from Archive import Archive
+from Quads import Quads
+from Timeline import Timeline, KEYFRAME_INTERVAL
+from ScheduleIndex import quads_date_to_epoch, quads_epoch_to_date, quads_schedule_entry
+
+NOW = quads_date_to_epoch("2030-06-01 08:00")
+
+@pytest.fixture(scope='function')
+def quads(tmpdir):
+    random.seed(7)
+    clouds = ["cloud01", "cloud02", "cloud03", "cloud04"]
+    hosts = {}
+    history = {}
+    for n in range(40):
+        h = "host%02d" % n
+        hosts[h] = {"cloud": random.choice(clouds), "interfaces": {}, "schedule": {}}
+        # moves recorded before now, history only applies before NOW
+        history[h] = {0: hosts[h]["cloud"]}
+        for k in range(3):
+            history[h][quads_date_to_epoch("2029-%02d-10 08:00" % random.randint(1, 12))] = random.choice(clouds)
+        # back to back schedules through the year, some of them with gaps
+        day = random.randint(0, 10)
+        for override in range(8):
+            start = quads_date_to_epoch("2030-01-01 08:00") + day * 86400 + n * 3600
+            day += random.randint(3, 20)
+            end = quads_date_to_epoch("2030-01-01 08:00") + day * 86400 + n * 3600
+            day += random.choice([0, 0, 2])
+            hosts[h]["schedule"][override] = quads_schedule_entry(random.choice(clouds), quads_epoch_to_date(start),
+                                                                  quads_epoch_to_date(end))
+    config = tmpdir.join("schedule.yaml")
+    config.write(yaml.dump({"clouds": dict((c, {"description": c}) for c in clouds), "hosts": hosts,
+                            "history": history, "cloud_history": {}}))
+    return Quads(str(config), str(tmpdir), "/bin/echo", None, None, False, False, "QuadsNative", "", None, True)
+
+# the cloud of every host at epoch when, looked up one host at a time
+def brute_force(quads, when):
+    return dict((h, quads.schedule_index.find(h, when, NOW)[1]) for h in quads.quads.hosts.data)
+
+class Test_Timeline:
+    def test_snapshot(self, quads):
+        timeline = Timeline(quads, NOW)
+        assert len(timeline.times) > 2 * KEYFRAME_INTERVAL
+        # keyframe boundaries, the points between them and the times around
+        samples = [0, timeline.times[0] - 1, timeline.times[-1] + 1]
+        for i, t in enumerate(timeline.times):
+            if i % KEYFRAME_INTERVAL in [0, 1, KEYFRAME_INTERVAL - 1] or i % 7 == 0:
+                samples.extend([t - 1, t, t + 1])
+            if i + 1 < len(timeline.times):
+                samples.append((t + timeline.times[i + 1]) // 2)
+        for when in samples:
+            assert timeline.snapshot(when) == brute_force(quads, when)
+
+    def test_clouds_at(self, quads):
+        timeline = Timeline(quads, NOW)
+        when = timeline.times[KEYFRAME_INTERVAL] + 3600
+        expected = {}
+        for h, cloud in brute_force(quads, when).iteritems():
+            expected.setdefault(cloud, []).append(h)
+        assert timeline.clouds_at(when) == dict((c, sorted(hosts)) for c, hosts in expected.iteritems())
+
+    def test_next_changes(self, quads):
+        timeline = Timeline(quads, NOW)
+        after = quads_date_to_epoch("2030-03-01 08:00")
+        changes = timeline.next_changes(after)
+        assert timeline.next_changes(after, 3) == changes[:3]
+        previous = brute_force(quads, after)
+        for when, moves in changes:
+            assert when > after
+            # nothing changes between two change points
+            assert brute_force(quads, when - 1) == previous
+            current = brute_force(quads, when)
+            assert moves == sorted((h, previous[h], current[h]) for h in current if current[h] != previous[h])
+            previous = current
+
+    def test_quads_next_change(self, quads, capsys):
+        quads.quads_next_change("2030-03-01 08:00", 2)
+        lines = capsys.readouterr()[0].splitlines()
+        expected = []
+        for when, moves in Timeline(quads, quads.quads_timeline().now).next_changes(
+                quads_date_to_epoch("2030-03-01 08:00"), 2):
+            expected.append(quads_epoch_to_date(when))
+            expected.extend("  " + h + " : " + old + " -> " + new for h, old, new in moves)
+        assert lines == expected
+        assert len([l for l in lines if not l.startswith(" ")]) == 2
+
+    def test_quads_next_change_archived(self, quads, tmpdir, capsys):
+        quads.quads_next_change("2030-02-01 08:00", 5)
+        expected = capsys.readouterr()[0]
+        horizon = quads_date_to_epoch("2030-03-01 08:00")
+        archive = Archive(str(tmpdir.join("schedule.yaml")))
+        assert archive.archive(quads.quads, horizon)[0] > 0
+        archive.write()
+        quads.quads.archive_horizon = horizon
+        quads.schedule_index.invalidate()
+        # the schedules ending before the horizon are only in the archive
+        quads.quads_next_change("2030-02-01 08:00", 5)
+        assert capsys.readouterr()[0] == expected